@@ -178,6 +178,66 @@ class CropGuardAPI {
         return this.request(`/alerts/?page=${page}&page_size=${size}`);
     }
 
+    /**
+     * Unread alerts, newest first. Pass the `next` cursor of a page as
+     * `cursor` for older alerts, or the `sync` cursor as `since` for only
+     * what changed: new alerts plus `read_ids` read elsewhere.
+     */
+    async getUnreadAlerts({ cursor = null, since = null, pageSize = 20 } = {}) {
+        const params = new URLSearchParams({ page_size: pageSize });
+        if (cursor) params.set('cursor', cursor);
+        if (since) params.set('since', since);
+        return this.request(`/alerts/unread/?${params}`);
+    }
+
+    /**
+     * Open the server-sent alert stream (needs the ASGI server).
+     * EventSource cannot send the Authorization header, so the stream is
+     * opened with a short-lived ticket instead of the access token. When
+     * the browser gives up on a connection (e.g. its ticket expired), a new
+     * ticket is fetched and the stream resumes from the last event id.
+     * Returns null where EventSource is unavailable.
+     */
+    async openAlertStream(onAlert) {
+        if (typeof EventSource === 'undefined' || !this.accessToken) {
+            return null;
+        }
+        const stream = {
+            source: null,
+            lastId: null,
+            closed: false,
+            close() {
+                this.closed = true;
+                this.source?.close();
+            }
+        };
+        const connect = async () => {
+            if (stream.closed || !this.accessToken) return;
+            let source;
+            try {
+                const { ticket } = await this.request('/alerts/stream_ticket/', 'POST');
+                const params = new URLSearchParams({ ticket });
+                if (stream.lastId) params.set('last_id', stream.lastId);
+                source = new EventSource(`${this.baseUrl}/alerts/stream/?${params}`);
+            } catch (error) {
+                setTimeout(connect, 30 * 1000);
+                return;
+            }
+            stream.source = source;
+            source.addEventListener('alert', (event) => {
+                stream.lastId = event.lastEventId;
+                onAlert(JSON.parse(event.data));
+            });
+            source.addEventListener('error', () => {
+                if (source.readyState === EventSource.CLOSED) {
+                    setTimeout(connect, 3000);
+                }
+            });
+        };
+        await connect();
+        return stream;
+    }
+
     async markAlertAsRead(id) {
         return this.request(`/alerts/${id}/mark_read/`, 'POST');
     }
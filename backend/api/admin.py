@@ -5,15 +5,21 @@ from django.contrib import admin
 from .models import (
     UserProfile, Farm, DiseaseDetection, WeatherData, Alert,
     MarketPrice, FarmingRecommendation, FarmAnalytics,
-    PestRecord, IrrigationSchedule, ActivityLog
+    PestRecord, IrrigationSchedule, ActivityLog, WeatherRollup,
+    WeatherForecast, ForecastDailyRisk, UserCounters, ArchivedAlert
 )
 
 # Register all models
 admin.site.register(UserProfile)
+admin.site.register(UserCounters)
 admin.site.register(Farm)
 admin.site.register(DiseaseDetection)
 admin.site.register(WeatherData)
+admin.site.register(WeatherRollup)
+admin.site.register(WeatherForecast)
+admin.site.register(ForecastDailyRisk)
 admin.site.register(Alert)
+admin.site.register(ArchivedAlert)
 admin.site.register(MarketPrice)
 admin.site.register(FarmingRecommendation)
 admin.site.register(FarmAnalytics)
@@ -0,0 +1,199 @@
+# Weather Alert Fan-out for CropGuard AI
+# File: api/alerts.py
+#
+# A weather risk is raised as a ``RiskEvent`` over a grid cell or a whole
+# region (or, for on-farm sensor readings, a single farm). ``fan_out``
+# resolves every active farm the event covers (cells through a
+# latitude/longitude range on the farm index, regions through the region
+# index). A farm that already received an alert of the same or higher
+# severity within ``WEATHER_ALERT_DEDUP_WINDOW`` gets that alert's
+# occurrence count bumped instead (see api/coalesce.py); the remaining
+# ``Alert`` rows are written with ``bulk_create`` in chunks.
+# Request paths hand events to ``dispatch``, which runs the fan-out on the
+# shared background pool.
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+import metrics
+
+from . import background, counters, streaming, weather
+from .models import Alert, Farm
+
+SEVERITY = {'orange': 'warning', 'red': 'critical'}
+SEVERITY_RANK = {'info': 0, 'warning': 1, 'critical': 2}
+
+# Cells resolved per farm query, and slack around each cell's bounds
+CELLS_PER_QUERY = 100
+BOUNDS_MARGIN = 1e-6
+
+alerts_created = metrics.counter('weather_alerts_created')
+alerts_deduplicated = metrics.counter('weather_alerts_deduplicated')
+fanout_latency = metrics.histogram('weather_alert_fanout_seconds')
+fanout_rate = metrics.gauge('weather_alerts_per_second')
+
+
+class RiskEvent:
+    """An ``orange`` or ``red`` weather risk over a grid cell, a region or one farm"""
+    __slots__ = ('level', 'condition', 'cell', 'region', 'farm_id')
+
+    def __init__(self, level, condition, cell=None, region=None, farm_id=None):
+        if sum(scope is not None for scope in (cell, region, farm_id)) != 1:
+            raise ValueError('A risk event needs exactly one of cell, region or farm_id')
+        self.level = level
+        self.condition = condition
+        self.cell = cell
+        self.region = region
+        self.farm_id = farm_id
+
+    @classmethod
+    def for_reading(cls, weather_data):
+        """Event covering the grid cell of a scored ``WeatherData`` row"""
+        farm = weather_data.farm
+        return cls(weather_data.alert_level, weather_data.condition,
+                   cell=weather.grid_cell(farm.latitude, farm.longitude))
+
+
+# ============================================
+# FARM RESOLUTION
+# ============================================
+def cell_bounds(cell, size=None):
+    """``(lat_min, lat_max, lon_min, lon_max)`` of a grid cell, with a small margin"""
+    size = settings.WEATHER_GRID_SIZE if size is None else size
+    if not size:
+        lat_min, lon_min = cell
+        lat_max, lon_max = cell
+    else:
+        lat_min, lon_min = cell[0] * size, cell[1] * size
+        lat_max, lon_max = lat_min + size, lon_min + size
+    return (lat_min - BOUNDS_MARGIN, lat_max + BOUNDS_MARGIN,
+            lon_min - BOUNDS_MARGIN, lon_max + BOUNDS_MARGIN)
+
+
+def resolve(events):
+    """Map farm id -> ``(farm, event)``, keeping the most severe event per farm"""
+    active = Farm.objects.filter(is_active=True).only(
+        'id', 'user_id', 'latitude', 'longitude', 'region')
+    targets = {}
+
+    def add(farm, event):
+        current = targets.get(farm.pk)
+        if current is None or risk_rank(event) > risk_rank(current[1]):
+            targets[farm.pk] = (farm, event)
+
+    by_cell = {event.cell: event for event in events if event.cell is not None}
+    cells = list(by_cell)
+    for start in range(0, len(cells), CELLS_PER_QUERY):
+        boxes = Q()
+        for cell in cells[start:start + CELLS_PER_QUERY]:
+            lat_min, lat_max, lon_min, lon_max = cell_bounds(cell)
+            boxes |= Q(latitude__gte=lat_min, latitude__lte=lat_max,
+                       longitude__gte=lon_min, longitude__lte=lon_max)
+        for farm in active.filter(boxes):
+            # The margin can pick up neighbours; the grid has the final say
+            event = by_cell.get(weather.grid_cell(farm.latitude, farm.longitude))
+            if event is not None:
+                add(farm, event)
+
+    by_region = {}
+    for event in events:
+        if event.region is not None:
+            by_region.setdefault(event.region, []).append(event)
+    if by_region:
+        for farm in active.filter(region__in=list(by_region)):
+            for event in by_region[farm.region]:
+                add(farm, event)
+
+    by_farm = {event.farm_id: event for event in events if event.farm_id is not None}
+    if by_farm:
+        for farm in active.filter(pk__in=list(by_farm)):
+            add(farm, by_farm[farm.pk])
+    return targets
+
+
+def risk_rank(event):
+    return SEVERITY_RANK[SEVERITY.get(event.level, 'info')]
+
+
+# ============================================
+# FAN-OUT
+# ============================================
+def build_alert(farm, event):
+    return Alert(
+        user_id=farm.user_id,
+        farm_id=farm.pk,
+        alert_type='weather',
+        title='Weather Alert',
+        message=f"High disease risk detected due to {event.condition}",
+        severity=SEVERITY.get(event.level, 'warning'),
+    )
+
+
+def recently_alerted(farm_ids, since):
+    """``(rank, alert id)`` of each farm's newest most severe weather alert since ``since``"""
+    alerted = {}
+    for farm_id, severity, alert_id in Alert.objects.filter(
+        farm_id__in=farm_ids, alert_type='weather', created_at__gte=since,
+    ).order_by('-created_at').values_list('farm_id', 'severity', 'id'):
+        rank = SEVERITY_RANK.get(severity, 0)
+        if rank > alerted.get(farm_id, (-1, None))[0]:
+            alerted[farm_id] = (rank, alert_id)
+    return alerted
+
+
+def fan_out(events, chunk_size=None):
+    """Write one weather ``Alert`` per affected farm owner; returns a stats dict"""
+    started = time.monotonic()
+    chunk_size = chunk_size or settings.WEATHER_ALERT_CHUNK
+    events = [event for event in events if event.level in SEVERITY]
+    targets = resolve(events)
+    since = timezone.now() - timedelta(seconds=settings.WEATHER_ALERT_DEDUP_WINDOW)
+
+    farm_ids = list(targets)
+    created = skipped = 0
+    for start in range(0, len(farm_ids), chunk_size):
+        chunk = farm_ids[start:start + chunk_size]
+        alerted = recently_alerted(chunk, since)
+        batch, repeated = [], []
+        for farm_id in chunk:
+            rank, alert_id = alerted.get(farm_id, (-1, None))
+            if rank < risk_rank(targets[farm_id][1]):
+                batch.append(build_alert(*targets[farm_id]))
+            else:
+                repeated.append(alert_id)
+        with transaction.atomic():
+            Alert.objects.bulk_create(batch)
+            # Same read state and severity, so the counters are unchanged
+            Alert.objects.filter(pk__in=repeated).update(
+                occurrences=F('occurrences') + 1, last_seen_at=timezone.now())
+            counters.alerts_created(batch)
+            streaming.publish_on_commit(batch)
+        created += len(batch)
+        skipped += len(repeated)
+
+    elapsed = time.monotonic() - started
+    alerts_created.inc(created)
+    alerts_deduplicated.inc(skipped)
+    fanout_latency.observe(elapsed)
+    rate = round(created / elapsed, 1) if elapsed else None
+    fanout_rate.set(rate)
+    return {
+        'events': len(events),
+        'farms': len(farm_ids),
+        'created': created,
+        'deduplicated': skipped,
+        'seconds': round(elapsed, 3),
+        'alerts_per_second': rate,
+    }
+
+
+def dispatch(events):
+    """Fan ``events`` out on the background pool"""
+    events = [event for event in events if event.level in SEVERITY]
+    if events:
+        background.submit(fan_out, events)
@@ -1,5 +1,28 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+    
+    def ready(self):
+        from . import counters
+        from .models import Alert, DiseaseDetection, Farm
+        from .streaming import alert_saved
+        
+        # New alerts are pushed to open alert streams (see api/streaming.py)
+        post_save.connect(alert_saved, sender=Alert, dispatch_uid='alert_stream_publish')
+        
+        # Per-user counters follow every single-row change (see api/counters.py)
+        post_init.connect(counters.alert_initialized, sender=Alert, dispatch_uid='counters_alert_init')
+        post_save.connect(counters.alert_saved, sender=Alert, dispatch_uid='counters_alert_save')
+        post_delete.connect(counters.alert_deleted, sender=Alert, dispatch_uid='counters_alert_delete')
+        post_save.connect(counters.farm_saved, sender=Farm, dispatch_uid='counters_farm_save')
+        pre_delete.connect(counters.farm_deleting, sender=Farm, dispatch_uid='counters_farm_deleting')
+        post_delete.connect(counters.farm_deleted, sender=Farm, dispatch_uid='counters_farm_delete')
+        post_init.connect(counters.detection_initialized, sender=DiseaseDetection,
+                          dispatch_uid='counters_detection_init')
+        post_save.connect(counters.detection_saved, sender=DiseaseDetection,
+                          dispatch_uid='counters_detection_save')
+        post_delete.connect(counters.detection_deleted, sender=DiseaseDetection,
+                            dispatch_uid='counters_detection_delete')
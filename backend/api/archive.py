@@ -0,0 +1,159 @@
+# Alert Expiry and Archival for CropGuard AI
+# File: api/archive.py
+#
+# ``sweep`` removes alerts past their ``expires_at`` and read alerts older
+# than ``ALERT_READ_RETENTION_DAYS`` from ``notifications_alert``, so the
+# per-user scans only cover live notifications. Rows are copied, according
+# to ``ALERT_ARCHIVE_MODE``, into:
+# - ``ArchivedAlert`` ('table'), a narrow table without actions or links;
+# - a gzipped JSON-lines file per day under ``ALERT_ARCHIVE_DIR`` ('jsonl');
+# - nowhere ('delete').
+# Each batch of ``ALERT_SWEEP_BATCH`` rows is archived and deleted in its own
+# short transaction, so SQLite never holds a long write lock. Unread alerts
+# that expire are counted down through ``counters.mark_read`` before they
+# are deleted.
+# (`manage.py sweep_alerts`, optionally ``--loop``)
+
+import gzip
+import json
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+import metrics
+
+from . import counters
+from .models import Alert, ArchivedAlert
+
+MODES = ('table', 'jsonl', 'delete')
+ARCHIVED_FIELDS = ('id', 'user_id', 'farm_id', 'alert_type', 'title', 'message', 'severity',
+                   'occurrences', 'is_read', 'created_at', 'read_at', 'expires_at')
+
+alerts_archived = metrics.counter('alerts_archived')
+sweep_rate = metrics.gauge('alert_sweep_rows_per_second')
+
+
+# ============================================
+# ARCHIVE TARGETS
+# ============================================
+def archive_to_table(alerts):
+    ArchivedAlert.objects.bulk_create([
+        ArchivedAlert(**{field: getattr(alert, field) for field in ARCHIVED_FIELDS})
+        for alert in alerts
+    ], ignore_conflicts=True)
+
+
+def archive_path(day):
+    return os.path.join(settings.ALERT_ARCHIVE_DIR, f'alerts-{day.isoformat()}.jsonl.gz')
+
+
+def archive_to_file(alerts, archived_at):
+    """Append one gzip member per batch; synced before the batch is deleted"""
+    path = archive_path(archived_at.date())
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    lines = ''.join(
+        json.dumps(dict({field: getattr(alert, field) for field in ARCHIVED_FIELDS},
+                        archived_at=archived_at), cls=DjangoJSONEncoder) + '\n'
+        for alert in alerts
+    )
+    with open(path, 'ab') as archive:
+        archive.write(gzip.compress(lines.encode()))
+        archive.flush()
+        os.fsync(archive.fileno())
+    return path
+
+
+def read_archive(path):
+    """Rows of a JSON-lines archive file"""
+    with gzip.open(path, 'rt') as archive:
+        return [json.loads(line) for line in archive]
+
+
+# ============================================
+# SWEEP
+# ============================================
+def table_size(model):
+    """Row count and on-disk bytes (table and indexes) of a model's table"""
+    table = model._meta.db_table
+    size = None
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                # Needs SQLITE_ENABLE_DBSTAT_VTAB (on in Python's bundled SQLite)
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name IN '
+                               '(SELECT name FROM sqlite_master WHERE tbl_name = %s)', [table])
+                size = cursor.fetchone()[0]
+            elif connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+                size = cursor.fetchone()[0]
+    except DatabaseError:
+        size = None
+    return {'rows': model.objects.count(), 'bytes': size}
+
+
+def sweepable(now=None):
+    """``(expired, stale_read)`` querysets of alerts due for archival"""
+    now = now or timezone.now()
+    read_cutoff = now - timedelta(days=settings.ALERT_READ_RETENTION_DAYS)
+    expired = Alert.objects.filter(expires_at__lt=now)
+    stale = Alert.objects.filter(
+        Q(read_at__lt=read_cutoff) | Q(read_at__isnull=True, created_at__lt=read_cutoff),
+        is_read=True,
+    )
+    return expired, stale
+
+
+def sweep(now=None, batch_size=None, mode=None):
+    """Archive and delete expired and old read alerts; returns a stats dict"""
+    mode = mode or settings.ALERT_ARCHIVE_MODE
+    if mode not in MODES:
+        raise ValueError(f'Unknown alert archive mode: {mode}')
+    batch_size = batch_size or settings.ALERT_SWEEP_BATCH
+    started = time.monotonic()
+    before = table_size(Alert)
+
+    moved = {}
+    files = set()
+    for reason, queryset in zip(('expired', 'read'), sweepable(now)):
+        moved[reason] = 0
+        while True:
+            with transaction.atomic():
+                batch = list(queryset.order_by()[:batch_size])
+                if not batch:
+                    break
+                archived_at = timezone.now()
+                if mode == 'table':
+                    archive_to_table(batch)
+                elif mode == 'jsonl':
+                    files.add(archive_to_file(batch, archived_at))
+                ids = [alert.pk for alert in batch]
+                counters.mark_read(Alert.objects.filter(pk__in=ids), read_at=archived_at)
+                Alert.objects.filter(pk__in=ids).delete()
+            moved[reason] += len(batch)
+
+    total = sum(moved.values())
+    elapsed = time.monotonic() - started
+    alerts_archived.inc(total)
+    rate = round(total / elapsed, 1) if elapsed else None
+    sweep_rate.set(rate)
+    stats = {
+        'mode': mode,
+        'expired': moved['expired'],
+        'read': moved['read'],
+        'archived': total,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': rate,
+        'table_before': before,
+        'table_after': table_size(Alert),
+    }
+    if mode == 'table':
+        stats['archive_table'] = table_size(ArchivedAlert)
+    elif mode == 'jsonl':
+        stats['archive_files'] = sorted(files)
+    return stats
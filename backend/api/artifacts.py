@@ -0,0 +1,114 @@
+# Stored Image Artifacts for CropGuard AI
+# File: api/artifacts.py
+#
+# Detection overlays are written once to media storage under a content-hash
+# name and served by ``serve_artifact`` with HTTP range and cache headers, so
+# slow connections can fetch them lazily (or not at all) instead of receiving
+# a base64 data URI inside the JSON response.
+
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+
+OVERLAY_DIR = 'disease_overlays'
+
+# Only content-named (unguessable) artifacts are public; uploads and their
+# thumbnails keep the original filenames and stay behind the API
+ARTIFACT_PREFIXES = (f'{OVERLAY_DIR}/',)
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+def store_overlay(key, data):
+    """Write an overlay JPEG once under its content key; returns the storage name"""
+    name = f'{OVERLAY_DIR}/{key}.jpg'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def artifact_url(request, name):
+    """Absolute URL for a stored artifact"""
+    return request.build_absolute_uri(reverse('artifact', args=[name]))
+
+
+def _parse_range(header, size):
+    """Return ``(start, end)`` (inclusive) for a single byte range, or None if unsatisfiable"""
+    match = RANGE_RE.match(header.strip())
+    if not match or not any(match.groups()):
+        return None
+    start, end = match.groups()
+    if not start:
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def _iter_range(fh, start, length):
+    try:
+        fh.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = fh.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+@require_http_methods(['GET', 'HEAD'])
+def serve_artifact(request, path):
+    """Serve a stored artifact with Range, ETag and long-lived cache headers"""
+    if not path.startswith(ARTIFACT_PREFIXES) or '..' in path.split('/'):
+        raise Http404('Artifact not found')
+    if not default_storage.exists(path):
+        raise Http404('Artifact not found')
+
+    size = default_storage.size(path)
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    etag = f'"{os.path.splitext(os.path.basename(path))[0]}-{size}"'
+    cache_headers = {
+        'ETag': etag,
+        'Cache-Control': f'public, max-age={settings.ARTIFACT_MAX_AGE}, immutable',
+        'Accept-Ranges': 'bytes',
+    }
+
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    elif request.headers.get('Range'):
+        byte_range = _parse_range(request.headers['Range'], size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+        else:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _iter_range(default_storage.open(path, 'rb'), start, length),
+                status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+            response['Content-Length'] = str(length)
+    else:
+        response = FileResponse(default_storage.open(path, 'rb'), content_type=content_type)
+
+    for header, value in cache_headers.items():
+        response[header] = value
+    return response
@@ -0,0 +1,71 @@
+# Background Tasks for CropGuard AI
+# File: api/background.py
+#
+# A small shared thread pool for work that should not hold up a request.
+# A task submitted with a ``key`` is skipped while another task with the
+# same key is still queued or running, so a burst of requests schedules a
+# single refresh. With ``BACKGROUND_TASKS_SYNC`` (used by the tests) tasks
+# run inline instead.
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+tasks_run = metrics.counter('background_tasks_run')
+tasks_failed = metrics.counter('background_tasks_failed')
+tasks_deduplicated = metrics.counter('background_tasks_deduplicated')
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_WORKERS,
+            thread_name_prefix='background',
+        )
+    return _executor
+
+
+def submit(fn, *args, key=None):
+    """Run ``fn(*args)`` in the background; False if ``key`` is already pending"""
+    with _lock:
+        if key is not None:
+            if key in _pending:
+                tasks_deduplicated.inc()
+                return False
+            _pending.add(key)
+        executor = None if settings.BACKGROUND_TASKS_SYNC else _get_executor()
+
+    if executor is None:
+        _run(fn, args, key, inline=True)
+    else:
+        executor.submit(_run, fn, args, key)
+    return True
+
+
+def _run(fn, args, key, inline=False):
+    if not inline:
+        close_old_connections()
+    try:
+        fn(*args)
+        tasks_run.inc()
+    except Exception:
+        tasks_failed.inc()
+        logger.exception('Background task %s failed', getattr(fn, '__name__', fn))
+    finally:
+        if key is not None:
+            with _lock:
+                _pending.discard(key)
+        if not inline:
+            close_old_connections()
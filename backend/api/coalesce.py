@@ -0,0 +1,58 @@
+# Alert Coalescing for CropGuard AI
+# File: api/coalesce.py
+#
+# Disease and pest alerts are raised through ``raise_alert``, keyed on
+# (user, farm, alert_type, subject). A repeat within ``ALERT_COALESCE_WINDOW``
+# seconds of an unread alert with the same key is folded into that alert
+# instead of inserting a row: ``occurrences`` and ``last_seen_at`` are
+# bumped, the message and related detection follow the latest occurrence and
+# the severity only ever rises. The update is a single-row save, so the
+# per-user counters follow through their model signals; only new rows are
+# pushed to the alert stream, so repeats do not notify again. Once the alert
+# is read, the next occurrence starts a new one.
+# Weather alerts are coalesced by the fan-out's severity-aware window
+# (api/alerts.py).
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+import metrics
+
+from .alerts import SEVERITY_RANK
+from .models import Alert
+
+alerts_coalesced = metrics.counter('alerts_coalesced')
+
+
+def raise_alert(user, farm, alert_type, subject, severity, **fields):
+    """Create an alert or fold it into a recent unread one; returns ``(alert, created)``"""
+    window = settings.ALERT_COALESCE_WINDOW
+    now = timezone.now()
+    with transaction.atomic():
+        existing = None
+        if window:
+            existing = (
+                Alert.objects.select_for_update()
+                .filter(user=user, farm=farm, alert_type=alert_type, subject=subject,
+                        is_read=False, created_at__gte=now - timedelta(seconds=window))
+                .order_by('-created_at').first()
+            )
+        if existing is None:
+            alert = Alert.objects.create(user=user, farm=farm, alert_type=alert_type,
+                                         subject=subject, severity=severity, **fields)
+            return alert, True
+
+        if SEVERITY_RANK.get(severity, 1) > SEVERITY_RANK.get(existing.severity, 1):
+            existing.severity = severity
+        for name, value in fields.items():
+            setattr(existing, name, value)
+        existing.occurrences = F('occurrences') + 1
+        existing.last_seen_at = now
+        existing.save(update_fields=['severity', 'occurrences', 'last_seen_at', *fields])
+        existing.refresh_from_db(fields=['occurrences'])
+    alerts_coalesced.inc()
+    return existing, False
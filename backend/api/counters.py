@@ -0,0 +1,262 @@
+# Per-user Counters for CropGuard AI
+# File: api/counters.py
+#
+# ``UserCounters`` holds each user's unread alerts by severity, farm count and
+# completed detection count, so dashboards read one row by primary key
+# instead of running COUNT(*) queries. Single-row saves and deletes adjust the row from
+# model signals with ``F()`` increments. Signals run after the row's own
+# statement, so writers put both in one transaction: the API viewsets through
+# ``AtomicWritesMixin``, the helpers here and the alert fan-out in their own
+# ``atomic`` blocks. Bulk writes (``bulk_create``, queryset ``update``) go
+# through the helpers here. Deleting a farm recounts its owner once instead
+# of decrementing for every cascaded alert and detection. Autocommit writes
+# made elsewhere (shell, admin) are not covered; ``reconcile`` recomputes the
+# counters from the source tables to repair any drift
+# (`manage.py reconcile_counters`).
+
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+from django.utils import timezone
+
+import metrics
+
+from .models import Alert, DiseaseDetection, Farm, UserCounters
+
+SEVERITY_FIELDS = {'info': 'unread_info', 'warning': 'unread_warning', 'critical': 'unread_critical'}
+COUNTER_FIELDS = ('unread_info', 'unread_warning', 'unread_critical', 'total_farms', 'total_detections')
+
+counters_repaired = metrics.counter('user_counters_repaired')
+counters_created = metrics.counter('user_counters_created')
+
+# Farms being deleted by this thread; their cascaded rows are not counted down
+_deleting = threading.local()
+
+
+def unread_field(severity):
+    """Counter holding unread alerts of ``severity`` (unknown levels count as warnings)"""
+    return SEVERITY_FIELDS.get(severity, 'unread_warning')
+
+
+# ============================================
+# READ / ADJUST
+# ============================================
+def get(user_id):
+    """The user's counters, created from the source tables on first use"""
+    return UserCounters.objects.filter(pk=user_id).first() or recount(user_id)
+
+
+def adjust(user_id, **deltas):
+    """Add ``deltas`` to the user's counters in the current transaction"""
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if user_id is None or not deltas:
+        return
+    updated = UserCounters.objects.filter(pk=user_id).update(
+        updated_at=timezone.now(),
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+    # A missing row is built by counting, which already includes this change.
+    # Decrements never create one (the user may be being deleted).
+    if not updated and any(delta > 0 for delta in deltas.values()):
+        recount(user_id)
+
+
+def alerts_created(alerts):
+    """Count bulk-created alerts"""
+    deltas = {}
+    for alert in alerts:
+        if not alert.is_read:
+            user = deltas.setdefault(alert.user_id, {})
+            field = unread_field(alert.severity)
+            user[field] = user.get(field, 0) + 1
+    for user_id, user_deltas in deltas.items():
+        adjust(user_id, **user_deltas)
+
+
+def mark_read(alerts, read_at=None):
+    """Mark a queryset of alerts read and count them down; returns rows updated"""
+    unread = alerts.filter(is_read=False)
+    with transaction.atomic():
+        changed = list(unread.order_by().values('user_id', 'severity').annotate(n=Count('id')))
+        # Serializes concurrent mark-read calls for the same users
+        list(UserCounters.objects.select_for_update()
+             .filter(pk__in={row['user_id'] for row in changed}).values_list('pk'))
+        updated = unread.update(is_read=True, read_at=read_at or timezone.now())
+        deltas = {}
+        for row in changed:
+            user = deltas.setdefault(row['user_id'], {})
+            field = unread_field(row['severity'])
+            user[field] = user.get(field, 0) - row['n']
+        for user_id, user_deltas in deltas.items():
+            adjust(user_id, **user_deltas)
+    return updated
+
+
+# ============================================
+# SIGNAL RECEIVERS
+# ============================================
+def alert_state(alert):
+    # Read from __dict__ so deferred fields are never loaded just to count
+    values = alert.__dict__
+    if 'is_read' not in values or 'severity' not in values:
+        return None
+    return values.get('user_id'), values['is_read'], values['severity']
+
+
+def alert_initialized(sender, instance, **kwargs):
+    instance._counted_state = alert_state(instance)
+
+
+def alert_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = None if created else getattr(instance, '_counted_state', None)
+    after = alert_state(instance)
+    if created or (before is not None and before != after):
+        _count_alert_change(before, after)
+    instance._counted_state = after
+
+
+def alert_deleted(sender, instance, **kwargs):
+    if instance.farm_id in _deleting_farms():
+        return
+    _count_alert_change(getattr(instance, '_counted_state', None), None)
+
+
+def _count_alert_change(before, after):
+    deltas = {}
+    if before is not None and not before[1]:
+        deltas.setdefault(before[0], {})[unread_field(before[2])] = -1
+    if after is not None and not after[1]:
+        user = deltas.setdefault(after[0], {})
+        field = unread_field(after[2])
+        user[field] = user.get(field, 0) + 1
+    for user_id, user_deltas in deltas.items():
+        adjust(user_id, **user_deltas)
+
+
+def farm_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        adjust(instance.user_id, total_farms=1)
+
+
+def farm_deleting(sender, instance, **kwargs):
+    _deleting_farms().add(instance.pk)
+
+
+def farm_deleted(sender, instance, **kwargs):
+    _deleting_farms().discard(instance.pk)
+    # Recount once; skipped when the user (and their counters) are going too
+    if UserCounters.objects.filter(pk=instance.user_id).exists():
+        recount(instance.user_id)
+
+
+def detection_initialized(sender, instance, **kwargs):
+    instance._counted_status = instance.__dict__.get('status')
+
+
+def detection_saved(sender, instance, created, raw=False, **kwargs):
+    # Only completed detections are counted, so queued jobs are counted
+    # when their result is saved, not when the upload is accepted
+    if raw:
+        return
+    before = None if created else getattr(instance, '_counted_status', None)
+    after = instance.__dict__.get('status')
+    if after is None:
+        return
+    if after == 'completed' and before != 'completed':
+        adjust(_farm_owner(instance), total_detections=1)
+    elif before == 'completed' and after != 'completed':
+        adjust(_farm_owner(instance), total_detections=-1)
+    instance._counted_status = after
+
+
+def detection_deleted(sender, instance, **kwargs):
+    if instance.farm_id in _deleting_farms():
+        return
+    if getattr(instance, '_counted_status', None) == 'completed':
+        adjust(_farm_owner(instance), total_detections=-1)
+
+
+def _farm_owner(detection):
+    if DiseaseDetection.farm.is_cached(detection):
+        return detection.farm.user_id
+    return Farm.objects.filter(pk=detection.farm_id).values_list('user_id', flat=True).first()
+
+
+def _deleting_farms():
+    if not hasattr(_deleting, 'farms'):
+        _deleting.farms = set()
+    return _deleting.farms
+
+
+# ============================================
+# RECONCILIATION
+# ============================================
+def actual_counts(user_ids):
+    """Counters computed from the source tables, per user id"""
+    counts = {user_id: dict.fromkeys(COUNTER_FIELDS, 0) for user_id in user_ids}
+    for row in (Alert.objects.filter(user_id__in=user_ids, is_read=False)
+                .order_by().values('user_id', 'severity').annotate(n=Count('id'))):
+        counts[row['user_id']][unread_field(row['severity'])] += row['n']
+    for row in (Farm.objects.filter(user_id__in=user_ids)
+                .order_by().values('user_id').annotate(n=Count('id'))):
+        counts[row['user_id']]['total_farms'] = row['n']
+    for row in (DiseaseDetection.objects.filter(farm__user_id__in=user_ids, status='completed')
+                .order_by().values('farm__user_id').annotate(n=Count('id'))):
+        counts[row['farm__user_id']]['total_detections'] = row['n']
+    return counts
+
+
+def recount(user_id):
+    """Rebuild one user's counters from the source tables"""
+    counters, _ = UserCounters.objects.update_or_create(
+        user_id=user_id, defaults=actual_counts([user_id])[user_id])
+    return counters
+
+
+def reconcile(user_ids=None, chunk_size=500):
+    """Compare every user's counters with the source tables and repair drift
+
+    Users are processed in chunks, each in its own transaction with the
+    counter rows locked while they are recounted. Returns a stats dict.
+    """
+    started = time.monotonic()
+    if user_ids is None:
+        user_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+    user_ids = list(user_ids)
+    repaired = created = 0
+
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        with transaction.atomic():
+            stored = {row.pk: row for row in
+                      UserCounters.objects.select_for_update().filter(pk__in=chunk)}
+            actual = actual_counts(chunk)
+            now = timezone.now()
+            missing, drifted = [], []
+            for user_id in chunk:
+                row = stored.get(user_id)
+                if row is None:
+                    missing.append(UserCounters(user_id=user_id, **actual[user_id]))
+                elif any(getattr(row, field) != actual[user_id][field] for field in COUNTER_FIELDS):
+                    for field in COUNTER_FIELDS:
+                        setattr(row, field, actual[user_id][field])
+                    row.updated_at = now
+                    drifted.append(row)
+            UserCounters.objects.bulk_create(missing)
+            UserCounters.objects.bulk_update(drifted, COUNTER_FIELDS + ('updated_at',))
+        created += len(missing)
+        repaired += len(drifted)
+
+    counters_created.inc(created)
+    counters_repaired.inc(repaired)
+    return {
+        'users': len(user_ids),
+        'created': created,
+        'repaired': repaired,
+        'seconds': round(time.monotonic() - started, 3),
+    }
@@ -0,0 +1,223 @@
+# Disease Detection Pipeline for CropGuard AI
+# File: api/detection.py
+
+import random
+
+from django.conf import settings
+
+from inference.cache import ResultCache
+from inference.ingest import ImageRejected, ingest_image
+from inference.overlay import encode_jpeg, render_spots
+
+from .artifacts import store_overlay
+
+
+# ============================================
+# MOCK DISEASE DATABASE
+# ============================================
+# Mock disease detection results with comprehensive farmer-friendly data
+DISEASES_DB = [
+    {
+        'name': 'Powdery Mildew',
+        'confidence': 0.92,
+        'treatment': 'Apply sulfur-based fungicide or neem oil spray once weekly for 2-3 weeks. Ensure good air circulation around plants.',
+        'explanation': 'Powdery mildew is a fungal infection that appears as white powder on leaves. It thrives in warm, dry conditions and spreads quickly if not treated.',
+        'prevention': [
+            'Remove infected leaves and dispose of them properly',
+            'Improve air circulation by spacing plants adequately',
+            'Avoid overhead watering; water at soil level only',
+            'Apply preventive sulfur spray every 10-14 days during high-risk season'
+        ],
+        'affected_area_percent': 15.5,
+        'severity': 'Medium',
+        'healthy': False
+    },
+    {
+        'name': 'Early Blight',
+        'confidence': 0.85,
+        'treatment': 'Remove lower leaves (first 8-12 inches). Apply mancozeb or chlorothalonil fungicide every 7-10 days. Prune dense foliage.',
+        'explanation': 'Early blight causes brown spots with concentric rings on leaves. It starts on lower leaves and moves upward if left untreated. Common in tomatoes and potatoes.',
+        'prevention': [
+            'Remove infected leaves as soon as symptoms appear',
+            'Space plants for maximum air flow',
+            'Mulch soil to prevent soil splash',
+            'Rotate crops annually to different locations'
+        ],
+        'affected_area_percent': 22.8,
+        'severity': 'Medium',
+        'healthy': False
+    },
+    {
+        'name': 'Leaf Rust',
+        'confidence': 0.78,
+        'treatment': 'Apply rust-specific fungicides (sulfur or copper-based). Spray weekly until infection subsides. Remove severely affected leaves.',
+        'explanation': 'Leaf rust appears as reddish-brown or orange pustules on leaf undersides. It weakens plants by reducing photosynthesis capacity.',
+        'prevention': [
+            'Choose rust-resistant crop varieties when available',
+            'Maintain dry foliage by watering early morning at soil level',
+            'Thin crowded growth to improve air circulation',
+            'Remove and destroy heavily infected plant parts'
+        ],
+        'affected_area_percent': 8.3,
+        'severity': 'Low',
+        'healthy': False
+    },
+    {
+        'name': 'Healthy Crop',
+        'confidence': 0.95,
+        'treatment': 'Continue regular monitoring. Maintain good cultural practices: proper spacing, adequate water, and removal of dead leaves.',
+        'explanation': 'No visible disease detected. Plant appears healthy with normal leaf color and structure.',
+        'prevention': [
+            'Continue weekly crop monitoring',
+            'Maintain regular watering and fertilization schedule',
+            'Remove any yellowed or diseased leaves as they appear',
+            'Keep weeds controlled around the crop'
+        ],
+        'affected_area_percent': 0.0,
+        'severity': 'Low',
+        'healthy': True
+    }
+]
+
+DISEASES_BY_NAME = {disease['name']: disease for disease in DISEASES_DB}
+
+# Result fields that depend on the uploaded image and are cached per upload
+CACHED_FIELDS = ('name', 'confidence', 'severity', 'affected_area_percent', 'healthy')
+
+
+# ============================================
+# RESULT CACHE
+# ============================================
+_result_cache = None
+
+
+def get_result_cache():
+    """Process-wide content-hash cache of detection results"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = ResultCache(
+            max_bytes=settings.INFERENCE_CACHE_MAX_BYTES,
+            disk_dir=settings.INFERENCE_CACHE_DIR or None,
+            name='detection_cache',
+        )
+    return _result_cache
+
+
+# ============================================
+# DETECTION
+# ============================================
+def mark_image(ingested, detection):
+    """Highlight (mock) affected areas and return the JPEG-encoded overlay"""
+    image = ingested.bgr()
+    scale = ingested.scale
+
+    # Mock disease spots on random regions (if diseased), in source pixels
+    spots = []
+    if not detection['healthy'] and detection['affected_area_percent'] > 0:
+        w, h = ingested.source_size
+        num_spots = max(2, int(detection['affected_area_percent'] / 5))
+        for _ in range(num_spots):
+            cx = random.randint(w // 4, 3 * w // 4)
+            cy = random.randint(h // 4, 3 * h // 4)
+            radius = random.randint(20, 60)
+            spots.append((cx * scale, cy * scale, radius * scale))
+
+    marked_image = render_spots(image, spots, max_side=settings.OVERLAY_MAX_SIDE)
+    return encode_jpeg(marked_image)
+
+
+def ingest_upload(upload):
+    """Hash an upload in chunks and prepare it for reduced-size decoding
+
+    Raises ``ImageRejected`` for oversize or undecodable uploads.
+    """
+    return ingest_image(
+        upload,
+        max_side=settings.OVERLAY_MAX_SIDE,
+        max_bytes=settings.MAX_UPLOAD_BYTES,
+        max_pixels=settings.MAX_IMAGE_PIXELS,
+    )
+
+
+def predict_batch(images):
+    """Classify a batch of ingested images in one model call
+
+    Mock model: picks a result per image from ``DISEASES_DB``.
+    """
+    return [random.choice(DISEASES_DB) for _ in images]
+
+
+def analyze_images(uploads):
+    """Run detection on a batch of uploads, reusing cached results for repeat uploads
+
+    Pixels are only decoded on a cache miss, and all misses go through the
+    model as one batch. Overlays are written once to media storage. Returns
+    one ``(detection, overlay_name, content_key)`` tuple per upload, in
+    order, or the ``ImageRejected`` raised for that upload.
+    """
+    cache = get_result_cache()
+    results = [None] * len(uploads)
+    entries = {}
+    misses = {}
+
+    for index, upload in enumerate(uploads):
+        try:
+            ingested = ingest_upload(upload)
+        except ImageRejected as e:
+            results[index] = e
+            continue
+        results[index] = ingested.key
+        if ingested.key not in entries and ingested.key not in misses:
+            entry = cache.get(ingested.key)
+            if entry is None:
+                misses[ingested.key] = ingested
+            else:
+                entries[ingested.key] = entry
+
+    batch = list(misses.values())
+    for ingested, detection in zip(batch, predict_batch(batch)):
+        entry = {field: detection[field] for field in CACHED_FIELDS}
+        try:
+            entry['overlay_name'] = store_overlay(ingested.key, mark_image(ingested, detection))
+        except ImageRejected as e:
+            entries[ingested.key] = e
+            continue
+        cache.put(ingested.key, entry)
+        entries[ingested.key] = entry
+
+    for index, key in enumerate(results):
+        if isinstance(key, ImageRejected):
+            continue
+        entry = entries[key]
+        if isinstance(entry, ImageRejected):
+            results[index] = entry
+            continue
+        detection = dict(DISEASES_BY_NAME[entry['name']])
+        detection.update({field: entry[field] for field in CACHED_FIELDS})
+        results[index] = (detection, entry.get('overlay_name'), key)
+    return results
+
+
+def analyze_image(upload):
+    """Run detection on one uploaded image; see ``analyze_images``
+
+    Raises ``ImageRejected`` for oversize or undecodable uploads.
+    """
+    result = analyze_images([upload])[0]
+    if isinstance(result, ImageRejected):
+        raise result
+    return result
+
+
+def detection_fields(detection, overlay_name):
+    """``DiseaseDetection`` field values for a detection result"""
+    return {
+        'marked_image': overlay_name,
+        'detected_disease': detection['name'],
+        'severity': detection['severity'].lower(),
+        'confidence': round(detection['confidence'] * 100, 2),
+        'affected_area_percentage': detection['affected_area_percent'],
+        'disease_description': detection['explanation'],
+        'chemical_treatment': detection['treatment'],
+        'preventive_measures': '\n'.join(detection['prevention']),
+    }
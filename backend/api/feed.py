@@ -0,0 +1,137 @@
+# Unread Alert Feed for CropGuard AI
+# File: api/feed.py
+#
+# ``/api/alerts/unread/`` pages through a user's unread alerts newest first
+# with keyset cursors on ``(created_at, id)``. Every page is a range read on
+# the (user, is_read, -created_at) index, however far back it is.
+# The first page also returns a sync cursor. Polling with ``?since=<sync>``
+# returns only the unread alerts created after it, oldest first, plus the
+# ids of alerts read since (on another device, or by ``mark_all_read``), so
+# an idle poll transfers almost nothing.
+#
+# Cursors are opaque url-safe base64 JSON. Delta polls look back
+# ``SYNC_OVERLAP`` past the previous sync so rows committed late by a slow
+# transaction are not missed; clients de-duplicate by id.
+
+import base64
+import binascii
+import json
+import uuid
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Alert
+
+SYNC_OVERLAP = timedelta(seconds=5)
+
+# Past this many read ids the client is told to reload instead
+MAX_READ_IDS = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# ============================================
+# CURSORS
+# ============================================
+def encode_cursor(created_at, alert_id=None, synced_at=None):
+    fields = {'t': created_at.isoformat()}
+    if alert_id is not None:
+        fields['id'] = str(alert_id)
+    if synced_at is not None:
+        fields['s'] = synced_at.isoformat()
+    raw = json.dumps(fields, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor, sync=False):
+    """``(created_at, id, synced_at)`` from a cursor; raises ``InvalidCursor``"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        fields = json.loads(raw)
+        created_at = parse_datetime(fields['t'])
+        alert_id = uuid.UUID(fields['id']) if 'id' in fields else None
+        synced_at = parse_datetime(fields['s']) if 's' in fields else None
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError, KeyError, AttributeError):
+        raise InvalidCursor('Invalid cursor')
+    if created_at is None or (sync and synced_at is None):
+        raise InvalidCursor('Invalid cursor')
+    return created_at, alert_id, synced_at
+
+
+def _before(created_at, alert_id):
+    if alert_id is None:
+        return Q(created_at__lt=created_at)
+    return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=alert_id)
+
+
+def _after(created_at, alert_id):
+    if alert_id is None:
+        return Q(created_at__gt=created_at)
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=alert_id)
+
+
+# ============================================
+# FEED
+# ============================================
+def unread_page(user, size, cursor=None):
+    """One page of unread alerts, newest first
+
+    Returns ``(alerts, next_cursor, sync_cursor)``; the sync cursor is only
+    issued for the first page.
+    """
+    synced_at = timezone.now()
+    alerts = Alert.objects.filter(user=user, is_read=False)
+    if cursor:
+        alerts = alerts.filter(_before(*decode_cursor(cursor)[:2]))
+    page = list(alerts.order_by('-created_at', '-id')[:size + 1])
+
+    next_cursor = None
+    if len(page) > size:
+        page = page[:size]
+        next_cursor = encode_cursor(page[-1].created_at, page[-1].id)
+
+    sync_cursor = None
+    if not cursor:
+        newest = page[0] if page else None
+        sync_cursor = encode_cursor(newest.created_at if newest else synced_at,
+                                    newest.id if newest else None, synced_at)
+    return page, next_cursor, sync_cursor
+
+
+def unread_delta(user, size, since):
+    """Changes since a sync cursor
+
+    Returns ``(alerts, read_ids, has_more, sync_cursor)``. ``alerts`` are at
+    most ``size`` unread alerts created after the cursor, oldest first, with
+    ``has_more`` telling the client to poll again straight away; the cursor
+    always moves past them. Alerts from the late-commit lookback that sort
+    before the cursor (at most ``size``, possibly already delivered) come
+    first. ``read_ids`` is None when more than ``MAX_READ_IDS`` alerts were
+    read and the client should reload the first page.
+    """
+    created_at, alert_id, synced_at = decode_cursor(since, sync=True)
+    now = timezone.now()
+    window = synced_at - SYNC_OVERLAP
+    unread = Alert.objects.filter(user=user, is_read=False).order_by('created_at', 'id')
+    after = _after(created_at, alert_id)
+
+    new = list(unread.filter(after)[:size + 1])
+    has_more = len(new) > size
+    new = new[:size]
+    lookback = list(unread.filter(created_at__gte=window).exclude(after)[:size])
+
+    read_ids = [
+        str(pk) for pk in Alert.objects.filter(user=user, is_read=True, read_at__gte=window)
+        .values_list('id', flat=True)[:MAX_READ_IDS + 1]
+    ]
+    if len(read_ids) > MAX_READ_IDS:
+        read_ids = None
+
+    if new:
+        created_at, alert_id = new[-1].created_at, new[-1].id
+    return lookback + new, read_ids, has_more, encode_cursor(created_at, alert_id, now)
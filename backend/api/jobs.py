@@ -0,0 +1,218 @@
+# Asynchronous Detection Jobs for CropGuard AI
+# File: api/jobs.py
+#
+# A DB-backed job queue that needs nothing beyond the configured database
+# (SQLite included): pending ``DiseaseDetection`` rows *are* the queue.
+# Workers claim a row with a conditional UPDATE (pending -> processing), so a
+# row is processed once even when the in-process pool and one or more
+# ``run_detection_worker`` processes poll the same table.
+# In 'local' mode a recovery thread, started by the first enqueue or status
+# poll, requeues stale rows and hands pending rows to the pool every
+# ``DETECTION_RECOVERY_INTERVAL`` seconds, so jobs left behind by a restart
+# are still run.
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+import metrics
+
+from .detection import analyze_image, detection_fields
+from .models import ActivityLog, DiseaseDetection
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_submitted = set()  # ids handed to this process's pool and not finished yet
+_recovery = None
+
+jobs_completed = metrics.counter('detection_jobs_completed')
+jobs_failed = metrics.counter('detection_jobs_failed')
+job_latency = metrics.histogram('detection_job_seconds')
+queue_wait = metrics.histogram('detection_job_queue_wait_seconds')
+
+
+# ============================================
+# ENQUEUE
+# ============================================
+def enqueue_detection(user, farm, upload):
+    """Persist a pending detection for ``upload`` and schedule it; returns the row"""
+    detection = DiseaseDetection.objects.create(
+        farm=farm,
+        original_image=upload,
+        detected_disease='',
+        severity='',
+        confidence=0,
+        status='pending',
+    )
+    ActivityLog.objects.create(
+        user=user,
+        farm=farm,
+        activity_type='image_uploaded',
+        description='Image queued for disease analysis',
+        details={'job_id': str(detection.id)}
+    )
+    if settings.DETECTION_WORKER_MODE == 'local':
+        transaction.on_commit(lambda: _submit_local(detection.id))
+        start_recovery()
+    return detection
+
+
+def _submit_local(detection_id):
+    with _executor_lock:
+        if detection_id in _submitted:
+            return False
+        _submitted.add(detection_id)
+    _get_executor().submit(_run_in_thread, detection_id)
+    return True
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.DETECTION_WORKERS,
+                thread_name_prefix='detection-worker',
+            )
+        return _executor
+
+
+def _run_in_thread(detection_id):
+    close_old_connections()
+    try:
+        if claim(detection_id):
+            process(DiseaseDetection.objects.get(pk=detection_id))
+    finally:
+        with _executor_lock:
+            _submitted.discard(detection_id)
+        close_old_connections()
+
+
+# ============================================
+# LOCAL RECOVERY
+# ============================================
+def recover_local():
+    """Requeue stale jobs and submit pending ones this process is not running"""
+    requeued = requeue_stale()
+    submitted = 0
+    for detection_id in DiseaseDetection.objects.filter(status='pending') \
+            .order_by('created_at').values_list('id', flat=True):
+        submitted += _submit_local(detection_id)
+    return {'requeued': requeued, 'submitted': submitted}
+
+
+def start_recovery():
+    """Start the local-mode recovery thread once per process"""
+    global _recovery
+    if settings.DETECTION_WORKER_MODE != 'local' or not settings.DETECTION_RECOVERY_INTERVAL:
+        return
+    with _executor_lock:
+        if _recovery is None:
+            _recovery = threading.Thread(target=_recover_forever, name='detection-recovery',
+                                         daemon=True)
+            _recovery.start()
+
+
+def _recover_forever():
+    while True:
+        close_old_connections()
+        try:
+            recover_local()
+        except Exception:
+            logger.exception('Detection job recovery failed')
+        finally:
+            close_old_connections()
+        time.sleep(settings.DETECTION_RECOVERY_INTERVAL)
+
+
+# ============================================
+# CLAIM AND PROCESS
+# ============================================
+def claim(detection_id):
+    """Atomically move a pending row to processing; True if this caller won it"""
+    return DiseaseDetection.objects.filter(pk=detection_id, status='pending').update(
+        status='processing', updated_at=timezone.now()
+    ) == 1
+
+
+def claim_next():
+    """Claim the oldest pending detection, or return None if the queue is empty"""
+    for detection_id in DiseaseDetection.objects.filter(status='pending') \
+            .order_by('created_at').values_list('id', flat=True)[:10]:
+        if claim(detection_id):
+            return DiseaseDetection.objects.get(pk=detection_id)
+    return None
+
+
+def process(detection):
+    """Run inference for a claimed detection and store the outcome"""
+    started = time.monotonic()
+    queue_wait.observe((timezone.now() - detection.created_at).total_seconds())
+    try:
+        with detection.original_image.open('rb') as upload:
+            result, overlay_name, _ = analyze_image(upload)
+        for field, value in detection_fields(result, overlay_name).items():
+            setattr(detection, field, value)
+        detection.status = 'completed'
+        with transaction.atomic():
+            # The detection is counted as it completes (see api/counters.py)
+            detection.save()
+            ActivityLog.objects.create(
+                user=detection.farm.user,
+                farm=detection.farm,
+                activity_type='analysis_run',
+                description=f'Detected {result["name"]} in image',
+                details={'confidence': result['confidence'], 'job_id': str(detection.id)}
+            )
+        jobs_completed.inc()
+    except Exception as e:
+        DiseaseDetection.objects.filter(pk=detection.pk).update(
+            status='failed', error_message=str(e)[:1000], updated_at=timezone.now()
+        )
+        jobs_failed.inc()
+    finally:
+        job_latency.observe(time.monotonic() - started)
+    return detection
+
+
+def run_pending(limit=None):
+    """Process queued detections until the queue is empty (or ``limit`` reached)"""
+    processed = 0
+    while limit is None or processed < limit:
+        detection = claim_next()
+        if detection is None:
+            break
+        process(detection)
+        processed += 1
+    return processed
+
+
+def requeue_stale(timeout=None):
+    """Return detections stuck in processing (e.g. after a crash) to the queue"""
+    timeout = timeout or settings.DETECTION_JOB_TIMEOUT
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return DiseaseDetection.objects.filter(status='processing', updated_at__lt=cutoff) \
+        .update(status='pending')
+
+
+# ============================================
+# STATUS
+# ============================================
+def wait_for(detection_id, user, timeout):
+    """Long-poll until a job finishes or ``timeout`` seconds pass; returns the row"""
+    start_recovery()
+    deadline = time.monotonic() + timeout
+    while True:
+        detection = DiseaseDetection.objects.filter(pk=detection_id, farm__user=user).first()
+        if detection is None or detection.status in ('completed', 'failed') \
+                or time.monotonic() >= deadline:
+            return detection
+        time.sleep(min(settings.DETECTION_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
@@ -0,0 +1,15 @@
+# Weather Retention Command
+# File: api/management/commands/compact_weather.py
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from api import rollups
+
+
+class Command(BaseCommand):
+    help = 'Roll up raw weather readings past retention into hourly/daily aggregates'
+
+    def handle(self, *args, **options):
+        self.stdout.write(json.dumps(rollups.compact()))
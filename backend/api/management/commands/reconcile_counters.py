@@ -0,0 +1,22 @@
+# Per-user Counter Reconciliation Command
+# File: api/management/commands/reconcile_counters.py
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from api import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute per-user unread/farm/detection counters and repair any drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', type=int,
+                            help='Only reconcile this user id (repeatable)')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Users recounted per transaction')
+
+    def handle(self, *args, **options):
+        stats = counters.reconcile(user_ids=options['users'], chunk_size=options['chunk_size'])
+        self.stdout.write(json.dumps(stats))
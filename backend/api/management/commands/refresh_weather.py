@@ -0,0 +1,32 @@
+# Weather Ingestion Command
+# File: api/management/commands/refresh_weather.py
+
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import weather
+
+
+class Command(BaseCommand):
+    help = 'Refresh current weather (and optionally forecasts) for every active farm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep refreshing instead of exiting after one pass')
+        parser.add_argument('--interval', type=int, default=settings.WEATHER_REFRESH_INTERVAL,
+                            help='Seconds between passes when looping')
+        parser.add_argument('--forecast', action='store_true',
+                            help='Also refresh forecasts and their precomputed risk')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = weather.refresh_farms()
+            self.stdout.write(json.dumps(stats))
+            if options['forecast']:
+                self.stdout.write(json.dumps(weather.refresh_forecasts()))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,25 @@
+# Weather Risk Re-scoring Command
+# File: api/management/commands/rescore_weather_risk.py
+
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api import risk
+
+
+class Command(BaseCommand):
+    help = 'Re-score alert level and disease risk for stored weather readings in batch'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--farm', action='append', dest='farms',
+                            help='Only re-score this farm id (repeatable)')
+        parser.add_argument('--days', type=int,
+                            help='Only rewrite readings from the last N days')
+
+    def handle(self, *args, **options):
+        since = timezone.now() - timedelta(days=options['days']) if options['days'] else None
+        stats = risk.rescore(farm_ids=options['farms'], since=since)
+        self.stdout.write(json.dumps(stats))
@@ -0,0 +1,32 @@
+# Detection Job Worker
+# File: api/management/commands/run_detection_worker.py
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import jobs
+
+
+class Command(BaseCommand):
+    help = 'Process queued asynchronous disease detections from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue once and exit instead of polling')
+        parser.add_argument('--poll-interval', type=float, default=settings.DETECTION_POLL_INTERVAL,
+                            help='Seconds to sleep when the queue is empty')
+
+    def handle(self, *args, **options):
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} stale detection(s)')
+
+        while True:
+            processed = jobs.run_pending()
+            if processed:
+                self.stdout.write(f'Processed {processed} detection(s)')
+            if options['once']:
+                break
+            time.sleep(options['poll_interval'])
@@ -0,0 +1,32 @@
+# Alert Retention Command
+# File: api/management/commands/sweep_alerts.py
+
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = 'Archive and delete expired alerts and read alerts past retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mode', choices=archive.MODES, default=None,
+                            help='Archive target (default: ALERT_ARCHIVE_MODE)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Alerts archived per transaction (default: ALERT_SWEEP_BATCH)')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep sweeping instead of exiting after one pass')
+        parser.add_argument('--interval', type=int, default=settings.ALERT_SWEEP_INTERVAL,
+                            help='Seconds between passes when looping')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = archive.sweep(batch_size=options['batch_size'], mode=options['mode'])
+            self.stdout.write(json.dumps(stats))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -50,6 +50,32 @@ class UserProfile(models.Model):
         ordering = ['-created_at']
 
 
+class UserCounters(models.Model):
+    """Denormalized per-user totals, kept in step by api/counters.py"""
+    
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    
+    # Unread alerts by severity
+    unread_info = models.IntegerField(default=0)
+    unread_warning = models.IntegerField(default=0)
+    unread_critical = models.IntegerField(default=0)
+    
+    total_farms = models.IntegerField(default=0)
+    total_detections = models.IntegerField(default=0)
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def unread_alerts(self):
+        return self.unread_info + self.unread_warning + self.unread_critical
+    
+    def __str__(self):
+        return f"Counters - {self.user_id}"
+    
+    class Meta:
+        db_table = 'users_usercounters'
+
+
 # ============================================
 # FARM MODEL
 # ============================================
@@ -134,6 +160,7 @@ class Farm(models.Model):
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['region', 'crop_type']),
+            models.Index(fields=['latitude', 'longitude']),
         ]
 
 
@@ -154,6 +181,13 @@ class DiseaseDetection(models.Model):
         (models.DecimalField(validators=[MinValueValidator(0), MaxValueValidator(100)]), 'Confidence %'),
     ]
     
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
     # Basic Info
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='detections')
@@ -162,6 +196,7 @@ class DiseaseDetection(models.Model):
     original_image = models.ImageField(upload_to='disease_images/')
     image_url = models.URLField(max_length=500, blank=True)
     image_thumbnail = models.ImageField(upload_to='disease_thumbnails/', null=True, blank=True)
+    marked_image = models.ImageField(upload_to='disease_overlays/', null=True, blank=True)
     
     # Detection Results
     detected_disease = models.CharField(max_length=255)
@@ -182,6 +217,8 @@ class DiseaseDetection(models.Model):
     region_specific_notes = models.TextField(blank=True)
     
     # Status
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
+    error_message = models.TextField(blank=True)
     is_confirmed = models.BooleanField(default=False)
     user_feedback = models.CharField(max_length=20, choices=[
         ('accurate', 'Accurate'),
@@ -202,6 +239,7 @@ class DiseaseDetection(models.Model):
         indexes = [
             models.Index(fields=['farm', '-created_at']),
             models.Index(fields=['severity', 'created_at']),
+            models.Index(fields=['status', 'created_at']),
         ]
 
 
@@ -269,6 +307,95 @@ class WeatherData(models.Model):
         ]
 
 
+class WeatherRollup(models.Model):
+    """Hourly/daily weather aggregates that replace raw readings past retention"""
+    
+    RESOLUTIONS = [
+        ('hour', 'Hourly'),
+        ('day', 'Daily'),
+    ]
+    
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='weather_rollups')
+    resolution = models.CharField(max_length=10, choices=RESOLUTIONS)
+    bucket_start = models.DateTimeField()
+    samples = models.PositiveIntegerField(default=0)
+    
+    # Aggregates (floats keep the table narrow)
+    temperature_min = models.FloatField()
+    temperature_max = models.FloatField()
+    temperature_mean = models.FloatField()
+    humidity_min = models.FloatField()
+    humidity_max = models.FloatField()
+    humidity_mean = models.FloatField()
+    rainfall_total = models.FloatField(default=0)
+    wind_speed_mean = models.FloatField(default=0)
+    wind_speed_max = models.FloatField(default=0)
+    
+    def __str__(self):
+        return f"Weather {self.resolution} - {self.farm_id} - {self.bucket_start}"
+    
+    class Meta:
+        db_table = 'analysis_weatherrollup'
+        ordering = ['-bucket_start']
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'resolution', 'bucket_start'],
+                                    name='unique_weather_rollup_bucket'),
+        ]
+
+
+class WeatherForecast(models.Model):
+    """Upcoming weather for a farm, scored for disease risk at ingestion"""
+    
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='weather_forecasts')
+    forecast_for = models.DateTimeField()
+    
+    temperature = models.FloatField()
+    humidity = models.FloatField()
+    rainfall = models.FloatField(default=0, help_text="Rainfall in mm over the forecast step")
+    wind_speed = models.FloatField(default=0, help_text="Wind speed in km/h")
+    condition = models.CharField(max_length=50, choices=WeatherData.WEATHER_CONDITIONS)
+    description = models.CharField(max_length=255, blank=True)
+    
+    alert_level = models.CharField(max_length=20, choices=WeatherData.ALERT_LEVELS, default='green')
+    disease_risk = models.TextField(blank=True)
+    
+    source = models.CharField(max_length=50, default='openweather')
+    issued_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Forecast - {self.farm_id} - {self.forecast_for}"
+    
+    class Meta:
+        db_table = 'analysis_weatherforecast'
+        ordering = ['forecast_for']
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'forecast_for'], name='unique_weather_forecast'),
+        ]
+
+
+class ForecastDailyRisk(models.Model):
+    """Per-day disease risk summary over a farm's forecast horizon"""
+    
+    farm = models.ForeignKey(Farm, on_delete=models.CASCADE, related_name='forecast_risks')
+    date = models.DateField()
+    alert_level = models.CharField(max_length=20, choices=WeatherData.ALERT_LEVELS, default='green')
+    disease_risk = models.TextField(blank=True)
+    rainfall_total = models.FloatField(default=0)
+    temperature_max = models.FloatField()
+    humidity_max = models.FloatField()
+    issued_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Forecast risk - {self.farm_id} - {self.date} - {self.alert_level}"
+    
+    class Meta:
+        db_table = 'analysis_forecastdailyrisk'
+        ordering = ['date']
+        constraints = [
+            models.UniqueConstraint(fields=['farm', 'date'], name='unique_forecast_daily_risk'),
+        ]
+
+
 # ============================================
 # ALERTS/NOTIFICATIONS MODEL
 # ============================================
@@ -301,6 +428,12 @@ class Alert(models.Model):
     message = models.TextField()
     severity = models.CharField(max_length=20, choices=SEVERITY_LEVELS, default='info')
     
+    # Coalescing: repeats of (user, farm, alert_type, subject) within the
+    # window bump this alert instead of creating another (api/coalesce.py)
+    subject = models.CharField(max_length=255, blank=True)
+    occurrences = models.PositiveIntegerField(default=1)
+    last_seen_at = models.DateTimeField(null=True, blank=True)
+    
     # Related Data
     related_detection = models.ForeignKey(DiseaseDetection, on_delete=models.SET_NULL, null=True, blank=True)
     
@@ -325,6 +458,41 @@ class Alert(models.Model):
         indexes = [
             models.Index(fields=['user', '-created_at']),
             models.Index(fields=['is_read', '-created_at']),
+            models.Index(fields=['user', 'is_read', '-created_at']),
+            models.Index(fields=['user', 'read_at']),
+            models.Index(fields=['expires_at']),
+            models.Index(fields=['is_read', 'read_at']),
+        ]
+
+
+class ArchivedAlert(models.Model):
+    """Expired or long-read alerts moved out of the live table by the sweeper"""
+    
+    # Same id as the original alert; farm is a plain id so archives outlive farms
+    id = models.UUIDField(primary_key=True, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_alerts')
+    farm_id = models.UUIDField(null=True, blank=True)
+    
+    alert_type = models.CharField(max_length=50, choices=Alert.ALERT_TYPES)
+    title = models.CharField(max_length=255)
+    message = models.TextField()
+    severity = models.CharField(max_length=20, choices=Alert.SEVERITY_LEVELS)
+    occurrences = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    
+    created_at = models.DateTimeField()
+    read_at = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.title} - archived {self.archived_at}"
+    
+    class Meta:
+        db_table = 'notifications_archivedalert'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
         ]
 
 
@@ -0,0 +1,182 @@
+# Weather Providers for CropGuard AI
+# File: api/providers.py
+#
+# Every provider is a ``weather.WeatherClient`` subclass: the pooled session,
+# rate limiter, retries, latency budget and circuit breaker are shared, and a
+# provider only says where to call and how to read the answer. Readings carry
+# the provider's ``source`` so stored rows record who answered.
+#
+# ``HedgedClient`` pairs a primary with a secondary provider: if the primary
+# has not answered within its own p95 call latency, the same lookup is sent
+# to the secondary and whichever answers first wins. A primary that fails
+# outright fails over to the secondary immediately.
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+
+import metrics
+
+from . import weather
+from .weather import UpstreamError
+
+hedges_fired = metrics.counter('weather_hedges_fired')
+hedges_won = metrics.counter('weather_hedges_won')
+failovers = metrics.counter('weather_failovers')
+
+# WeatherAPI condition text -> WeatherData.WEATHER_CONDITIONS (first match wins)
+WEATHERAPI_CONDITIONS = (
+    ('thunder', 'stormy'),
+    ('snow', 'stormy'),
+    ('sleet', 'stormy'),
+    ('blizzard', 'stormy'),
+    ('ice', 'stormy'),
+    ('rain', 'rainy'),
+    ('drizzle', 'rainy'),
+    ('shower', 'rainy'),
+    ('fog', 'foggy'),
+    ('mist', 'foggy'),
+    ('partly', 'partly_cloudy'),
+    ('cloud', 'cloudy'),
+    ('overcast', 'cloudy'),
+    ('sunny', 'sunny'),
+    ('clear', 'sunny'),
+)
+
+
+# ============================================
+# WEATHERAPI.COM
+# ============================================
+class WeatherAPIClient(weather.WeatherClient):
+    """WeatherAPI.com provider; reports km/h and mm directly"""
+    source = 'weatherapi'
+    url_setting = 'WEATHERAPI_URL'
+    key_setting = 'WEATHERAPI_API_KEY'
+    key_param = 'key'
+
+    def current(self, latitude, longitude):
+        data = self.get('current.json', q=f'{latitude},{longitude}')
+        try:
+            reading = parse_weatherapi(data['current'])
+        except (KeyError, TypeError) as e:
+            raise UpstreamError(f'Unexpected weather payload: {e}') from e
+        reading['source'] = self.source
+        return reading
+
+    def forecast(self, latitude, longitude):
+        data = self.get('forecast.json', q=f'{latitude},{longitude}', days=3)
+        try:
+            points = [
+                (datetime.fromtimestamp(int(hour['time_epoch']), tz=dt_timezone.utc),
+                 dict(parse_weatherapi(hour), source=self.source))
+                for day in data['forecast']['forecastday'] for hour in day['hour']
+            ]
+        except (KeyError, TypeError, ValueError) as e:
+            raise UpstreamError(f'Unexpected forecast payload: {e}') from e
+        return points
+
+
+def parse_weatherapi(item):
+    """Map a WeatherAPI ``current`` or hourly forecast item to ``WeatherData`` fields"""
+    try:
+        text = str((item.get('condition') or {}).get('text', '')).strip()
+        return {
+            'temperature': round(float(item['temp_c']), 2),
+            'humidity': round(float(item['humidity']), 2),
+            'rainfall': round(float(item.get('precip_mm') or 0), 2),
+            'wind_speed': round(float(item.get('wind_kph') or 0), 2),
+            'condition': weatherapi_condition(text),
+            'description': text.lower(),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise UpstreamError(f'Unexpected weather payload: {e}') from e
+
+
+def weatherapi_condition(text):
+    text = text.lower()
+    for keyword, condition in WEATHERAPI_CONDITIONS:
+        if keyword in text:
+            return condition
+    return 'partly_cloudy'
+
+
+PROVIDERS = {
+    'openweather': weather.WeatherClient,
+    'weatherapi': WeatherAPIClient,
+}
+
+
+# ============================================
+# HEDGED REQUESTS
+# ============================================
+class HedgedClient:
+    """Send each lookup to ``primary``, hedged with ``secondary`` after a delay
+
+    The delay is ``hedge_after`` seconds, or else the primary's p95 call
+    latency (``WEATHER_HEDGE_DELAY`` until it has answered a few calls).
+    """
+
+    def __init__(self, primary, secondary, hedge_after=None):
+        self.primary = primary
+        self.secondary = secondary
+        self.hedge_after = hedge_after
+        self.concurrency = primary.concurrency
+        # Room for both legs of every lookup the ingestion pool can run at once
+        self._pool = ThreadPoolExecutor(max_workers=2 * self.concurrency,
+                                        thread_name_prefix='weather-hedge')
+
+    def current(self, latitude, longitude):
+        return self._hedged('current', latitude, longitude)
+
+    def forecast(self, latitude, longitude):
+        return self._hedged('forecast', latitude, longitude)
+
+    def hedge_delay(self):
+        if self.hedge_after is not None:
+            return self.hedge_after
+        p95 = self.primary.latency.percentile(95)
+        if p95 is None or p95 == float('inf') or self.primary.latency.count < 20:
+            return settings.WEATHER_HEDGE_DELAY
+        return p95
+
+    def _hedged(self, method, *args):
+        first = self._pool.submit(getattr(self.primary, method), *args)
+        done, _ = wait([first], timeout=self.hedge_delay())
+        if done:
+            if first.exception() is None:
+                return first.result()
+            failovers.inc()
+            try:
+                return getattr(self.secondary, method)(*args)
+            except UpstreamError:
+                raise first.exception()
+
+        hedges_fired.inc()
+        second = self._pool.submit(getattr(self.secondary, method), *args)
+        pending = {first, second}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is second:
+                        hedges_won.inc()
+                    return future.result()
+        raise first.exception()
+
+
+def provider_class(name):
+    try:
+        return PROVIDERS[name]
+    except KeyError:
+        raise ValueError(f'Unknown weather provider {name!r}; expected one of {tuple(PROVIDERS)}')
+
+
+def build_client(primary=None, secondary=None):
+    """Client for ``WEATHER_PROVIDER``, hedged with ``WEATHER_SECONDARY_PROVIDER`` if set"""
+    primary = primary or settings.WEATHER_PROVIDER
+    secondary = settings.WEATHER_SECONDARY_PROVIDER if secondary is None else secondary
+    client = provider_class(primary)()
+    if secondary and secondary != primary:
+        return HedgedClient(client, provider_class(secondary)())
+    return client
@@ -0,0 +1,236 @@
+# Vectorized Disease-risk Scoring for CropGuard AI
+# File: api/risk.py
+#
+# Weather history is loaded into NumPy columns (one row per reading, sorted
+# by farm then time) and every rule is evaluated over whole columns at once.
+# Rolling-window features such as hours of leaf wetness over the last three
+# days are computed per farm with a cumulative sum and ``searchsorted``, so
+# re-scoring the whole table after a rule change is a handful of array
+# operations plus one ``bulk_update`` per chunk.
+
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+
+import metrics
+
+from .models import WeatherData
+
+LEVELS = ('green', 'yellow', 'orange', 'red')
+
+# Leaf wetness: a reading counts as wet at or above this humidity or with rain
+WET_HUMIDITY = 90
+WETNESS_WINDOW_HOURS = 72
+WETNESS_WINDOW = timedelta(hours=WETNESS_WINDOW_HOURS)
+# A reading stands for the time since the previous one, capped at this
+MAX_READING_HOURS = 3.0
+DEFAULT_READING_HOURS = 1.0
+
+COLUMNS = ('temperature', 'humidity', 'rainfall', 'wind_speed')
+
+rows_scored = metrics.counter('risk_rows_scored')
+rows_rescored = metrics.counter('risk_rows_changed')
+rescore_rate = metrics.gauge('risk_rescore_rows_per_second')
+
+
+class Rule:
+    """A named condition over a ``Series`` that raises the alert level"""
+
+    def __init__(self, level, label, condition):
+        self.level = level
+        self.label = label
+        self.condition = condition
+
+
+RULES = (
+    Rule('red', 'Fungal disease risk: warm and very humid',
+         lambda s: (s.humidity > 80) & (s.temperature > 20)),
+    Rule('red', 'Prolonged leaf wetness (36h+ in 3 days)',
+         lambda s: s.wet_hours >= 36),
+    Rule('orange', 'Humid conditions favour fungal growth',
+         lambda s: (s.humidity > 70) & (s.temperature > 15)),
+    Rule('orange', 'Heavy rainfall: splash-borne disease risk',
+         lambda s: s.rainfall > 10),
+    Rule('orange', 'Extended leaf wetness (18h+ in 3 days)',
+         lambda s: s.wet_hours >= 18),
+)
+
+
+# ============================================
+# SERIES
+# ============================================
+class Series:
+    """Columnar weather readings sorted by farm, then time"""
+
+    def __init__(self, farm_ids, times, temperature, humidity, rainfall, wind_speed, ids=None):
+        farm_ids = np.asarray(farm_ids, dtype=object)
+        _, codes = np.unique(farm_ids.astype(str), return_inverse=True)
+        order = np.lexsort((np.asarray(times, dtype=np.float64), codes))
+        self.order = order
+        self.farm_ids = farm_ids[order]
+        self.farm_codes = np.ravel(codes)[order]
+        self.times = np.asarray(times, dtype=np.float64)[order]
+        self.temperature = np.asarray(temperature, dtype=np.float64)[order]
+        self.humidity = np.asarray(humidity, dtype=np.float64)[order]
+        self.rainfall = np.asarray(rainfall, dtype=np.float64)[order]
+        self.wind_speed = np.asarray(wind_speed, dtype=np.float64)[order]
+        self.ids = None if ids is None else np.asarray(ids, dtype=object)[order]
+        self._wet_hours = None
+
+    def __len__(self):
+        return len(self.times)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from ``(id, farm_id, recorded_at, temperature, humidity, rainfall, wind_speed)``"""
+        if not rows:
+            empty = np.empty(0)
+            return cls(empty, empty, empty, empty, empty, empty, ids=empty)
+        ids, farm_ids, recorded, *values = zip(*rows)
+        times = [moment.timestamp() for moment in recorded]
+        return cls(farm_ids, times, *[[float(v) for v in column] for column in values], ids=ids)
+
+    @property
+    def wet_hours(self):
+        """Hours of leaf wetness over the trailing window ending at each reading"""
+        if self._wet_hours is None:
+            self._wet_hours = rolling_sum(self, wetness_hours(self), WETNESS_WINDOW_HOURS)
+        return self._wet_hours
+
+
+def reading_hours(series):
+    """Hours each reading stands for: the gap since the farm's previous reading"""
+    hours = np.full(len(series), DEFAULT_READING_HOURS)
+    if len(series) > 1:
+        same_farm = series.farm_codes[1:] == series.farm_codes[:-1]
+        gaps = np.diff(series.times) / 3600.0
+        hours[1:] = np.where(same_farm, np.clip(gaps, 0, MAX_READING_HOURS), DEFAULT_READING_HOURS)
+    return hours
+
+
+def wetness_hours(series):
+    wet = (series.humidity >= WET_HUMIDITY) | (series.rainfall > 0)
+    return np.where(wet, reading_hours(series), 0.0)
+
+
+def rolling_sum(series, values, window_hours):
+    """Per-farm sum of ``values`` over readings within ``window_hours`` up to each one"""
+    if not len(series):
+        return np.empty(0)
+    # Offsetting each farm far apart on one time axis keeps windows per farm
+    span = series.times.max() - series.times.min() + window_hours * 3600.0 + 1
+    key = series.farm_codes * span + (series.times - series.times.min())
+    start = np.searchsorted(key, key - window_hours * 3600.0, side='right')
+    totals = np.concatenate(([0.0], np.cumsum(values)))
+    return totals[np.arange(1, len(series) + 1)] - totals[start]
+
+
+# ============================================
+# SCORING
+# ============================================
+def score(series, rules=RULES):
+    """Alert level and disease-risk text for every reading, in series order"""
+    if not len(series):
+        return np.empty(0, dtype=object), np.empty(0, dtype=object)
+    matches = np.stack([np.asarray(rule.condition(series), dtype=bool) for rule in rules])
+    rule_levels = np.array([LEVELS.index(rule.level) for rule in rules])
+    level_index = np.where(matches, rule_levels[:, None], 0).max(axis=0)
+    levels = np.asarray(LEVELS, dtype=object)[level_index]
+
+    # Only a few distinct rule combinations occur; build each text once
+    patterns, inverse = np.unique(matches.T, axis=0, return_inverse=True)
+    texts = np.array([
+        '; '.join(rule.label for rule, hit in zip(rules, pattern) if hit) for pattern in patterns
+    ], dtype=object)
+    rows_scored.inc(len(series))
+    return levels, texts[np.ravel(inverse)]
+
+
+def assess(readings, time_field='recorded_at', farms_per_chunk=500):
+    """Score unsaved readings in place, using each farm's recent observed history
+
+    ``readings`` are ``WeatherData`` or ``WeatherForecast`` objects; their
+    time is read from ``time_field``.
+    """
+    by_farm = {}
+    for weather in readings:
+        by_farm.setdefault(weather.farm_id, []).append(weather)
+    farm_ids = list(by_farm)
+    for offset in range(0, len(farm_ids), farms_per_chunk):
+        chunk = [w for farm_id in farm_ids[offset:offset + farms_per_chunk] for w in by_farm[farm_id]]
+        _assess_chunk(chunk, time_field)
+    return readings
+
+
+def _assess_chunk(readings, time_field):
+    earliest = min(getattr(weather, time_field) for weather in readings)
+    history = list(
+        WeatherData.objects.filter(
+            farm_id__in={weather.farm_id for weather in readings},
+            recorded_at__gte=earliest - WETNESS_WINDOW, recorded_at__lt=earliest,
+        ).values_list('id', 'farm_id', 'recorded_at', *COLUMNS)
+    )
+    rows = history + [
+        (index, weather.farm_id, getattr(weather, time_field),
+         *[getattr(weather, column) for column in COLUMNS])
+        for index, weather in enumerate(readings)
+    ]
+    series = Series.from_rows(rows)
+    levels, texts = score(series)
+    new = len(history)
+    for position, source in enumerate(series.order):
+        if source >= new:
+            readings[source - new].alert_level = levels[position]
+            readings[source - new].disease_risk = texts[position]
+
+
+# ============================================
+# RE-SCORING
+# ============================================
+def rescore(farm_ids=None, since=None, farms_per_chunk=500, batch_size=1000):
+    """Re-score stored readings and write back only the rows whose risk changed
+
+    Work is chunked by farm so a farm's whole window is always in memory;
+    ``since`` limits which rows are rewritten (older rows still feed windows).
+    """
+    started = time.monotonic()
+    if farm_ids is None:
+        farm_ids = WeatherData.objects.values_list('farm_id', flat=True).distinct()
+    farm_ids = list(farm_ids)
+    total = changed = 0
+
+    for offset in range(0, len(farm_ids), farms_per_chunk):
+        queryset = WeatherData.objects.filter(farm_id__in=farm_ids[offset:offset + farms_per_chunk])
+        if since is not None:
+            queryset = queryset.filter(recorded_at__gte=since - WETNESS_WINDOW)
+        rows = list(queryset.values_list(
+            'id', 'farm_id', 'recorded_at', *COLUMNS, 'alert_level', 'disease_risk'
+        ))
+        series = Series.from_rows([row[:-2] for row in rows])
+        levels, texts = score(series)
+        current = {row[0]: (row[-2], row[-1], row[2]) for row in rows}
+
+        updates = []
+        for row_id, level, text in zip(series.ids, levels, texts):
+            old_level, old_text, recorded_at = current[row_id]
+            if (since is None or recorded_at >= since) and (old_level, old_text) != (level, text):
+                updates.append(WeatherData(id=row_id, alert_level=level, disease_risk=text))
+        with transaction.atomic():
+            WeatherData.objects.bulk_update(updates, ['alert_level', 'disease_risk'],
+                                            batch_size=batch_size)
+        total += len(rows)
+        changed += len(updates)
+
+    elapsed = time.monotonic() - started
+    rows_rescored.inc(changed)
+    rate = round(total / elapsed, 1) if elapsed else None
+    rescore_rate.set(rate)
+    return {
+        'farms': len(farm_ids),
+        'rows': total,
+        'changed': changed,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': rate,
+    }
@@ -0,0 +1,273 @@
+# Weather Retention and Rollups for CropGuard AI
+# File: api/rollups.py
+#
+# Raw ``WeatherData`` rows are kept for ``WEATHER_RAW_RETENTION_DAYS``; older
+# readings are compacted into hourly and daily ``WeatherRollup`` rows
+# (min/max/mean, rainfall total) and then deleted. Hourly rollups are kept
+# for ``WEATHER_HOURLY_RETENTION_DAYS``, daily ones indefinitely. Compaction
+# works through one farm and one UTC day-range slice at a time, each in its
+# own short transaction, so a transaction covers a bounded number of readings
+# however much history has built up and SQLite never holds a long write lock.
+#
+# ``history`` answers a time-range query from whichever mix of raw rows and
+# rollups covers it, at a requested resolution or one picked from the length
+# of the range.
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg, Count, Max, Min, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+import metrics
+
+from .models import WeatherData, WeatherRollup
+
+RESOLUTIONS = ('raw', 'hour', 'day', 'week')
+AGGREGATE_FIELDS = (
+    'temperature_min', 'temperature_max', 'temperature_mean',
+    'humidity_min', 'humidity_max', 'humidity_mean',
+    'rainfall_total', 'wind_speed_mean', 'wind_speed_max',
+)
+RAW_FIELDS = ('temperature', 'humidity', 'rainfall', 'wind_speed', 'condition', 'alert_level')
+
+rows_compacted = metrics.counter('weather_rows_compacted')
+rollups_written = metrics.counter('weather_rollups_written')
+compaction_rate = metrics.gauge('weather_compaction_rows_per_second')
+
+
+# ============================================
+# AGGREGATION
+# ============================================
+def aggregate_raw(queryset, resolution):
+    """Group raw readings into ``resolution`` buckets in the database
+
+    Returns a list of dicts with ``farm_id``, ``bucket_start``, ``samples``
+    and the ``AGGREGATE_FIELDS``.
+    """
+    rows = (
+        queryset.order_by()
+        .annotate(bucket=Trunc('recorded_at', resolution))
+        .values('farm_id', 'bucket')
+        .annotate(
+            samples=Count('id'),
+            temperature_min=Min('temperature'),
+            temperature_max=Max('temperature'),
+            temperature_mean=Avg('temperature'),
+            humidity_min=Min('humidity'),
+            humidity_max=Max('humidity'),
+            humidity_mean=Avg('humidity'),
+            rainfall_total=Sum('rainfall'),
+            wind_speed_mean=Avg('wind_speed'),
+            wind_speed_max=Max('wind_speed'),
+        )
+    )
+    return [
+        dict(
+            farm_id=row['farm_id'],
+            bucket_start=row['bucket'],
+            samples=row['samples'],
+            **{field: float(row[field] or 0) for field in AGGREGATE_FIELDS}
+        )
+        for row in rows
+    ]
+
+
+def merge(a, b):
+    """Combine two aggregates of the same bucket"""
+    total = a['samples'] + b['samples']
+    merged = dict(a, samples=total)
+    for prefix in ('temperature', 'humidity'):
+        merged[f'{prefix}_min'] = min(a[f'{prefix}_min'], b[f'{prefix}_min'])
+        merged[f'{prefix}_max'] = max(a[f'{prefix}_max'], b[f'{prefix}_max'])
+    for field in ('temperature_mean', 'humidity_mean', 'wind_speed_mean'):
+        merged[field] = (a[field] * a['samples'] + b[field] * b['samples']) / total
+    merged['rainfall_total'] = a['rainfall_total'] + b['rainfall_total']
+    merged['wind_speed_max'] = max(a['wind_speed_max'], b['wind_speed_max'])
+    return merged
+
+
+def rollup_dict(rollup):
+    return dict(
+        farm_id=rollup.farm_id,
+        bucket_start=rollup.bucket_start,
+        samples=rollup.samples,
+        **{field: getattr(rollup, field) for field in AGGREGATE_FIELDS}
+    )
+
+
+def upsert(aggregates, resolution):
+    """Write aggregates, merging into rollups that already hold the same bucket"""
+    if not aggregates:
+        return 0
+    existing = {
+        (rollup.farm_id, rollup.bucket_start): rollup
+        for rollup in WeatherRollup.objects.filter(
+            resolution=resolution,
+            farm_id__in={a['farm_id'] for a in aggregates},
+            bucket_start__gte=min(a['bucket_start'] for a in aggregates),
+            bucket_start__lte=max(a['bucket_start'] for a in aggregates),
+        )
+    }
+    created, updated = [], []
+    for aggregate in aggregates:
+        rollup = existing.get((aggregate['farm_id'], aggregate['bucket_start']))
+        if rollup is None:
+            created.append(WeatherRollup(resolution=resolution, **aggregate))
+            continue
+        for field, value in merge(rollup_dict(rollup), aggregate).items():
+            setattr(rollup, field, value)
+        updated.append(rollup)
+    WeatherRollup.objects.bulk_create(created, batch_size=500)
+    WeatherRollup.objects.bulk_update(updated, ('samples',) + AGGREGATE_FIELDS, batch_size=500)
+    rollups_written.inc(len(created) + len(updated))
+    return len(created) + len(updated)
+
+
+# ============================================
+# COMPACTION
+# ============================================
+def retention_cutoffs(now=None):
+    """``(raw, hourly)`` cutoffs, aligned to the start of a UTC day"""
+    today = (now or timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    return (today - timedelta(days=settings.WEATHER_RAW_RETENTION_DAYS),
+            today - timedelta(days=settings.WEATHER_HOURLY_RETENTION_DAYS))
+
+
+def compact(now=None, days_per_slice=1, delete_batch=2000):
+    """Roll up and delete raw readings past retention; drop expired hourly rollups"""
+    started = time.monotonic()
+    raw_cutoff, hourly_cutoff = retention_cutoffs(now)
+    # Rows written after this point (late backfills) are left for the next run
+    snapshot = timezone.now()
+    expired = WeatherData.objects.filter(recorded_at__lt=raw_cutoff, created_at__lte=snapshot)
+    farm_ids = list(expired.order_by().values_list('farm_id', flat=True).distinct())
+
+    compacted = written = slices = largest = 0
+    for farm_id in farm_ids:
+        readings = expired.filter(farm_id=farm_id)
+        oldest = readings.aggregate(oldest=Min('recorded_at'))['oldest']
+        while oldest is not None:
+            slice_start = oldest.replace(hour=0, minute=0, second=0, microsecond=0)
+            slice_end = min(slice_start + timedelta(days=days_per_slice), raw_cutoff)
+            chunk = readings.filter(recorded_at__gte=slice_start, recorded_at__lt=slice_end)
+            with transaction.atomic():
+                written += upsert(aggregate_raw(chunk, 'hour'), 'hour')
+                written += upsert(aggregate_raw(chunk, 'day'), 'day')
+                deleted = delete_in_batches(chunk, delete_batch)
+            compacted += deleted
+            largest = max(largest, deleted)
+            slices += 1
+            # Skips gaps in the history instead of stepping through empty days
+            oldest = readings.filter(recorded_at__gte=slice_end) \
+                .aggregate(oldest=Min('recorded_at'))['oldest']
+
+    dropped = delete_in_batches(
+        WeatherRollup.objects.filter(resolution='hour', bucket_start__lt=hourly_cutoff),
+        delete_batch, atomic=True,
+    )
+
+    elapsed = time.monotonic() - started
+    rows_compacted.inc(compacted)
+    rate = round(compacted / elapsed, 1) if elapsed else None
+    compaction_rate.set(rate)
+    return {
+        'raw_cutoff': raw_cutoff.isoformat(),
+        'hourly_cutoff': hourly_cutoff.isoformat(),
+        'farms': len(farm_ids),
+        'transactions': slices,
+        'largest_transaction_rows': largest,
+        'rows_compacted': compacted,
+        'rollups_written': written,
+        'hourly_rollups_dropped': dropped,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': rate,
+    }
+
+
+def delete_in_batches(queryset, batch_size, atomic=False):
+    """Delete by primary key in bounded batches; returns the number deleted"""
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        if atomic:
+            with transaction.atomic():
+                queryset.model.objects.filter(pk__in=ids).delete()
+        else:
+            queryset.model.objects.filter(pk__in=ids).delete()
+        deleted += len(ids)
+
+
+# ============================================
+# RANGE QUERIES
+# ============================================
+def pick_resolution(start, end, now=None):
+    """Finest resolution that still exists for ``start`` and suits the range length"""
+    raw_cutoff, hourly_cutoff = retention_cutoffs(now)
+    span = end - start
+    if start >= raw_cutoff and span <= timedelta(days=settings.WEATHER_RAW_MAX_SPAN_DAYS):
+        return 'raw'
+    if start >= hourly_cutoff and span <= timedelta(days=settings.WEATHER_HOURLY_MAX_SPAN_DAYS):
+        return 'hour'
+    return 'day'
+
+
+def history(farm_id, start, end, resolution=None):
+    """Weather for one farm over ``[start, end)``, oldest first
+
+    ``resolution`` is ``raw``, ``hour``, ``day`` or ``week`` (default: picked
+    from the range). Returns ``(resolution, points)``. Raw points carry the
+    reading fields; aggregated points merge stored rollups with raw readings
+    that have not been compacted yet, so the boundary between the two is
+    invisible. Weekly buckets are built from daily rollups.
+    """
+    resolution = resolution or pick_resolution(start, end)
+    raw = WeatherData.objects.filter(farm_id=farm_id, recorded_at__gte=start, recorded_at__lt=end)
+
+    if resolution == 'raw':
+        points = [
+            dict(time=row['recorded_at'], **{f: _plain(row[f]) for f in RAW_FIELDS})
+            for row in raw.order_by('recorded_at').values('recorded_at', *RAW_FIELDS)
+        ]
+        return resolution, points
+
+    stored_resolution = 'day' if resolution == 'week' else resolution
+    stored = WeatherRollup.objects.filter(
+        farm_id=farm_id, resolution=stored_resolution,
+        bucket_start__gte=start, bucket_start__lt=end,
+    )
+    buckets = {}
+    for aggregate in [rollup_dict(r) for r in stored] + aggregate_raw(raw, resolution):
+        key = aggregate['bucket_start']
+        if resolution == 'week':
+            key = week_start(key)
+        buckets[key] = merge(buckets[key], aggregate) if key in buckets else aggregate
+
+    points = [
+        dict(time=key, samples=buckets[key]['samples'],
+             **{f: round(buckets[key][f], 2) for f in AGGREGATE_FIELDS})
+        for key in sorted(buckets)
+    ]
+    return resolution, points
+
+
+def week_start(moment):
+    """Monday 00:00 of the week holding ``moment`` (matches ``Trunc(..., 'week')``)"""
+    return (moment - timedelta(days=moment.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+
+
+def columnar(points):
+    """Turn a list of point dicts into parallel arrays keyed by field"""
+    if not points:
+        return {}
+    return {field: [point[field] for point in points] for field in points[0]}
+
+
+def _plain(value):
+    return float(value) if hasattr(value, 'as_tuple') else value
@@ -6,7 +6,7 @@ from django.contrib.auth.models import User
 from .models import (
     UserProfile, Farm, DiseaseDetection, WeatherData, Alert,
     MarketPrice, FarmingRecommendation, FarmAnalytics, PestRecord,
-    IrrigationSchedule, ActivityLog
+    IrrigationSchedule, ActivityLog, WeatherForecast, ForecastDailyRisk
 )
 
 
@@ -133,10 +133,10 @@ class DiseaseDetectionDetailSerializer(serializers.ModelSerializer):
         model = DiseaseDetection
         fields = [
             'id', 'farm', 'original_image', 'image_url', 'image_thumbnail',
-            'detected_disease', 'disease_description', 'severity', 'severity_display',
-            'confidence', 'affected_area_percentage', 'chemical_treatment',
+            'marked_image', 'detected_disease', 'disease_description', 'severity',
+            'severity_display', 'confidence', 'affected_area_percentage', 'chemical_treatment',
             'organic_treatment', 'preventive_measures', 'weather_condition',
-            'region_specific_notes', 'is_confirmed', 'user_feedback',
+            'region_specific_notes', 'status', 'is_confirmed', 'user_feedback',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
@@ -171,6 +171,24 @@ class WeatherDataSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
 
 
+class DeviceReadingSerializer(serializers.ModelSerializer):
+    """One reading posted by an on-farm weather sensor"""
+    
+    class Meta:
+        model = WeatherData
+        fields = [
+            'recorded_at', 'temperature', 'humidity', 'rainfall', 'wind_speed',
+            'condition', 'description'
+        ]
+        extra_kwargs = {'condition': {'required': False}}
+    
+    def validate(self, attrs):
+        # Sensors rarely report a sky condition; infer a coarse one
+        if not attrs.get('condition'):
+            attrs['condition'] = 'rainy' if attrs.get('rainfall', 0) > 0 else 'partly_cloudy'
+        return attrs
+
+
 # ============================================
 # ALERT SERIALIZERS
 # ============================================
@@ -183,9 +201,9 @@ class AlertListSerializer(serializers.ModelSerializer):
         model = Alert
         fields = [
             'id', 'alert_type', 'alert_type_display', 'title', 'severity',
-            'severity_display', 'is_read', 'created_at'
+            'severity_display', 'occurrences', 'is_read', 'created_at', 'last_seen_at'
         ]
-        read_only_fields = ['id', 'created_at']
+        read_only_fields = ['id', 'occurrences', 'created_at', 'last_seen_at']
 
 
 class AlertDetailSerializer(serializers.ModelSerializer):
@@ -197,11 +215,11 @@ class AlertDetailSerializer(serializers.ModelSerializer):
         model = Alert
         fields = [
             'id', 'user', 'farm', 'alert_type', 'alert_type_display',
-            'title', 'message', 'severity', 'severity_display',
+            'title', 'message', 'severity', 'severity_display', 'occurrences',
             'related_detection', 'is_read', 'read_at', 'action_required',
-            'action_url', 'created_at', 'expires_at'
+            'action_url', 'created_at', 'last_seen_at', 'expires_at'
         ]
-        read_only_fields = ['id', 'created_at']
+        read_only_fields = ['id', 'occurrences', 'created_at', 'last_seen_at']
 
 
 # ============================================
@@ -303,6 +321,7 @@ class PestRecordDetailSerializer(serializers.ModelSerializer):
 class IrrigationScheduleSerializer(serializers.ModelSerializer):
     """Irrigation schedule serializer"""
     status_display = serializers.CharField(source='get_status_display', read_only=True)
+    forecast_risk = serializers.SerializerMethodField()
     
     class Meta:
         model = IrrigationSchedule
@@ -310,9 +329,42 @@ class IrrigationScheduleSerializer(serializers.ModelSerializer):
             'id', 'farm', 'scheduled_date', 'scheduled_time', 'water_amount',
             'water_source', 'recommendation_reason', 'weather_impact',
             'status', 'status_display', 'completed_at', 'actual_water_used',
-            'created_at', 'updated_at'
+            'forecast_risk', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    def get_forecast_risk(self, obj):
+        # Precomputed risks are passed in by the view, keyed by (farm, date)
+        risks = self.context.get('forecast_risks')
+        if risks is None:
+            return None
+        day = risks.get((obj.farm_id, obj.scheduled_date))
+        return ForecastDailyRiskSerializer(day).data if day else None
+
+
+# ============================================
+# FORECAST SERIALIZERS
+# ============================================
+class WeatherForecastSerializer(serializers.ModelSerializer):
+    """Forecast point serializer"""
+    
+    class Meta:
+        model = WeatherForecast
+        fields = [
+            'forecast_for', 'temperature', 'humidity', 'rainfall', 'wind_speed',
+            'condition', 'description', 'alert_level', 'disease_risk'
+        ]
+
+
+class ForecastDailyRiskSerializer(serializers.ModelSerializer):
+    """Per-day forecast risk serializer"""
+    
+    class Meta:
+        model = ForecastDailyRisk
+        fields = [
+            'date', 'alert_level', 'disease_risk', 'rainfall_total',
+            'temperature_max', 'humidity_max', 'issued_at'
+        ]
 
 
 # ============================================
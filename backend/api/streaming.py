@@ -0,0 +1,324 @@
+# Alert Push Stream for CropGuard AI
+# File: api/streaming.py
+#
+# Server-sent events at ``/api/alerts/stream/``, served by the ASGI entry
+# point (cropguard_backend/asgi.py) next to Django. Each connection
+# subscribes to an in-process broker for its user; alerts created in this
+# process are pushed as soon as their transaction commits. Alerts written by
+# other processes on the node (management commands, other workers) are
+# picked up by one tail query per process every
+# ``ALERT_STREAM_POLL_INTERVAL`` seconds, for connected users only, so no
+# shared broker (Redis) is needed.
+#
+# Every event carries the alert id; a reconnecting client sends it back as
+# ``Last-Event-ID`` (or ``?last_id=``) and receives what it missed first.
+# ``EventSource`` cannot set headers, so instead of the JWT the client passes
+# a signed stream ticket (``POST /api/alerts/stream_ticket/``) as ``?ticket=``.
+# Tickets only open this stream and expire after ``ALERT_STREAM_TICKET_TTL``
+# seconds; they are removed from the scope's query string before the
+# response starts, so server access logs never record them.
+
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from datetime import timedelta
+from urllib.parse import parse_qs, urlencode
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+import metrics
+
+from .models import Alert
+from .serializers import AlertDetailSerializer
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/alerts/stream/'
+TICKET_SALT = 'api.streaming.ticket'
+
+connections = metrics.gauge('alert_stream_connections')
+events_sent = metrics.counter('alert_stream_events_sent')
+overflows = metrics.counter('alert_stream_overflows')
+delivery_latency = metrics.histogram('alert_stream_delivery_seconds')
+
+
+class AlertEvent:
+    __slots__ = ('id', 'user_id', 'created_at', 'payload')
+
+    def __init__(self, alert):
+        self.id = str(alert.id)
+        self.user_id = alert.user_id
+        self.created_at = alert.created_at
+        self.payload = json.dumps(AlertDetailSerializer(alert).data, cls=DjangoJSONEncoder)
+
+    def encode(self):
+        return f'id: {self.id}\nevent: alert\ndata: {self.payload}\n\n'.encode()
+
+
+# ============================================
+# BROKER
+# ============================================
+class Subscriber:
+    """One open stream: a bounded queue fed from any thread"""
+
+    def __init__(self, user_id, loop):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=settings.ALERT_STREAM_QUEUE_SIZE)
+        self.overflowed = False
+        # Ids already delivered; the tail and in-process pushes can overlap
+        self._sent = deque(maxlen=1000)
+        self._sent_ids = set()
+
+    def push(self, events):
+        """Queue ``events`` from any thread, in one hop onto the stream's loop"""
+        self.loop.call_soon_threadsafe(self._put, events)
+
+    def _put(self, events):
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # The client resumes from its last id once this stream is closed
+                self.overflowed = True
+                return
+
+    def mark_sent(self, event):
+        """False if ``event`` was already delivered on this stream"""
+        if event.id in self._sent_ids:
+            return False
+        if len(self._sent) == self._sent.maxlen:
+            self._sent_ids.discard(self._sent[0])
+        self._sent.append(event.id)
+        self._sent_ids.add(event.id)
+        return True
+
+
+class AlertBroker:
+    """Per-process map of user id -> open streams"""
+
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._tail = None
+
+    def subscribe(self, user_id, loop):
+        subscriber = Subscriber(user_id, loop)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        self._ensure_tail(loop)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            streams = self._subscribers.get(subscriber.user_id, set())
+            streams.discard(subscriber)
+            if not streams:
+                self._subscribers.pop(subscriber.user_id, None)
+
+    def user_ids(self):
+        with self._lock:
+            return list(self._subscribers)
+
+    def publish(self, alerts):
+        """Push saved alerts to their owners' open streams (callable from any thread)"""
+        with self._lock:
+            targets = {user_id: list(streams) for user_id, streams in self._subscribers.items()}
+        events = {}
+        for alert in alerts:
+            if alert.user_id in targets:
+                events.setdefault(alert.user_id, []).append(AlertEvent(alert))
+        for user_id, user_events in events.items():
+            for subscriber in targets[user_id]:
+                subscriber.push(user_events)
+
+    def _ensure_tail(self, loop):
+        if not settings.ALERT_STREAM_POLL_INTERVAL:
+            return
+        with self._lock:
+            if self._tail is None or self._tail.done():
+                self._tail = loop.create_task(self._run_tail())
+
+    async def _run_tail(self):
+        interval = settings.ALERT_STREAM_POLL_INTERVAL
+        since = timezone.now()
+        while self.user_ids():
+            await asyncio.sleep(interval)
+            polled_at = timezone.now()
+            try:
+                alerts = await sync_to_async(_created_since)(
+                    self.user_ids(), since - timedelta(seconds=interval))
+            except Exception:
+                logger.exception('Alert stream tail query failed')
+                continue
+            self.publish(alerts)
+            since = polled_at
+
+
+broker = AlertBroker()
+
+
+def _created_since(user_ids, since):
+    close_old_connections()
+    return list(Alert.objects.filter(user_id__in=user_ids, created_at__gte=since)
+                .order_by('created_at', 'id')[:settings.ALERT_STREAM_BACKLOG])
+
+
+def publish_on_commit(alerts):
+    """Push ``alerts`` to open streams once the surrounding transaction commits"""
+    alerts = list(alerts)
+    if alerts:
+        transaction.on_commit(lambda: broker.publish(alerts))
+
+
+def alert_saved(sender, instance, created, **kwargs):
+    """``post_save`` receiver; bulk writers call ``publish_on_commit`` themselves"""
+    if created:
+        publish_on_commit([instance])
+
+
+# ============================================
+# RESUME
+# ============================================
+def missed_alerts(user_id, last_id):
+    """Alerts for ``user_id`` created after alert ``last_id``, oldest first"""
+    try:
+        anchor = Alert.objects.filter(pk=last_id, user_id=user_id).values('created_at').first()
+    except (ValidationError, ValueError):
+        anchor = None
+    if anchor is None:
+        return []
+    after = Q(created_at__gt=anchor['created_at']) | Q(created_at=anchor['created_at'], id__gt=last_id)
+    return [
+        AlertEvent(alert) for alert in
+        Alert.objects.filter(after, user_id=user_id)
+        .order_by('created_at', 'id')[:settings.ALERT_STREAM_BACKLOG]
+    ]
+
+
+def issue_ticket(user):
+    """Short-lived credential accepted only by the alert stream"""
+    return signing.dumps(user.pk, salt=TICKET_SALT)
+
+
+def authenticate(raw_token=None, ticket=None):
+    if ticket:
+        try:
+            user_id = signing.loads(ticket, salt=TICKET_SALT, max_age=settings.ALERT_STREAM_TICKET_TTL)
+        except signing.BadSignature:
+            return None
+        return User.objects.filter(pk=user_id, is_active=True).first()
+    if not raw_token:
+        return None
+    auth = JWTAuthentication()
+    try:
+        return auth.get_user(auth.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+        return None
+
+
+# ============================================
+# ASGI APPLICATION
+# ============================================
+async def alert_stream(scope, receive, send):
+    """ASGI app streaming the authenticated user's new alerts as server-sent events"""
+    params = parse_qs(scope.get('query_string', b'').decode())
+    ticket = params.pop('ticket', [''])[0]
+    # ASGI servers log the request line from the scope when the response starts
+    scope['query_string'] = urlencode(params, doseq=True).encode()
+    headers = {
+        name.decode('latin-1').lower(): value.decode('latin-1')
+        for name, value in scope.get('headers', [])
+    }
+    token = headers.get('authorization', '').removeprefix('Bearer ').strip()
+    base_headers = _cors_headers(headers.get('origin'))
+
+    user = await sync_to_async(authenticate)(token, ticket)
+    if user is None:
+        await send({'type': 'http.response.start', 'status': 401,
+                    'headers': base_headers + [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body',
+                    'body': json.dumps({'error': 'Authentication required'}).encode()})
+        return
+
+    # Subscribe before reading the backlog so nothing falls between the two
+    subscriber = broker.subscribe(user.pk, asyncio.get_running_loop())
+    connections.inc()
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': base_headers + [
+            (b'content-type', b'text/event-stream'),
+            (b'cache-control', b'no-cache'),
+            (b'x-accel-buffering', b'no'),
+        ]})
+        await _send_chunk(send, f'retry: {settings.ALERT_STREAM_RETRY_MS}\n\n'.encode())
+
+        last_id = headers.get('last-event-id') or params.get('last_id', [''])[0]
+        if last_id:
+            for event in await sync_to_async(missed_alerts)(user.pk, last_id):
+                await _deliver(send, subscriber, event)
+
+        while not subscriber.overflowed or not subscriber.queue.empty():
+            get = asyncio.ensure_future(subscriber.queue.get())
+            done, _ = await asyncio.wait({get, disconnect}, timeout=settings.ALERT_STREAM_HEARTBEAT,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if get in done:
+                await _deliver(send, subscriber, get.result())
+            else:
+                get.cancel()
+            if disconnect in done:
+                break
+            if not done:
+                await _send_chunk(send, b': keep-alive\n\n')
+        if subscriber.overflowed:
+            overflows.inc()
+    finally:
+        broker.unsubscribe(subscriber)
+        connections.dec()
+        disconnect.cancel()
+        try:
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        except OSError:
+            pass  # the client is already gone
+
+
+async def _deliver(send, subscriber, event):
+    if not subscriber.mark_sent(event):
+        return
+    await _send_chunk(send, event.encode())
+    events_sent.inc()
+    delivery_latency.observe(max(0.0, (timezone.now() - event.created_at).total_seconds()))
+
+
+async def _send_chunk(send, body):
+    await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def _cors_headers(origin):
+    if origin and origin in settings.CORS_ALLOWED_ORIGINS:
+        return [
+            (b'access-control-allow-origin', origin.encode('latin-1')),
+            (b'access-control-allow-credentials', b'true'),
+            (b'vary', b'Origin'),
+        ]
+    return []
@@ -1,7 +1,25 @@
 # Unit Tests for CropGuard AI API
 # File: api/tests.py
 
-from django.test import TestCase, Client
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.test import TestCase, Client, override_settings
+from django.utils import timezone
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth.models import User
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
@@ -9,8 +27,16 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import datetime, timedelta
 from .models import (
     UserProfile, Farm, DiseaseDetection, WeatherData, Alert,
-    MarketPrice, FarmingRecommendation, PestRecord, IrrigationSchedule
+    MarketPrice, FarmingRecommendation, PestRecord, IrrigationSchedule,
+    ActivityLog, WeatherRollup, WeatherForecast, ForecastDailyRisk, UserCounters,
+    ArchivedAlert
+)
+from . import (
+    alerts, archive, coalesce, counters, feed, jobs, providers, risk, rollups, streaming, views,
+    weather
 )
+from .detection import DISEASES_DB, get_result_cache
+import metrics
 
 
 class UserProfileTestCase(APITestCase):
@@ -403,3 +429,1698 @@ class ValidationTestCase(TestCase):
         )
         # Should validate successfully
 
+
+
+TEST_MEDIA_ROOT = tempfile.mkdtemp(prefix='cropguard-test-media-')
+TEST_DATA_DIR = os.path.join(os.path.dirname(__file__), 'test_data')
+
+
+def make_test_image(size=(64, 48), color=(40, 160, 60)):
+    """Return JPEG bytes for a solid-colour test photo."""
+    from io import BytesIO
+    from PIL import Image
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def make_farm(user, **fields):
+    """Create a farm with valid defaults for every required field."""
+    defaults = {
+        'farm_name': 'Test Farm',
+        'latitude': 18.5204,
+        'longitude': 73.8567,
+        'area_in_acres': 5.5,
+        'region': 'west',
+        'crop_type': 'tomato',
+        'planting_date': datetime.now().date(),
+        'soil_type': 'loamy',
+        'irrigation_type': 'drip',
+    }
+    defaults.update(fields)
+    return Farm.objects.create(user=user, **defaults)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DiseaseDetectionCacheTestCase(APITestCase):
+    """Test cases for the content-hash detection result cache."""
+
+    def setUp(self):
+        """Set up an authenticated farmer."""
+        self.user = User.objects.create_user(
+            username='testfarmer',
+            email='farmer@test.com',
+            password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, image_bytes):
+        return self.client.post('/api/disease-detection/', {
+            'image': SimpleUploadedFile('leaf.jpg', image_bytes, content_type='image/jpeg')
+        }, format='multipart')
+
+    def test_reupload_served_from_cache(self):
+        """Test re-uploading the same photo returns the cached result."""
+        cache = get_result_cache()
+        hits = cache.stats()['hits']
+        image_bytes = make_test_image(color=(10, 20, 30))
+
+        first = self.upload(image_bytes)
+        second = self.upload(image_bytes)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['disease_name'], second.data['disease_name'])
+        self.assertEqual(first.data['marked_image_url'], second.data['marked_image_url'])
+        self.assertEqual(cache.stats()['hits'], hits + 1)
+
+    @override_settings(MAX_UPLOAD_BYTES=1024)
+    def test_oversize_upload_rejected(self):
+        """Test uploads above MAX_UPLOAD_BYTES are refused before decoding."""
+        response = self.upload(make_test_image(size=(800, 800)) + b'\0' * 2048)
+        self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    def test_undecodable_upload_rejected(self):
+        """Test non-image uploads get a 400 instead of a mock result."""
+        response = self.upload(b'definitely not a jpeg')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_cache_counters_exposed(self):
+        """Test cache counters are visible on the metrics endpoint."""
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hits', response.data['detection_cache'])
+        self.assertIn('misses', response.data['detection_cache'])
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class DetectionArtifactTestCase(APITestCase):
+    """Test cases for stored, streamable overlay artifacts."""
+
+    def setUp(self):
+        """Set up a farmer with one farm."""
+        self.user = User.objects.create_user(
+            username='testfarmer',
+            email='farmer@test.com',
+            password='testpass123'
+        )
+        self.farm = make_farm(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def detect(self):
+        response = self.client.post('/api/disease-detection/', {
+            'image': SimpleUploadedFile('leaf.jpg', make_test_image(color=(90, 30, 200)),
+                                        content_type='image/jpeg')
+        }, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response
+
+    def test_response_returns_url_not_data_uri(self):
+        """Test the overlay is referenced by URL and stored with the detection."""
+        response = self.detect()
+        self.assertNotIn('marked_image', response.data)
+        self.assertIn('/api/artifacts/disease_overlays/', response.data['marked_image_url'])
+
+        detection = DiseaseDetection.objects.get(id=response.data['detection_id'])
+        self.assertTrue(detection.marked_image.name.startswith('disease_overlays/'))
+        self.assertTrue(detection.original_image.name.startswith('disease_images/'))
+
+    def test_artifact_served_with_cache_headers(self):
+        """Test artifacts carry long-lived cache headers and honour ETags."""
+        url = self.detect().data['marked_image_url']
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_artifact_range_request(self):
+        """Test a byte range is served as 206 partial content."""
+        url = self.detect().data['marked_image_url']
+        full = b''.join(self.client.get(url).streaming_content)
+
+        response = self.client.get(url, HTTP_RANGE='bytes=0-9')
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(response['Content-Range'], f'bytes 0-9/{len(full)}')
+        self.assertEqual(b''.join(response.streaming_content), full[:10])
+
+        unsatisfiable = self.client.get(url, HTTP_RANGE=f'bytes={len(full)}-')
+        self.assertEqual(unsatisfiable.status_code, 416)
+
+    def test_uploads_are_not_served_as_artifacts(self):
+        """Test media named after the uploaded file is not publicly served."""
+        detection = DiseaseDetection.objects.get(id=self.detect().data['detection_id'])
+        default_storage.save('disease_thumbnails/leaf.jpg', ContentFile(b'thumb'))
+        anonymous = APIClient()
+        for name in (detection.original_image.name, 'disease_thumbnails/leaf.jpg'):
+            response = anonymous.get(f'/api/artifacts/{name}')
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT, DETECTION_WORKER_MODE='external')
+class DetectionJobTestCase(APITestCase):
+    """Test cases for asynchronous detection jobs."""
+
+    def setUp(self):
+        """Set up a farmer with one farm."""
+        self.user = User.objects.create_user(
+            username='testfarmer',
+            email='farmer@test.com',
+            password='testpass123'
+        )
+        self.farm = make_farm(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def submit(self):
+        return self.client.post('/api/disease-detection/?mode=async', {
+            'image': SimpleUploadedFile('leaf.jpg', make_test_image(color=(5, 90, 5)),
+                                        content_type='image/jpeg')
+        }, format='multipart')
+
+    def test_job_accepted_and_pending(self):
+        """Test job mode returns 202 and persists a pending detection."""
+        response = self.submit()
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        detection = DiseaseDetection.objects.get(id=response.data['job_id'])
+        self.assertEqual(detection.status, 'pending')
+        self.assertTrue(response.data['status_url'].endswith(f"/jobs/{detection.id}/"))
+
+    def test_worker_completes_job(self):
+        """Test the queue worker fills in the detection results."""
+        job_id = self.submit().data['job_id']
+        self.assertEqual(jobs.run_pending(), 1)
+        self.assertEqual(jobs.run_pending(), 0)
+
+        response = self.client.get(f'/api/disease-detection/jobs/{job_id}/?wait=1')
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertTrue(response.data['result']['detected_disease'])
+        self.assertIsNotNone(response.data['marked_image_url'])
+
+    def test_jobs_are_listed_and_counted_once_completed(self):
+        """Test pending jobs stay out of detection lists and totals until they finish."""
+        job_id = self.submit().data['job_id']
+        self.assertEqual(self.client.get('/api/detections/').data['count'], 0)
+        self.assertEqual(self.client.get(f'/api/farms/{self.farm.id}/recent_detections/').data, [])
+        self.assertEqual(self.client.get('/api/profile/statistics/').data['total_detections'], 0)
+
+        jobs.run_pending()
+        self.assertEqual(self.client.get('/api/detections/').data['results'][0]['id'], str(job_id))
+        self.assertEqual(len(self.client.get(f'/api/farms/{self.farm.id}/recent_detections/').data), 1)
+        self.assertEqual(self.client.get('/api/profile/statistics/').data['total_detections'], 1)
+        self.assertEqual(counters.actual_counts([self.user.pk])[self.user.pk]['total_detections'], 1)
+
+        DiseaseDetection.objects.get(id=job_id).delete()
+        self.assertEqual(self.client.get('/api/profile/statistics/').data['total_detections'], 0)
+
+    @override_settings(DETECTION_WORKER_MODE='local', DETECTION_RECOVERY_INTERVAL=0)
+    def test_local_jobs_survive_a_restart(self):
+        """Test jobs left pending or processing by a dead process are run on recovery."""
+        pending = self.submit().data['job_id']
+        stale = self.submit().data['job_id']
+        self.assertTrue(jobs.claim(stale))
+        DiseaseDetection.objects.filter(pk=stale).update(
+            updated_at=timezone.now() - timedelta(hours=1))
+
+        inline = mock.Mock(submit=lambda fn, *args: fn(*args))
+        with mock.patch.object(jobs, '_get_executor', return_value=inline), \
+                mock.patch.object(jobs, 'close_old_connections'):
+            self.assertEqual(jobs.recover_local(), {'requeued': 1, 'submitted': 2})
+            self.assertEqual(jobs.recover_local(), {'requeued': 0, 'submitted': 0})
+
+        for job_id in (pending, stale):
+            response = self.client.get(f'/api/disease-detection/jobs/{job_id}/')
+            self.assertEqual(response.data['status'], 'completed')
+
+    def test_job_claimed_only_once(self):
+        """Test a pending row can only be claimed by one worker."""
+        job_id = self.submit().data['job_id']
+        self.assertTrue(jobs.claim(job_id))
+        self.assertFalse(jobs.claim(job_id))
+
+    def test_other_users_cannot_see_job(self):
+        """Test job status is scoped to the farm owner."""
+        job_id = self.submit().data['job_id']
+        other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(user=other)
+        response = self.client.get(f'/api/disease-detection/jobs/{job_id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(MEDIA_ROOT=TEST_MEDIA_ROOT)
+class BulkDetectionTestCase(APITestCase):
+    """Test cases for the bulk multi-image detection endpoint."""
+
+    def setUp(self):
+        """Set up a farmer with one farm."""
+        self.user = User.objects.create_user(
+            username='testfarmer',
+            email='farmer@test.com',
+            password='testpass123'
+        )
+        self.farm = make_farm(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, files, farm_id=None):
+        return self.client.post('/api/disease-detection/bulk/', {
+            'farm_id': str(farm_id or self.farm.id),
+            'images': files,
+        }, format='multipart')
+
+    def test_batch_results_in_order(self):
+        """Test every image gets a result, in upload order, from one request."""
+        files = [
+            SimpleUploadedFile(f'leaf{i}.jpg', make_test_image(color=(i * 20, 100, 50)),
+                               content_type='image/jpeg')
+            for i in range(5)
+        ]
+        files.insert(2, SimpleUploadedFile('notes.txt', b'not an image'))
+        response = self.upload(files)
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['filename'] for r in response.data['results']],
+                         ['leaf0.jpg', 'leaf1.jpg', 'notes.txt', 'leaf2.jpg', 'leaf3.jpg', 'leaf4.jpg'])
+        self.assertIn('error', response.data['results'][2])
+        self.assertEqual(response.data['count'], 5)
+        self.assertEqual(DiseaseDetection.objects.filter(farm=self.farm).count(), 5)
+
+        self.farm.refresh_from_db()
+        self.assertEqual(self.farm.total_analysis, 5)
+
+    def test_single_alert_and_activity_entry(self):
+        """Test one aggregated alert and activity log entry per batch."""
+        files = [
+            SimpleUploadedFile(f'leaf{i}.jpg', make_test_image(color=(200, i * 30, 10)),
+                               content_type='image/jpeg')
+            for i in range(6)
+        ]
+        diseased = [d for d in DISEASES_DB if not d['healthy']]
+        with mock.patch('api.detection.predict_batch',
+                        side_effect=lambda images: [diseased[i % 3] for i in range(len(images))]):
+            response = self.upload(files)
+
+        alert = Alert.objects.get(farm=self.farm)
+        self.assertEqual(alert.id, response.data['alert_id'])
+        self.assertEqual(alert.title, 'Disease detected in 6 of 6 images')
+        self.assertEqual(
+            ActivityLog.objects.filter(farm=self.farm, activity_type='analysis_run').count(), 1
+        )
+
+    def test_other_users_farm_rejected(self):
+        """Test a batch cannot target another user's farm."""
+        other_farm = make_farm(User.objects.create_user(username='other', password='pass123'))
+        files = [SimpleUploadedFile('leaf.jpg', make_test_image(), content_type='image/jpeg')]
+        response = self.upload(files, farm_id=other_farm.id)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class StubWeatherServer:
+    """Local stand-in for the weather provider, served from a thread.
+
+    ``responder(path, params)`` returns ``(status, payload)``; the default
+    reports humid, warm weather everywhere. Every request is recorded.
+    """
+
+    def __init__(self, responder=None):
+        self.requests = []
+        self.responder = responder or self.default_responder
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                stub.requests.append((url.path, params))
+                code, payload = stub.responder(url.path, params)
+                body = json.dumps(payload).encode()
+                try:
+                    self.send_response(code)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client gave up waiting (timeout tests)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    @staticmethod
+    def default_responder(path, params):
+        return 200, {
+            'main': {'temp': 24.0, 'humidity': 85},
+            'wind': {'speed': 2.0},
+            'rain': {'1h': 0.4},
+            'weather': [{'main': 'Rain', 'description': 'light rain'}],
+        }
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True)
+class WeatherIngestionTestCase(APITestCase):
+    """Test cases for the pooled weather ingestion engine."""
+
+    def setUp(self):
+        """Set up users with farms spread over distinct locations."""
+        self.user = User.objects.create_user(username='weatherfarmer', password='testpass123')
+        self.other = User.objects.create_user(username='otherfarmer', password='testpass123')
+        self.farms = [
+            make_farm(self.user if i % 2 else self.other, latitude=10 + i, longitude=70 + i)
+            for i in range(6)
+        ]
+        make_farm(self.user, is_active=False)
+        weather.get_cache().clear()
+
+    def client_for(self, stub, **options):
+        options.setdefault('rate_limit', 0)
+        options.setdefault('backoff', 0)
+        return weather.WeatherClient(base_url=stub.url, api_key='test-key', **options)
+
+    def test_refresh_writes_every_active_farm(self):
+        """Test one pass bulk-creates a reading and alert per active farm."""
+        with StubWeatherServer() as stub:
+            stats = weather.refresh_farms(client=self.client_for(stub, concurrency=4))
+        self.assertEqual(len(stub.requests), 6)
+        self.assertEqual(stub.requests[0][1]['appid'], 'test-key')
+        self.assertEqual((stats['refreshed'], stats['failed']), (6, 0))
+        self.assertIsNotNone(stats['upstream_latency_p95'])
+        reading = WeatherData.objects.get(farm=self.farms[0])
+        self.assertEqual((reading.condition, reading.alert_level), ('rainy', 'red'))
+        self.assertEqual(float(reading.wind_speed), 7.2)
+        self.assertEqual(Alert.objects.filter(alert_type='weather', user=self.user).count(), 3)
+
+    def test_transient_errors_are_retried(self):
+        """Test 503s are retried with backoff before giving up on a farm."""
+        failures = {'left': 2}
+
+        def flaky(path, params):
+            if failures['left']:
+                failures['left'] -= 1
+                return 503, {}
+            return StubWeatherServer.default_responder(path, params)
+
+        with StubWeatherServer(flaky) as stub:
+            client = self.client_for(stub, concurrency=1, max_retries=2)
+            stats = weather.refresh_farms(self.farms[:1], client=client)
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(stats['refreshed'], 1)
+
+    def test_failed_farms_are_reported(self):
+        """Test farms whose lookups keep failing are counted, not written."""
+        with StubWeatherServer(lambda path, params: (401, {})) as stub:
+            stats = weather.refresh_farms(self.farms[:2], client=self.client_for(stub))
+        self.assertEqual((stats['refreshed'], stats['failed']), (0, 2))
+        self.assertFalse(WeatherData.objects.exists())
+
+    def test_rate_limiter_spaces_requests(self):
+        """Test the token bucket holds calls to the configured rate."""
+        limiter = weather.RateLimiter(rate=50, burst=1)
+        started = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.09)
+
+    def test_farms_in_one_grid_cell_share_a_lookup(self):
+        """Test one upstream call per grid cell fans out to all its farms."""
+        district = [make_farm(self.user, latitude=18.501 + i * 0.005, longitude=73.851)
+                    for i in range(5)]
+        with StubWeatherServer() as stub:
+            stats = weather.refresh_farms(district + self.farms[:1], client=self.client_for(stub))
+        self.assertEqual((stats['cells'], stats['refreshed']), (2, 6))
+        self.assertEqual(len(stub.requests), 2)
+        self.assertEqual(WeatherData.objects.filter(farm__in=district).count(), 5)
+        # Lookups go to the cell centre, not to any one farm's location
+        self.assertIn(('18.525', '73.875'), [(p['lat'], p['lon']) for _, p in stub.requests])
+
+    @override_settings(WEATHER_GRID_SIZE=0)
+    def test_grid_can_be_disabled(self):
+        """Test a zero grid size looks up every farm at its own location."""
+        self.assertEqual(weather.grid_cell(18.5012, 73.8512), (18.5012, 73.8512))
+        self.assertNotEqual(weather.grid_cell(18.5012, 73.8512), weather.grid_cell(18.5013, 73.8512))
+
+    def test_fetch_weather_endpoint_uses_client(self):
+        """Test the per-farm endpoint stores a reading from the shared client."""
+        self.client.force_authenticate(user=self.user)
+        with StubWeatherServer() as stub:
+            with mock.patch.object(weather, '_client', self.client_for(stub)):
+                response = self.client.post(f'/api/farms/{self.farms[1].id}/fetch_weather/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['alert_level'], 'red')
+        self.assertEqual(Alert.objects.filter(user=self.user).count(), 1)
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True, WEATHER_CACHE_TTL=600, WEATHER_CACHE_STALE=3000)
+class WeatherCacheTestCase(APITestCase):
+    """Test cases for the TTL / stale-while-revalidate weather cache."""
+
+    def setUp(self):
+        """Set up a farm, an authenticated client and an empty cache."""
+        self.user = User.objects.create_user(username='cachefarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.client.force_authenticate(user=self.user)
+        weather._cache = None
+        self.responses = [StubWeatherServer.default_responder('', {})[1]]
+        self.stub = StubWeatherServer(lambda path, params: (200, self.responses[-1]))
+        self.stub.__enter__()
+        patcher = mock.patch.object(weather, '_client', weather.WeatherClient(
+            base_url=self.stub.url, api_key='test-key', rate_limit=0, backoff=0))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.stub.__exit__)
+
+    def fetch(self):
+        return self.client.post(f'/api/farms/{self.farm.id}/fetch_weather/')
+
+    def age_cache(self, seconds):
+        entry = weather.get_cache().get(weather.grid_cell(self.farm.latitude, self.farm.longitude))
+        entry.fetched_at -= timedelta(seconds=seconds)
+        for row in WeatherData.objects.filter(farm=self.farm):
+            WeatherData.objects.filter(pk=row.pk).update(
+                recorded_at=row.recorded_at - timedelta(seconds=seconds))
+
+    def test_fresh_reading_is_served_from_cache(self):
+        """Test repeat loads within the TTL neither call upstream nor insert rows."""
+        self.assertEqual(self.fetch()['X-Weather-Cache'], 'miss')
+        for _ in range(3):
+            response = self.fetch()
+            self.assertEqual(response['X-Weather-Cache'], 'fresh')
+        self.assertEqual(len(self.stub.requests), 1)
+        self.assertEqual(WeatherData.objects.filter(farm=self.farm).count(), 1)
+
+    def test_stale_reading_is_served_while_revalidating(self):
+        """Test a stale reading is returned and refreshed in the background."""
+        first = self.fetch()
+        self.age_cache(900)
+        self.responses.append(dict(self.responses[0], main={'temp': 18.0, 'humidity': 60}))
+        response = self.fetch()
+        self.assertEqual(response['X-Weather-Cache'], 'stale')
+        self.assertEqual(response.data['id'], first.data['id'])
+        self.assertEqual(len(self.stub.requests), 2)
+        latest = WeatherData.objects.filter(farm=self.farm).first()
+        self.assertEqual((float(latest.temperature), latest.alert_level), (18.0, 'green'))
+
+    def test_unchanged_reading_does_not_insert_a_row(self):
+        """Test a refetch that returns the same reading keeps the existing row."""
+        self.fetch()
+        self.age_cache(5000)
+        response = self.fetch()
+        self.assertEqual(response['X-Weather-Cache'], 'miss')
+        self.assertEqual(len(self.stub.requests), 2)
+        self.assertEqual(WeatherData.objects.filter(farm=self.farm).count(), 1)
+        self.assertEqual(Alert.objects.filter(user=self.user).count(), 1)
+
+    def test_recent_row_seeds_a_cold_cache(self):
+        """Test the latest stored row answers without calling upstream after a restart."""
+        weather.build_weather(self.farm, weather.parse_current(self.responses[0])).save()
+        response = self.client.get(f'/api/farms/{self.farm.id}/weather/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Weather-Cache'], 'fresh')
+        self.assertEqual(self.stub.requests, [])
+
+    def test_engine_skips_unchanged_readings(self):
+        """Test a second ingestion pass with identical readings inserts nothing."""
+        first = weather.refresh_farms()
+        second = weather.refresh_farms()
+        self.assertEqual((first['inserted'], second['inserted']), (1, 0))
+        self.assertEqual(WeatherData.objects.count(), 1)
+
+
+class RiskScoringTestCase(TestCase):
+    """Test cases for vectorized disease-risk scoring."""
+
+    def setUp(self):
+        """Set up two farms and a reference time."""
+        self.user = User.objects.create_user(username='riskfarmer', password='testpass123')
+        self.wet_farm = make_farm(self.user)
+        self.dry_farm = make_farm(self.user, farm_name='Dry Farm')
+        self.start = timezone.now() - timedelta(days=5)
+
+    def add_hourly(self, farm, hours, humidity, temperature=12, rainfall=0):
+        rows = [
+            WeatherData(farm=farm, temperature=temperature, humidity=humidity, rainfall=rainfall,
+                        wind_speed=5, condition='cloudy', source='manual',
+                        recorded_at=self.start + timedelta(hours=hour))
+            for hour in range(hours)
+        ]
+        WeatherData.objects.bulk_create(rows)
+        return rows
+
+    def test_instant_rules_are_vectorized(self):
+        """Test the point-in-time rules over a whole series at once."""
+        series = risk.Series(['a', 'a', 'b', 'c'], [0, 3600, 0, 0],
+                             temperature=[25, 18, 10, 10], humidity=[85, 75, 50, 50],
+                             rainfall=[0, 0, 15, 0], wind_speed=[0, 0, 0, 0])
+        levels, texts = risk.score(series)
+        self.assertEqual(list(levels), ['red', 'orange', 'orange', 'green'])
+        self.assertIn('warm and very humid', texts[0])
+        self.assertEqual(texts[3], '')
+
+    def test_leaf_wetness_window_is_per_farm(self):
+        """Test wet hours accumulate over the rolling window, farm by farm."""
+        self.add_hourly(self.wet_farm, 40, humidity=95)
+        self.add_hourly(self.dry_farm, 40, humidity=50)
+        series = risk.Series.from_rows(list(WeatherData.objects.values_list(
+            'id', 'farm_id', 'recorded_at', *risk.COLUMNS)))
+        wet = series.farm_ids == self.wet_farm.id
+        self.assertEqual(series.wet_hours[wet][17], 18.0)
+        self.assertEqual(series.wet_hours[wet][-1], 40.0)
+        self.assertEqual(series.wet_hours[~wet].max(), 0.0)
+        levels, _ = risk.score(series)
+        self.assertEqual(list(levels[wet][[16, 17, 35]]), ['green', 'orange', 'red'])
+
+    def test_window_expires_old_wetness(self):
+        """Test wetness older than the window no longer counts."""
+        self.add_hourly(self.wet_farm, 20, humidity=95)
+        self.start += timedelta(hours=100)
+        self.add_hourly(self.wet_farm, 1, humidity=50)
+        series = risk.Series.from_rows(list(WeatherData.objects.values_list(
+            'id', 'farm_id', 'recorded_at', *risk.COLUMNS)))
+        self.assertEqual(series.wet_hours[-1], 0.0)
+
+    def test_rescore_writes_only_changed_rows(self):
+        """Test a re-score bulk-updates rows whose risk changed, once."""
+        self.add_hourly(self.wet_farm, 24, humidity=95)
+        self.add_hourly(self.dry_farm, 24, humidity=50)
+        first = risk.rescore()
+        self.assertEqual((first['rows'], first['changed']), (48, 7))
+        self.assertEqual(risk.rescore()['changed'], 0)
+        latest = WeatherData.objects.filter(farm=self.wet_farm).first()
+        self.assertEqual(latest.alert_level, 'orange')
+        self.assertIn('leaf wetness', latest.disease_risk)
+
+    def test_new_readings_see_recent_history(self):
+        """Test readings scored at ingest include the farm's trailing window."""
+        self.add_hourly(self.wet_farm, 20, humidity=95)
+        reading = weather.build_weather(self.wet_farm, {
+            'temperature': 12, 'humidity': 95, 'rainfall': 0, 'wind_speed': 5,
+            'condition': 'cloudy', 'description': ''
+        }, recorded_at=self.start + timedelta(hours=20))
+        risk.assess([reading])
+        self.assertEqual(reading.alert_level, 'orange')
+
+
+@override_settings(WEATHER_RAW_RETENTION_DAYS=7, WEATHER_HOURLY_RETENTION_DAYS=30)
+class WeatherRollupTestCase(APITestCase):
+    """Test cases for weather retention, rollups and resolution selection."""
+
+    def setUp(self):
+        """Set up a farm with a reading every 30 minutes over 40 days."""
+        self.user = User.objects.create_user(username='rollupfarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.now = timezone.now().replace(minute=0, second=0, microsecond=0)
+        WeatherData.objects.bulk_create([
+            WeatherData(farm=self.farm, temperature=20 + (step % 2) * 4, humidity=60,
+                        rainfall=0.5, wind_speed=10, condition='cloudy', source='manual',
+                        recorded_at=self.now - timedelta(minutes=30 * step))
+            for step in range(1, 40 * 48)
+        ])
+        self.client.force_authenticate(user=self.user)
+
+    def test_compaction_rolls_up_and_deletes_expired_rows(self):
+        """Test rows past retention become hourly/daily rollups and are deleted."""
+        raw_cutoff, hourly_cutoff = rollups.retention_cutoffs()
+        before = WeatherData.objects.count()
+        stats = rollups.compact(delete_batch=100)
+        self.assertEqual(stats['rows_compacted'], before - WeatherData.objects.count())
+        self.assertFalse(WeatherData.objects.filter(recorded_at__lt=raw_cutoff).exists())
+        hour = WeatherRollup.objects.filter(resolution='hour').order_by('bucket_start').first()
+        self.assertEqual(hour.samples, 2)
+        self.assertEqual((hour.temperature_min, hour.temperature_max, hour.temperature_mean),
+                         (20.0, 24.0, 22.0))
+        self.assertEqual(hour.rainfall_total, 1.0)
+        self.assertFalse(WeatherRollup.objects.filter(
+            resolution='hour', bucket_start__lt=hourly_cutoff).exists())
+        day = WeatherRollup.objects.filter(resolution='day', bucket_start__lt=hourly_cutoff).first()
+        self.assertEqual(day.samples, 48)
+
+    def test_compaction_transactions_are_bounded_by_day(self):
+        """Test each compaction transaction covers one farm-day, however long the history."""
+        raw_cutoff, _ = rollups.retention_cutoffs()
+        expired = WeatherData.objects.filter(recorded_at__lt=raw_cutoff)
+        days = {reading.recorded_at.date() for reading in expired}
+        stats = rollups.compact()
+        self.assertEqual(stats['transactions'], len(days))
+        self.assertLessEqual(stats['largest_transaction_rows'], 48)
+
+    def test_compaction_merges_late_rows_into_existing_buckets(self):
+        """Test a second run folds backfilled rows into the stored rollup."""
+        rollups.compact()
+        bucket = WeatherRollup.objects.filter(resolution='day').order_by('bucket_start').last()
+        WeatherData.objects.create(
+            farm=self.farm, temperature=40, humidity=60, rainfall=0, wind_speed=10,
+            condition='sunny', source='device', recorded_at=bucket.bucket_start + timedelta(hours=1))
+        rollups.compact()
+        bucket.refresh_from_db()
+        self.assertEqual((bucket.samples, bucket.temperature_max), (49, 40.0))
+
+    def test_resolution_follows_range(self):
+        """Test raw, hourly and daily resolutions are chosen by range length."""
+        pick = rollups.pick_resolution
+        self.assertEqual(pick(self.now - timedelta(days=2), self.now), 'raw')
+        self.assertEqual(pick(self.now - timedelta(days=20), self.now), 'hour')
+        self.assertEqual(pick(self.now - timedelta(days=40), self.now), 'day')
+
+    def test_history_spans_rollups_and_raw_rows_seamlessly(self):
+        """Test the history endpoint merges rollups and raw rows per bucket."""
+        rollups.compact()
+        response = self.client.get('/api/weather/history/',
+                                   {'farm_id': str(self.farm.id), 'days': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['resolution'], 'hour')
+        points = response.data['points']
+        self.assertTrue(all(point['samples'] == 2 for point in points[1:-1]))
+        times = [point['time'] for point in points]
+        self.assertEqual(times, sorted(times))
+        self.assertAlmostEqual(len(points), 20 * 24, delta=1)
+
+    def test_history_requires_own_farm(self):
+        """Test history is only served for the caller's farms."""
+        other = make_farm(User.objects.create_user(username='stranger', password='x'))
+        response = self.client.get('/api/weather/history/', {'farm_id': str(other.id)})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(WEATHER_RAW_RETENTION_DAYS=3650, WEATHER_HOURLY_RETENTION_DAYS=3650)
+class WeatherRangeQueryTestCase(APITestCase):
+    """Test cases for range, resolution and columnar weather queries."""
+
+    def setUp(self):
+        """Set up a farm with hourly readings over four weeks."""
+        self.user = User.objects.create_user(username='rangefarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.start = timezone.make_aware(datetime(2026, 3, 2))  # a Monday
+        WeatherData.objects.bulk_create([
+            WeatherData(farm=self.farm, temperature=10 + hour % 24, humidity=50, rainfall=1,
+                        wind_speed=5, condition='sunny', source='manual',
+                        recorded_at=self.start + timedelta(hours=hour))
+            for hour in range(28 * 24)
+        ])
+        self.client.force_authenticate(user=self.user)
+
+    def query(self, **params):
+        params.setdefault('farm_id', str(self.farm.id))
+        return self.client.get('/api/weather/', params)
+
+    def test_raw_range_in_one_response(self):
+        """Test from/to returns every reading in range, oldest first, unpaged."""
+        response = self.query(**{'from': '2026-03-02', 'to': '2026-03-05'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['resolution'], response.data['count']), ('raw', 72))
+        self.assertLess(response.data['points'][0]['time'], response.data['points'][-1]['time'])
+
+    def test_daily_resolution(self):
+        """Test server-side daily aggregation."""
+        response = self.query(**{'from': '2026-03-02', 'to': '2026-03-09', 'resolution': 'day'})
+        points = response.data['points']
+        self.assertEqual(len(points), 7)
+        self.assertEqual(points[0]['samples'], 24)
+        self.assertEqual((points[0]['temperature_min'], points[0]['temperature_max']), (10, 33))
+        self.assertEqual(points[0]['rainfall_total'], 24)
+
+    def test_weekly_resolution_includes_rollups(self):
+        """Test weekly buckets combine daily rollups and raw readings."""
+        with override_settings(WEATHER_RAW_RETENTION_DAYS=0):
+            rollups.compact(now=self.start + timedelta(days=14))
+        response = self.query(**{'from': '2026-03-02', 'to': '2026-03-30', 'resolution': 'week'})
+        points = response.data['points']
+        self.assertEqual([p['samples'] for p in points], [168] * 4)
+        self.assertEqual(points[1]['time'], self.start + timedelta(days=7))
+
+    def test_compacted_ranges_are_never_served_raw(self):
+        """Test the default picks a resolution that still covers the whole range."""
+        with override_settings(WEATHER_RAW_RETENTION_DAYS=0):
+            rollups.compact(now=self.start + timedelta(days=14))
+            span = {'from': '2026-03-09', 'to': '2026-03-20'}
+            response = self.query(**span)
+            self.assertEqual((response.data['resolution'], response.data['count']), ('hour', 264))
+            self.assertEqual(self.query(resolution='raw', **span).status_code,
+                             status.HTTP_400_BAD_REQUEST)
+
+    def test_hourly_resolution_is_refused_past_its_retention(self):
+        """Test an explicit hourly range older than hourly retention is a 400, not a partial 200."""
+        span = {'from': '2026-03-09', 'to': '2026-03-20'}
+        with override_settings(WEATHER_HOURLY_RETENTION_DAYS=0):
+            response = self.query(resolution='hour', **span)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('resolution=auto, day or week', response.data['error'])
+            self.assertEqual(self.query(resolution='day', **span).status_code, status.HTTP_200_OK)
+
+    def test_columnar_layout(self):
+        """Test the columnar layout returns parallel arrays."""
+        response = self.query(**{'from': '2026-03-02', 'to': '2026-03-04',
+                                 'resolution': 'hour', 'layout': 'columnar'})
+        columns = response.data['columns']
+        self.assertNotIn('points', response.data)
+        self.assertEqual(len(columns['time']), 48)
+        self.assertEqual(len(columns['temperature_mean']), 48)
+        self.assertEqual(columns['temperature_mean'][:3], [10, 11, 12])
+
+    def test_invalid_parameters(self):
+        """Test bad resolutions and dates are rejected."""
+        self.assertEqual(self.query(resolution='minute').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.query(**{'from': 'yesterday'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.query(**{'from': '2026-03-05', 'to': '2026-03-02'}).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+    def test_plain_list_is_still_paginated(self):
+        """Test the list without range parameters keeps its paged shape."""
+        response = self.query()
+        self.assertEqual(len(response.data['results']), 20)
+
+
+def recorded_forecast(first_at):
+    """The recorded OpenWeatherMap forecast, replayed as if issued just before ``first_at``."""
+    with open(os.path.join(TEST_DATA_DIR, 'openweather_forecast.json')) as fh:
+        payload = json.load(fh)
+    offset = int(first_at.timestamp()) - payload['list'][0]['dt']
+    for item in payload['list']:
+        item['dt'] += offset
+    return payload
+
+
+class WeatherForecastTestCase(APITestCase):
+    """Test cases for forecast ingestion and precomputed forecast risk."""
+
+    def setUp(self):
+        """Set up two nearby farms and a fixture server replaying a recorded forecast."""
+        self.user = User.objects.create_user(username='forecastfarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.neighbour = make_farm(self.user, farm_name='Neighbour', latitude=18.5301)
+        self.tomorrow = timezone.localdate() + timedelta(days=1)
+        payload = recorded_forecast(timezone.make_aware(
+            datetime.combine(self.tomorrow, datetime.min.time())))
+        self.stub = StubWeatherServer(
+            lambda path, params: (200, payload) if path.endswith('/forecast') else (404, {}))
+        self.stub.__enter__()
+        self.addCleanup(self.stub.__exit__)
+        self.weather_client = weather.WeatherClient(
+            base_url=self.stub.url, api_key='test-key', rate_limit=0, backoff=0)
+        self.client.force_authenticate(user=self.user)
+
+    def refresh(self):
+        return weather.refresh_forecasts(client=self.weather_client)
+
+    def test_forecast_is_stored_and_scored_per_farm(self):
+        """Test one lookup per cell stores every scored point for each farm."""
+        stats = self.refresh()
+        self.assertEqual((stats['cells'], stats['forecast_points'], stats['risk_days']), (1, 80, 10))
+        self.assertEqual(len(self.stub.requests), 1)
+        points = WeatherForecast.objects.filter(farm=self.farm)
+        self.assertEqual(points.count(), 40)
+        self.assertEqual(points.first().condition, 'sunny')
+        # Two wet days, then a third that stays red on accumulated leaf wetness
+        self.assertEqual(points.filter(alert_level='red').count(), 24)
+
+    def test_daily_risk_summary(self):
+        """Test the per-day summary takes each day's worst level and rain total."""
+        self.refresh()
+        days = {day.date: day for day in ForecastDailyRisk.objects.filter(farm=self.farm)}
+        self.assertEqual(len(days), 5)
+        self.assertEqual(days[self.tomorrow].alert_level, 'green')
+        wet_day = days[self.tomorrow + timedelta(days=2)]
+        self.assertEqual((wet_day.alert_level, wet_day.rainfall_total), ('red', 20.0))
+        self.assertIn('warm and very humid', wet_day.disease_risk)
+        after = days[self.tomorrow + timedelta(days=4)]
+        self.assertEqual(after.alert_level, 'red')
+        self.assertIn('Prolonged leaf wetness', after.disease_risk)
+
+    def test_refresh_replaces_previous_forecast(self):
+        """Test a new forecast replaces the old one instead of accumulating."""
+        self.refresh()
+        self.refresh()
+        self.assertEqual(WeatherForecast.objects.filter(farm=self.farm).count(), 40)
+        self.assertEqual(ForecastDailyRisk.objects.filter(farm=self.farm).count(), 5)
+
+    def test_upcoming_irrigation_reads_precomputed_risk(self):
+        """Test upcoming schedules carry forecast risk from one lookup query."""
+        self.refresh()
+        wet_day = self.tomorrow + timedelta(days=2)
+        IrrigationSchedule.objects.create(farm=self.farm, scheduled_date=wet_day, water_amount=25)
+        IrrigationSchedule.objects.create(farm=self.farm, scheduled_date=self.tomorrow + timedelta(days=30),
+                                          water_amount=25)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/irrigation/upcoming/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['forecast_risk']['alert_level'], 'red')
+        self.assertEqual(response.data[0]['forecast_risk']['rainfall_total'], 20.0)
+        self.assertIsNone(response.data[1]['forecast_risk'])
+
+    def test_farm_forecast_endpoint(self):
+        """Test the farm forecast endpoint serves stored days and points."""
+        self.refresh()
+        response = self.client.get(f'/api/farms/{self.farm.id}/forecast/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['days']), 5)
+        self.assertEqual(len(response.data['points']), 40)
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True, WEATHER_ALERT_DEDUP_WINDOW=3600)
+class WeatherAlertFanoutTestCase(APITestCase):
+    """Test cases for fanning weather risk events out to affected farms."""
+
+    def setUp(self):
+        """Set up three owners farming in one grid cell and one farm elsewhere."""
+        self.owners = [User.objects.create_user(username=f'owner{i}', password='testpass123')
+                       for i in range(3)]
+        self.cell_farms = [make_farm(owner, latitude=18.501 + i * 0.01, longitude=73.851)
+                           for i, owner in enumerate(self.owners)]
+        self.far_farm = make_farm(self.owners[0], latitude=12.9716, longitude=77.5946,
+                                  region='south')
+        make_farm(self.owners[1], latitude=18.502, longitude=73.852, is_active=False)
+        self.cell = weather.grid_cell(18.501, 73.851)
+        weather.get_cache().clear()
+
+    def test_cell_event_alerts_every_owner_in_the_cell(self):
+        """Test a cell event reaches every active farm inside it and nothing else."""
+        stats = alerts.fan_out([alerts.RiskEvent('red', 'rainy', cell=self.cell)])
+        self.assertEqual((stats['farms'], stats['created']), (3, 3))
+        self.assertEqual(
+            set(Alert.objects.values_list('farm_id', flat=True)),
+            {farm.id for farm in self.cell_farms},
+        )
+        self.assertEqual(set(Alert.objects.values_list('severity', flat=True)), {'critical'})
+
+    def test_region_event(self):
+        """Test a region event resolves farms through the region index."""
+        stats = alerts.fan_out([alerts.RiskEvent('orange', 'stormy', region='south')])
+        self.assertEqual(stats['created'], 1)
+        alert = Alert.objects.get()
+        self.assertEqual((alert.farm_id, alert.severity), (self.far_farm.id, 'warning'))
+
+    def test_recent_alerts_are_not_repeated(self):
+        """Test farms alerted within the window are skipped unless the level rises."""
+        orange = alerts.RiskEvent('orange', 'rainy', cell=self.cell)
+        alerts.fan_out([orange])
+        repeat = alerts.fan_out([orange])
+        self.assertEqual((repeat['created'], repeat['deduplicated']), (0, 3))
+        escalated = alerts.fan_out([alerts.RiskEvent('red', 'rainy', cell=self.cell)])
+        self.assertEqual(escalated['created'], 3)
+
+        Alert.objects.update(created_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(alerts.fan_out([orange])['created'], 3)
+
+    def test_alerts_are_written_in_chunks(self):
+        """Test the fan-out writes one bulk insert per chunk of farms."""
+        district = [make_farm(self.owners[0], latitude=18.505, longitude=73.86 + i * 0.001)
+                    for i in range(7)]
+        with mock.patch.object(Alert.objects, 'bulk_create',
+                               wraps=Alert.objects.bulk_create) as bulk_create:
+            stats = alerts.fan_out([alerts.RiskEvent('red', 'rainy', cell=self.cell)],
+                                   chunk_size=4)
+        self.assertEqual(stats['created'], 3 + len(district))
+        self.assertEqual(bulk_create.call_count, 3)
+        self.assertIsNotNone(stats['alerts_per_second'])
+
+    def test_fetch_weather_fans_out_to_neighbours(self):
+        """Test a risky reading fetched by one owner alerts every owner in the cell."""
+        self.client.force_authenticate(user=self.owners[0])
+        with StubWeatherServer() as stub:
+            client = weather.WeatherClient(base_url=stub.url, api_key='test-key',
+                                           rate_limit=0, backoff=0)
+            with mock.patch.object(weather, '_client', client):
+                response = self.client.post(f'/api/farms/{self.cell_farms[0].id}/fetch_weather/')
+        self.assertEqual(response.data['alert_level'], 'red')
+        self.assertEqual(WeatherData.objects.count(), 1)
+        for owner in self.owners:
+            self.assertEqual(Alert.objects.filter(user=owner, alert_type='weather').count(), 1)
+
+    def test_dispatch_runs_in_the_background(self):
+        """Test request paths hand events to the background pool."""
+        with mock.patch.object(alerts.background, 'submit') as submit:
+            alerts.dispatch([alerts.RiskEvent('green', 'sunny', cell=self.cell)])
+            submit.assert_not_called()
+            alerts.dispatch([alerts.RiskEvent('red', 'rainy', cell=self.cell)])
+        submit.assert_called_once()
+        self.assertIs(submit.call_args[0][0], alerts.fan_out)
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True)
+class WeatherResilienceTestCase(APITestCase):
+    """Test cases for the upstream circuit breaker, latency budget and fallback."""
+
+    def setUp(self):
+        """Set up a farm, an authenticated client and an empty cache."""
+        self.user = User.objects.create_user(username='outagefarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.client.force_authenticate(user=self.user)
+        weather._cache = None
+
+    def client_for(self, stub, **options):
+        options.setdefault('rate_limit', 0)
+        options.setdefault('backoff', 0)
+        options.setdefault('max_retries', 0)
+        return weather.WeatherClient(base_url=stub.url, api_key='test-key', **options)
+
+    def test_breaker_opens_and_fails_fast(self):
+        """Test consecutive outages open the circuit and later calls skip upstream."""
+        breaker = weather.CircuitBreaker(threshold=3, reset_timeout=60)
+        with StubWeatherServer(lambda path, params: (503, {})) as stub:
+            client = self.client_for(stub, breaker=breaker)
+            for _ in range(3):
+                with self.assertRaises(weather.UpstreamError):
+                    client.current(18.5, 73.8)
+            with self.assertRaises(weather.CircuitOpenError) as raised:
+                client.current(18.5, 73.8)
+        self.assertEqual(len(stub.requests), 3)
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(metrics.snapshot('weather_openweather_circuit')['weather_openweather_circuit_state'],
+                         'open')
+        self.assertGreater(raised.exception.retry_after, 50)
+
+    def test_half_open_probe_closes_or_reopens(self):
+        """Test one probe is let through after the reset timeout and decides the state."""
+        responses = [(503, {})]
+        breaker = weather.CircuitBreaker(threshold=1, reset_timeout=0.05)
+        with StubWeatherServer(lambda path, params: responses[-1]) as stub:
+            client = self.client_for(stub, breaker=breaker)
+            with self.assertRaises(weather.UpstreamError):
+                client.current(18.5, 73.8)
+            time.sleep(0.06)
+            self.assertTrue(breaker.allow())
+            self.assertEqual(breaker.state, 'half_open')
+            self.assertFalse(breaker.allow())
+            breaker.record_failure()
+            self.assertEqual(breaker.state, 'open')
+
+            time.sleep(0.06)
+            responses.append(StubWeatherServer.default_responder('', {}))
+            client.current(18.5, 73.8)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_broken_responses_are_outages_and_release_the_probe(self):
+        """Test any requests error counts as an outage and never wedges the breaker."""
+        breaker = weather.CircuitBreaker(threshold=1, reset_timeout=0.05)
+        with StubWeatherServer() as stub:
+            client = self.client_for(stub, breaker=breaker)
+            broken = requests.exceptions.ChunkedEncodingError('connection broken')
+            with mock.patch.object(client.session, 'get', side_effect=broken):
+                with self.assertRaises(weather.UpstreamError) as raised:
+                    client.current(18.5, 73.8)
+                self.assertTrue(raised.exception.outage)
+                self.assertEqual(breaker.state, 'open')
+                time.sleep(0.06)
+                with mock.patch.object(client, '_get', side_effect=RuntimeError('bug')):
+                    with self.assertRaises(RuntimeError):
+                        client.current(18.5, 73.8)
+            client.current(18.5, 73.8)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_rejected_requests_do_not_open_the_breaker(self):
+        """Test 4xx answers are errors but not outages."""
+        breaker = weather.CircuitBreaker(threshold=1, reset_timeout=60)
+        with StubWeatherServer(lambda path, params: (401, {})) as stub:
+            with self.assertRaises(weather.UpstreamError):
+                self.client_for(stub, breaker=breaker).current(18.5, 73.8)
+        self.assertEqual(breaker.state, 'closed')
+
+    def test_latency_budget_bounds_slow_calls(self):
+        """Test a slow provider is abandoned once the call's budget is spent."""
+        def slow(path, params):
+            time.sleep(1)
+            return StubWeatherServer.default_responder(path, params)
+
+        with StubWeatherServer(slow) as stub:
+            client = self.client_for(stub, budget=0.2, max_retries=3)
+            started = time.monotonic()
+            with self.assertRaises(weather.UpstreamError):
+                client.current(18.5, 73.8)
+        self.assertLess(time.monotonic() - started, 0.8)
+        self.assertEqual(len(stub.requests), 1)
+
+    def test_last_stored_reading_is_served_during_outage(self):
+        """Test fetch_weather falls back to the latest row when the provider fails."""
+        stored = weather.build_weather(self.farm, weather.parse_current(
+            StubWeatherServer.default_responder('', {})[1]),
+            recorded_at=timezone.now() - timedelta(days=1))
+        stored.save()
+        with StubWeatherServer(lambda path, params: (503, {})) as stub:
+            with mock.patch.object(weather, '_client', self.client_for(stub)):
+                response = self.client.post(f'/api/farms/{self.farm.id}/fetch_weather/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['X-Weather-Cache'], 'fallback')
+        self.assertEqual(response.data['id'], str(stored.id))
+
+    def test_open_circuit_without_data_returns_503(self):
+        """Test an open circuit with nothing stored answers 503 with Retry-After."""
+        breaker = weather.CircuitBreaker(threshold=1, reset_timeout=30)
+        breaker.record_failure()
+        with StubWeatherServer() as stub:
+            with mock.patch.object(weather, '_client', self.client_for(stub, breaker=breaker)):
+                response = self.client.post(f'/api/farms/{self.farm.id}/fetch_weather/')
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(stub.requests, [])
+
+
+def weatherapi_responder(path, params):
+    """WeatherAPI.com-shaped answers for the stub server."""
+    hour = {'temp_c': 24.0, 'humidity': 85, 'precip_mm': 0.4, 'wind_kph': 7.2,
+            'condition': {'text': 'Patchy light rain'}}
+    if path.endswith('/current.json'):
+        return 200, {'location': {'name': 'Pune'}, 'current': hour}
+    if path.endswith('/forecast.json'):
+        start = int(timezone.now().timestamp())
+        return 200, {'forecast': {'forecastday': [
+            {'hour': [dict(hour, time_epoch=start + (day * 24 + h) * 3600) for h in range(24)]}
+            for day in range(int(params.get('days', 1)))
+        ]}}
+    return 404, {}
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True)
+class WeatherProviderTestCase(APITestCase):
+    """Test cases for weather providers, hedged lookups and device ingest."""
+
+    def setUp(self):
+        """Set up a farm with a neighbour in the same grid cell."""
+        self.user = User.objects.create_user(username='providerfarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.neighbour = make_farm(self.user, farm_name='Neighbour', latitude=18.5301)
+        self.client.force_authenticate(user=self.user)
+        weather.get_cache().clear()
+
+    def provider(self, cls, stub, **options):
+        return cls(base_url=stub.url, api_key='test-key', rate_limit=0, backoff=0, **options)
+
+    def test_weatherapi_current_and_forecast(self):
+        """Test WeatherAPI answers map onto the same fields as OpenWeatherMap's."""
+        with StubWeatherServer(weatherapi_responder) as stub:
+            client = self.provider(providers.WeatherAPIClient, stub)
+            reading = client.current(18.525, 73.875)
+            points = client.forecast(18.525, 73.875)
+        self.assertEqual(stub.requests[0][1]['key'], 'test-key')
+        self.assertEqual(stub.requests[0][1]['q'], '18.525,73.875')
+        self.assertEqual(reading, {
+            'temperature': 24.0, 'humidity': 85.0, 'rainfall': 0.4, 'wind_speed': 7.2,
+            'condition': 'rainy', 'description': 'patchy light rain', 'source': 'weatherapi',
+        })
+        self.assertEqual(len(points), 72)
+        self.assertEqual(points[0][1]['source'], 'weatherapi')
+
+    def test_rows_record_the_answering_provider(self):
+        """Test ingestion stores the source of the provider that answered."""
+        with StubWeatherServer(weatherapi_responder) as stub:
+            weather.refresh_farms([self.farm], client=self.provider(providers.WeatherAPIClient, stub))
+        self.assertEqual(WeatherData.objects.get(farm=self.farm).source, 'weatherapi')
+
+    def test_slow_primary_is_hedged(self):
+        """Test the secondary answers when the primary is slower than the hedge delay."""
+        def slow(path, params):
+            time.sleep(0.5)
+            return StubWeatherServer.default_responder(path, params)
+
+        won = providers.hedges_won.value
+        with StubWeatherServer(slow) as primary, StubWeatherServer(weatherapi_responder) as secondary:
+            client = providers.HedgedClient(self.provider(weather.WeatherClient, primary),
+                                            self.provider(providers.WeatherAPIClient, secondary),
+                                            hedge_after=0.05)
+            started = time.monotonic()
+            reading = client.current(18.5, 73.8)
+            self.assertLess(time.monotonic() - started, 0.4)
+        self.assertEqual(reading['source'], 'weatherapi')
+        self.assertEqual(providers.hedges_won.value, won + 1)
+
+    def test_fast_primary_is_not_hedged(self):
+        """Test no secondary call is made when the primary answers in time."""
+        with StubWeatherServer() as primary, StubWeatherServer(weatherapi_responder) as secondary:
+            client = providers.HedgedClient(self.provider(weather.WeatherClient, primary),
+                                            self.provider(providers.WeatherAPIClient, secondary),
+                                            hedge_after=2)
+            reading = client.current(18.5, 73.8)
+        self.assertEqual(reading['source'], 'openweather')
+        self.assertEqual(secondary.requests, [])
+
+    def test_failed_primary_fails_over(self):
+        """Test a primary error is answered by the secondary straight away."""
+        with StubWeatherServer(lambda path, params: (500, {})) as primary, \
+                StubWeatherServer(weatherapi_responder) as secondary:
+            client = providers.HedgedClient(
+                self.provider(weather.WeatherClient, primary, max_retries=0),
+                self.provider(providers.WeatherAPIClient, secondary), hedge_after=2)
+            self.assertEqual(client.current(18.5, 73.8)['source'], 'weatherapi')
+
+    def test_breaker_state_is_reported_per_provider(self):
+        """Test each provider's breaker reports under its own source."""
+        with StubWeatherServer(lambda path, params: (500, {})) as primary, \
+                StubWeatherServer(weatherapi_responder) as secondary:
+            client = providers.HedgedClient(
+                self.provider(weather.WeatherClient, primary, max_retries=0,
+                              breaker=weather.CircuitBreaker(threshold=1, reset_timeout=60)),
+                self.provider(providers.WeatherAPIClient, secondary), hedge_after=2)
+            client.current(18.5, 73.8)
+        snapshot = metrics.snapshot('weather_')
+        self.assertEqual(snapshot['weather_openweather_circuit_state'], 'open')
+        self.assertEqual(snapshot['weather_weatherapi_circuit_state'], 'closed')
+        self.assertEqual(client.secondary.breaker.source, 'weatherapi')
+
+    @override_settings(WEATHER_PROVIDER='openweather', WEATHER_SECONDARY_PROVIDER='weatherapi')
+    def test_build_client_from_settings(self):
+        """Test the configured providers are combined into a hedged client."""
+        client = providers.build_client()
+        self.assertIsInstance(client, providers.HedgedClient)
+        self.assertIsInstance(client.secondary, providers.WeatherAPIClient)
+        self.assertIsInstance(providers.build_client(secondary=''), weather.WeatherClient)
+        with self.assertRaises(ValueError):
+            providers.build_client('darksky')
+
+    def test_device_ingest(self):
+        """Test sensor readings are stored, scored and alert only their own farm."""
+        now = timezone.now()
+        readings = [
+            {'recorded_at': (now - timedelta(hours=h)).isoformat(), 'temperature': 24,
+             'humidity': 92, 'rainfall': 0}
+            for h in (2, 1, 0)
+        ]
+        response = self.client.post('/api/weather/ingest/',
+                                    {'farm_id': str(self.farm.id), 'readings': readings},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['stored'], 3)
+        rows = WeatherData.objects.filter(farm=self.farm, source='device')
+        self.assertEqual(rows.count(), 3)
+        self.assertEqual(set(rows.values_list('alert_level', flat=True)), {'red'})
+        self.assertEqual(set(Alert.objects.values_list('farm_id', flat=True)), {self.farm.id})
+
+        # A resent batch is not stored twice
+        response = self.client.post('/api/weather/ingest/',
+                                    {'farm_id': str(self.farm.id), 'readings': readings},
+                                    format='json')
+        self.assertEqual(response.data['stored'], 0)
+
+    def test_device_ingest_validation(self):
+        """Test bad readings and foreign farms are rejected."""
+        other_farm = make_farm(User.objects.create_user(username='stranger', password='pass123'))
+        reading = {'recorded_at': timezone.now().isoformat(), 'temperature': 20, 'humidity': 50}
+        response = self.client.post('/api/weather/ingest/',
+                                    {'farm_id': str(other_farm.id), 'readings': [reading]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post('/api/weather/ingest/',
+                                    {'farm_id': str(self.farm.id),
+                                     'readings': [dict(reading, humidity=140)]},
+                                    format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(WeatherData.objects.exists())
+
+
+@override_settings(ALERT_STREAM_POLL_INTERVAL=0, ALERT_STREAM_HEARTBEAT=0.05)
+class AlertStreamTestCase(TestCase):
+    """Test cases for pushing alerts over the ASGI server-sent event stream."""
+
+    def setUp(self):
+        """Set up a user with an access token and a second, unrelated user."""
+        self.user = User.objects.create_user(username='streamfarmer', password='testpass123')
+        self.other = User.objects.create_user(username='bystander', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.ticket = streaming.issue_ticket(self.user)
+
+    def make_alert(self, user=None, title='Weather Alert'):
+        return Alert.objects.create(user=user or self.user, farm=self.farm, alert_type='weather',
+                                    title=title, message='Humid', severity='warning')
+
+    def stream(self, query=None, headers=(), during=None, seconds=0.2, scope=None):
+        """Run the stream app until the client disconnects; returns (status, events)."""
+        messages = []
+
+        async def receive():
+            await asyncio.sleep(0.05)
+            if during is not None:
+                await sync_to_async(during)()
+            await asyncio.sleep(seconds)
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = scope if scope is not None else {}
+        scope.update({
+            'type': 'http', 'method': 'GET', 'path': streaming.STREAM_PATH,
+            'query_string': (query if query is not None else f'ticket={self.ticket}').encode(),
+            'headers': [(name.encode(), value.encode()) for name, value in headers],
+        })
+        async_to_sync(streaming.alert_stream)(scope, receive, send)
+        body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+        events = [
+            dict(line.split(': ', 1) for line in block.split('\n'))
+            for block in body.decode().split('\n\n') if block.startswith('id: ')
+        ]
+        return messages[0]['status'], events
+
+    def test_new_alerts_are_pushed_to_their_owner(self):
+        """Test alerts committed while connected reach the owner's stream only."""
+        def create():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.make_alert(title='Blight risk')
+                self.make_alert(user=self.other)
+
+        delivered = streaming.delivery_latency.count
+        code, events = self.stream(during=create)
+        self.assertEqual(code, 200)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(json.loads(events[0]['data'])['title'], 'Blight risk')
+        self.assertEqual(streaming.delivery_latency.count, delivered + 1)
+        self.assertEqual(streaming.connections.value, 0)
+
+    def test_resume_from_last_event_id(self):
+        """Test a reconnecting client first receives what it missed, in order."""
+        first = self.make_alert(title='seen')
+        Alert.objects.filter(pk=first.pk).update(created_at=timezone.now() - timedelta(minutes=5))
+        missed = [self.make_alert(title=f'missed {i}') for i in range(3)]
+        code, events = self.stream(headers=[('last-event-id', str(first.id))])
+        self.assertEqual(code, 200)
+        self.assertEqual(sorted(e['id'] for e in events), sorted(str(a.id) for a in missed))
+
+        # Another user's alert id is not an anchor
+        code, events = self.stream(query=f'ticket={self.ticket}&last_id={self.make_alert(user=self.other).id}')
+        self.assertEqual(events, [])
+
+    @override_settings(ALERT_STREAM_POLL_INTERVAL=0.05)
+    def test_alerts_from_other_processes_are_tailed(self):
+        """Test alerts whose commit this process never saw arrive through the tail query."""
+        code, events = self.stream(during=lambda: self.make_alert(title='from cron'))
+        self.assertEqual([json.loads(e['data'])['title'] for e in events], ['from cron'])
+
+    def test_fan_out_publishes_bulk_created_alerts(self):
+        """Test weather fan-out pushes the alerts it bulk-creates."""
+        def fan_out():
+            with self.captureOnCommitCallbacks(execute=True):
+                alerts.fan_out([alerts.RiskEvent('red', 'rainy', farm_id=self.farm.pk)])
+
+        code, events = self.stream(during=fan_out)
+        self.assertEqual(len(events), 1)
+        self.assertEqual(json.loads(events[0]['data'])['severity'], 'critical')
+
+    @override_settings(ALERT_STREAM_QUEUE_SIZE=2)
+    def test_slow_client_is_disconnected(self):
+        """Test a full per-connection queue closes the stream instead of growing."""
+        def burst():
+            streaming.broker.publish([self.make_alert(title=f'burst {i}') for i in range(5)])
+
+        overflows = streaming.overflows.value
+        started = time.monotonic()
+        code, events = self.stream(during=burst, seconds=2)
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(len(events), 2)
+        self.assertEqual(streaming.overflows.value, overflows + 1)
+
+    def test_requires_a_valid_token(self):
+        """Test the stream answers 401 without a valid access token or ticket."""
+        self.assertEqual(self.stream(query='ticket=nonsense')[0], 401)
+        self.assertEqual(self.stream(query=f'token={self.token}')[0], 401)
+        self.assertEqual(self.stream(query='')[0], 401)
+        code, _ = self.stream(query='', headers=[('authorization', f'Bearer {self.token}')])
+        self.assertEqual(code, 200)
+
+    def test_tickets_expire_and_stay_out_of_the_logged_query(self):
+        """Test stream tickets are issued by the API, expire, and are stripped from the scope."""
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        ticket = client.post('/api/alerts/stream_ticket/').data['ticket']
+
+        scope = {}
+        code, _ = self.stream(query=f'ticket={ticket}&last_id=x', scope=scope)
+        self.assertEqual(code, 200)
+        self.assertEqual(scope['query_string'], b'last_id=x')
+
+        with override_settings(ALERT_STREAM_TICKET_TTL=-1):
+            self.assertEqual(self.stream(query=f'ticket={ticket}')[0], 401)
+
+
+@override_settings(BACKGROUND_TASKS_SYNC=True)
+class UserCountersTestCase(APITestCase):
+    """Test cases for denormalized per-user counters and the badge endpoint."""
+
+    def setUp(self):
+        """Set up a user with a farm and an authenticated client."""
+        self.user = User.objects.create_user(username='counterfarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def make_alert(self, severity='warning', **fields):
+        fields.setdefault('farm', self.farm)
+        return Alert.objects.create(user=self.user, alert_type='weather', title='Weather Alert',
+                                    message='Humid', severity=severity, **fields)
+
+    def make_detection(self, farm=None):
+        return DiseaseDetection.objects.create(
+            farm=farm or self.farm, original_image='detections/leaf.jpg',
+            detected_disease='Early Blight', confidence=90, severity='medium')
+
+    def badge(self):
+        return self.client.get('/api/profile/badge/').data
+
+    def assertMatchesSource(self):
+        stored = counters.get(self.user.pk)
+        actual = counters.actual_counts([self.user.pk])[self.user.pk]
+        self.assertEqual({f: getattr(stored, f) for f in counters.COUNTER_FIELDS}, actual)
+
+    def test_alert_inserts_reads_and_deletes_are_counted(self):
+        """Test unread counts by severity follow creates, reads and deletes."""
+        self.make_alert('critical')
+        warning = self.make_alert('warning')
+        self.make_alert('info')
+        self.assertEqual(self.badge(), {
+            'unread_alerts': 3,
+            'unread_by_severity': {'info': 1, 'warning': 1, 'critical': 1},
+        })
+        self.client.post(f'/api/alerts/{warning.id}/mark_read/')
+        self.assertEqual(self.badge()['unread_by_severity']['warning'], 0)
+        Alert.objects.get(severity='info').delete()
+        self.assertEqual(self.badge()['unread_alerts'], 1)
+        self.client.post('/api/alerts/mark_all_read/')
+        self.assertEqual(self.badge()['unread_alerts'], 0)
+        self.assertMatchesSource()
+
+    def test_farms_and_detections_are_counted(self):
+        """Test farm and detection totals, including a cascaded farm delete."""
+        other_farm = make_farm(self.user, farm_name='Second')
+        self.make_detection()
+        self.make_detection(other_farm)
+        self.make_alert(farm=other_farm)
+        stats = self.client.get('/api/profile/statistics/').data
+        self.assertEqual(stats, {'total_farms': 2, 'total_detections': 2, 'unread_alerts': 1})
+
+        other_farm.delete()
+        stats = self.client.get('/api/profile/statistics/').data
+        self.assertEqual(stats, {'total_farms': 1, 'total_detections': 1, 'unread_alerts': 0})
+        self.assertMatchesSource()
+
+    def test_bulk_weather_alerts_are_counted(self):
+        """Test alerts written by the weather fan-out's bulk insert are counted."""
+        alerts.fan_out([alerts.RiskEvent('red', 'rainy', farm_id=self.farm.pk)])
+        self.assertEqual(self.badge()['unread_by_severity']['critical'], 1)
+        self.assertMatchesSource()
+
+    def test_badge_is_one_primary_key_lookup(self):
+        """Test the badge endpoint costs a single query once counters exist."""
+        self.make_alert()
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/profile/badge/')
+        self.assertEqual(response.data['unread_alerts'], 1)
+
+    def test_reconcile_repairs_drift(self):
+        """Test reconciliation rewrites drifted rows and creates missing ones."""
+        self.make_alert('critical')
+        UserCounters.objects.filter(pk=self.user.pk).update(unread_critical=7, total_farms=0)
+        newcomer = User.objects.create_user(username='newcomer', password='testpass123')
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual((stats['repaired'], stats['created']), (1, 1))
+        self.assertMatchesSource()
+        self.assertEqual(UserCounters.objects.get(pk=newcomer.pk).total_farms, 0)
+        self.assertEqual(counters.reconcile()['repaired'], 0)
+
+    def test_failed_request_writes_roll_back_their_counts(self):
+        """Test a write that fails after its signal adjusted the counters leaves no drift."""
+        self.make_alert()
+        with mock.patch.object(views.FarmViewSet, 'perform_destroy',
+                               side_effect=lambda farm: (farm.delete(), 1 / 0)):
+            with self.assertRaises(ZeroDivisionError):
+                self.client.delete(f'/api/farms/{self.farm.id}/')
+        self.assertTrue(Farm.objects.filter(pk=self.farm.pk).exists())
+        self.assertMatchesSource()
+
+    def test_deleting_a_user_removes_their_counters(self):
+        """Test a user with counted rows can be deleted cleanly."""
+        self.make_alert()
+        self.make_detection()
+        self.user.delete()
+        self.assertFalse(UserCounters.objects.exists())
+
+
+class UnreadAlertFeedTestCase(APITestCase):
+    """Test cases for the keyset-paginated unread alert feed and its delta mode."""
+
+    def setUp(self):
+        """Set up a user with a farm and an authenticated client."""
+        self.user = User.objects.create_user(username='feedfarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def make_alerts(self, count, **fields):
+        return [
+            Alert.objects.create(user=self.user, farm=self.farm, alert_type='weather',
+                                 title=f'Alert {i}', message='Humid', severity='warning', **fields)
+            for i in range(count)
+        ]
+
+    def unread(self, **params):
+        return self.client.get('/api/alerts/unread/', params)
+
+    def test_pages_walk_every_unread_alert_newest_first(self):
+        """Test keyset pages cover all unread alerts once, in (created_at, id) order."""
+        created = self.make_alerts(7)
+        self.make_alerts(2, is_read=True)
+        seen, params = [], {'page_size': 3}
+        while True:
+            response = self.unread(**params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.data['count'], 7)
+            seen += [item['id'] for item in response.data['results']]
+            if not response.data['next']:
+                break
+            params['cursor'] = response.data['next']
+        expected = sorted(created, key=lambda alert: (alert.created_at, alert.id), reverse=True)
+        self.assertEqual(seen, [str(alert.id) for alert in expected])
+
+    def test_alerts_sharing_a_timestamp_are_not_skipped(self):
+        """Test the id tie-breaker keeps pages apart when created_at is equal."""
+        created = self.make_alerts(5)
+        Alert.objects.filter(user=self.user).update(created_at=created[0].created_at)
+        seen, params = set(), {'page_size': 2}
+        while True:
+            response = self.unread(**params)
+            seen.update(item['id'] for item in response.data['results'])
+            if not response.data['next']:
+                break
+            params['cursor'] = response.data['next']
+        self.assertEqual(seen, {str(alert.id) for alert in created})
+
+    def test_delta_returns_new_alerts_and_ids_read_elsewhere(self):
+        """Test a since poll returns only new alerts plus ids read since the sync."""
+        first, second = self.make_alerts(2)
+        # Push the known alerts out of the late-commit overlap window
+        Alert.objects.filter(user=self.user).update(
+            created_at=timezone.now() - timedelta(minutes=5))
+        sync = self.unread().data['sync']
+
+        new, = self.make_alerts(1)
+        self.client.post(f'/api/alerts/{first.id}/mark_read/')
+        response = self.unread(since=sync)
+        self.assertEqual([item['id'] for item in response.data['results']], [str(new.id)])
+        self.assertEqual(response.data['read_ids'], [str(first.id)])
+        self.assertFalse(response.data['has_more'])
+        self.assertEqual(response.data['count'], 2)
+
+    def test_idle_delta_is_empty(self):
+        """Test polling with the latest sync cursor returns nothing when idle."""
+        self.make_alerts(3)
+        Alert.objects.filter(user=self.user).update(
+            created_at=timezone.now() - timedelta(minutes=5))
+        sync = self.unread().data['sync']
+        response = self.unread(since=sync)
+        self.assertEqual(response.data['results'], [])
+        self.assertEqual(response.data['read_ids'], [])
+
+    def test_delta_pages_through_a_burst(self):
+        """Test has_more and the returned cursor continue a large delta."""
+        sync = self.unread().data['sync']
+        created = self.make_alerts(5)
+        seen = []
+        while True:
+            response = self.unread(since=sync, page_size=2)
+            seen += [item['id'] for item in response.data['results'] if item['id'] not in seen]
+            sync = response.data['sync']
+            if not response.data['has_more']:
+                break
+        self.assertEqual(seen, [str(alert.id) for alert in
+                                sorted(created, key=lambda alert: (alert.created_at, alert.id))])
+
+    def test_delta_advances_past_a_full_overlap_window(self):
+        """Test recent alerts filling the lookback never stall the cursor."""
+        self.make_alerts(12)
+        sync = self.unread().data['sync']
+        created = self.make_alerts(7)
+        seen = []
+        for _ in range(4):
+            response = self.unread(since=sync, page_size=5)
+            seen += [item['id'] for item in response.data['results']]
+            sync = response.data['sync']
+            if not response.data['has_more']:
+                break
+        self.assertFalse(response.data['has_more'])
+        self.assertTrue({str(alert.id) for alert in created} <= set(seen))
+
+    def test_invalid_cursor_is_rejected(self):
+        """Test malformed cursors return 400 rather than a server error."""
+        self.assertEqual(self.unread(cursor='not-a-cursor').status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        page_cursor = feed.encode_cursor(timezone.now())
+        self.assertEqual(self.unread(since=page_cursor).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(ALERT_READ_RETENTION_DAYS=30, ALERT_SWEEP_BATCH=2)
+class AlertArchiveTestCase(APITestCase):
+    """Test cases for the expired/read alert sweeper."""
+
+    def setUp(self):
+        """Set up a user with live, expired and long-read alerts."""
+        self.user = User.objects.create_user(username='archivefarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        now = timezone.now()
+        self.live = self.make_alert(expires_at=now + timedelta(days=1))
+        self.recently_read = self.make_alert(is_read=True, read_at=now - timedelta(days=1))
+        self.expired = [self.make_alert(severity='critical', expires_at=now - timedelta(hours=1))
+                        for _ in range(3)]
+        self.old_read = self.make_alert(is_read=True, read_at=now - timedelta(days=60))
+
+    def make_alert(self, severity='warning', **fields):
+        return Alert.objects.create(user=self.user, farm=self.farm, alert_type='weather',
+                                    title='Weather Alert', message='Humid', severity=severity,
+                                    **fields)
+
+    def assertLiveAlertsKept(self):
+        self.assertEqual(set(Alert.objects.values_list('id', flat=True)),
+                         {self.live.id, self.recently_read.id})
+        stored = counters.get(self.user.pk)
+        self.assertEqual((stored.unread_critical, stored.unread_warning), (0, 1))
+        self.assertEqual(stored.unread_critical,
+                         counters.actual_counts([self.user.pk])[self.user.pk]['unread_critical'])
+
+    def test_sweep_moves_rows_to_archive_table(self):
+        """Test expired and old read alerts are archived in batches and counted down."""
+        self.assertEqual(counters.get(self.user.pk).unread_critical, 3)
+        stats = archive.sweep()
+        self.assertEqual((stats['expired'], stats['read'], stats['archived']), (3, 1, 4))
+        self.assertEqual(stats['table_before']['rows'], 6)
+        self.assertEqual(stats['table_after']['rows'], 2)
+        self.assertEqual(stats['archive_table']['rows'], 4)
+        self.assertIn('rows_per_second', stats)
+        self.assertLiveAlertsKept()
+
+        archived = ArchivedAlert.objects.get(pk=self.expired[0].pk)
+        self.assertEqual((archived.severity, archived.is_read, archived.farm_id),
+                         ('critical', False, self.farm.pk))
+        self.assertEqual(archive.sweep()['archived'], 0)
+
+    def test_sweep_to_compressed_jsonl(self):
+        """Test the jsonl mode appends gzip members readable as one file."""
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with override_settings(ALERT_ARCHIVE_DIR=archive_dir):
+                stats = archive.sweep(mode='jsonl')
+            path, = stats['archive_files']
+            rows = archive.read_archive(path)
+        self.assertEqual(len(rows), 4)
+        self.assertEqual({row['id'] for row in rows},
+                         {str(alert.id) for alert in self.expired + [self.old_read]})
+        self.assertFalse(ArchivedAlert.objects.exists())
+        self.assertLiveAlertsKept()
+
+    def test_sweep_command_deletes(self):
+        """Test the management command in delete mode reports its stats."""
+        out = StringIO()
+        call_command('sweep_alerts', '--mode', 'delete', stdout=out)
+        stats = json.loads(out.getvalue())
+        self.assertEqual((stats['mode'], stats['archived']), ('delete', 4))
+        self.assertNotIn('archive_table', stats)
+        self.assertFalse(ArchivedAlert.objects.exists())
+        self.assertLiveAlertsKept()
+
+
+@override_settings(ALERT_COALESCE_WINDOW=600, BACKGROUND_TASKS_SYNC=True)
+class AlertCoalescingTestCase(APITestCase):
+    """Test cases for folding repeated alerts into one row."""
+
+    def setUp(self):
+        """Set up a user with a farm and an authenticated client."""
+        self.user = User.objects.create_user(username='coalescefarmer', password='testpass123')
+        self.farm = make_farm(self.user)
+        self.client.force_authenticate(user=self.user)
+
+    def raise_blight(self, severity='warning', **fields):
+        return coalesce.raise_alert(self.user, self.farm, 'disease', 'Early Blight', severity,
+                                    title='Disease Detected: Early Blight',
+                                    message='Disease detected', **fields)
+
+    def test_repeats_within_the_window_bump_one_alert(self):
+        """Test repeats update the occurrence count and timestamp, not the row count."""
+        first, created = self.raise_blight()
+        self.assertTrue(created)
+        self.assertIsNone(first.last_seen_at)
+        for _ in range(3):
+            alert, created = self.raise_blight()
+        self.assertFalse(created)
+        self.assertEqual(alert.pk, first.pk)
+        self.assertEqual(alert.occurrences, 4)
+        self.assertIsNotNone(alert.last_seen_at)
+        self.assertEqual(Alert.objects.count(), 1)
+        self.assertEqual(counters.get(self.user.pk).unread_warning, 1)
+
+    def test_other_subjects_and_read_alerts_are_not_coalesced(self):
+        """Test a new subject, a read alert or an expired window starts a new alert."""
+        first, _ = self.raise_blight()
+        _, created = coalesce.raise_alert(self.user, self.farm, 'disease', 'Leaf Rust', 'warning',
+                                          title='Disease Detected: Leaf Rust', message='Rust')
+        self.assertTrue(created)
+
+        self.client.post(f'/api/alerts/{first.id}/mark_read/')
+        second, created = self.raise_blight()
+        self.assertTrue(created)
+
+        Alert.objects.filter(pk=second.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        _, created = self.raise_blight()
+        self.assertTrue(created)
+        self.assertEqual(Alert.objects.filter(subject='Early Blight').count(), 3)
+
+    def test_escalation_moves_the_unread_count(self):
+        """Test a more severe repeat raises the alert's severity and its counter bucket."""
+        self.raise_blight('warning')
+        alert, _ = self.raise_blight('critical')
+        self.raise_blight('warning')
+        alert.refresh_from_db()
+        self.assertEqual(alert.severity, 'critical')
+        stored = counters.get(self.user.pk)
+        self.assertEqual((stored.unread_warning, stored.unread_critical), (0, 1))
+
+    def test_repeated_pest_reports_share_an_alert(self):
+        """Test the pest endpoint coalesces reports of the same pest."""
+        for severity in ('low', 'high'):
+            response = self.client.post('/api/pests/', {
+                'farm': str(self.farm.id), 'pest_name': 'Bollworm',
+                'pest_type': 'insect', 'severity': severity,
+                'detected_at': timezone.now().isoformat(),
+            })
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        alert = Alert.objects.get(alert_type='pest')
+        self.assertEqual((alert.subject, alert.occurrences), ('Bollworm', 2))
+
+    def test_repeated_weather_risk_bumps_the_existing_alert(self):
+        """Test the weather fan-out bumps a same-severity alert inside its window."""
+        event = alerts.RiskEvent('orange', 'rainy', farm_id=self.farm.pk)
+        alerts.fan_out([event])
+        stats = alerts.fan_out([event])
+        self.assertEqual((stats['created'], stats['deduplicated']), (0, 1))
+        alert = Alert.objects.get()
+        self.assertEqual(alert.occurrences, 2)
+        self.assertIsNotNone(alert.last_seen_at)
+        self.assertEqual(counters.get(self.user.pk).unread_warning, 1)
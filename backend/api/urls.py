@@ -5,6 +5,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from . import views
+from .artifacts import serve_artifact
 
 # Import APIView for direct registration endpoint
 from rest_framework.views import APIView
@@ -77,6 +78,12 @@ urlpatterns = [
     # Photo and Disease Detection
     path('photos/upload/', views.photo_upload, name='photo_upload'),
     path('disease-detection/', views.disease_detection, name='disease_detection'),
+    path('disease-detection/bulk/', views.disease_detection_bulk, name='disease_detection_bulk'),
+    path('disease-detection/jobs/<uuid:job_id>/', views.disease_detection_job, name='disease_detection_job'),
+    path('artifacts/<path:path>', serve_artifact, name='artifact'),
+    
+    # Service metrics
+    path('metrics/', views.metrics_snapshot, name='metrics'),
     
     # API routes
     path('', include(router.urls)),
@@ -6,27 +6,42 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from rest_framework_simplejwt.views import TokenObtainPairView
+from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from django.utils import timezone
-from django.db.models import Q
-import requests
-from datetime import timedelta
+from django.utils.dateparse import parse_date, parse_datetime
+from django.db import transaction
+from django.db.models import F, Q
+from collections import Counter
+import math
+from datetime import datetime, timedelta
 
 from .models import (
     UserProfile, Farm, DiseaseDetection, WeatherData, Alert,
     MarketPrice, FarmingRecommendation, FarmAnalytics, PestRecord,
-    IrrigationSchedule, ActivityLog
+    IrrigationSchedule, ActivityLog, WeatherForecast, ForecastDailyRisk
 )
 from .serializers import (
     UserProfileSerializer, FarmListSerializer, FarmDetailSerializer,
     FarmCreateUpdateSerializer, DiseaseDetectionListSerializer,
     DiseaseDetectionDetailSerializer, DiseaseDetectionCreateSerializer,
-    WeatherDataSerializer, AlertListSerializer, AlertDetailSerializer,
+    WeatherDataSerializer, DeviceReadingSerializer, AlertListSerializer, AlertDetailSerializer,
     MarketPriceSerializer, FarmingRecommendationSerializer,
     FarmAnalyticsSerializer, PestRecordListSerializer,
     PestRecordDetailSerializer, IrrigationScheduleSerializer,
-    ActivityLogSerializer, UserRegistrationSerializer
+    ActivityLogSerializer, UserRegistrationSerializer, WeatherForecastSerializer,
+    ForecastDailyRiskSerializer
 )
+from . import coalesce, counters, feed, jobs, rollups, streaming
+from . import weather as weather_engine
+from .artifacts import artifact_url
+from .detection import (
+    DISEASES_BY_NAME, analyze_image, analyze_images, detection_fields, get_result_cache
+)
+from inference.ingest import ImageRejected
+import metrics
 
 
 # ============================================
@@ -38,6 +53,26 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
+# ============================================
+# TRANSACTIONS
+# ============================================
+class AtomicWritesMixin:
+    """Run writes in one transaction, so the per-user counter updates made by
+    model signals (api/counters.py) commit or roll back with the rows"""
+    
+    def create(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().create(request, *args, **kwargs)
+    
+    def update(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().update(request, *args, **kwargs)
+    
+    def destroy(self, request, *args, **kwargs):
+        with transaction.atomic():
+            return super().destroy(request, *args, **kwargs)
+
+
 # ============================================
 # PERMISSIONS
 # ============================================
@@ -100,22 +135,33 @@ class UserProfileViewSet(viewsets.ViewSet):
     
     @action(detail=False, methods=['get'])
     def statistics(self, request):
-        """Get user statistics"""
-        farms = Farm.objects.filter(user=request.user).count()
-        detections = DiseaseDetection.objects.filter(farm__user=request.user).count()
-        alerts = Alert.objects.filter(user=request.user, is_read=False).count()
+        """Get user statistics (from the user's denormalized counters)"""
+        user_counters = counters.get(request.user.pk)
         
         return Response({
-            'total_farms': farms,
-            'total_detections': detections,
-            'unread_alerts': alerts
+            'total_farms': user_counters.total_farms,
+            'total_detections': user_counters.total_detections,
+            'unread_alerts': user_counters.unread_alerts
+        })
+    
+    @action(detail=False, methods=['get'])
+    def badge(self, request):
+        """Unread alert counts for the notification badge (one primary-key lookup)"""
+        user_counters = counters.get(request.user.pk)
+        
+        return Response({
+            'unread_alerts': user_counters.unread_alerts,
+            'unread_by_severity': {
+                severity: getattr(user_counters, field)
+                for severity, field in counters.SEVERITY_FIELDS.items()
+            }
         })
 
 
 # ============================================
 # FARM VIEWSET
 # ============================================
-class FarmViewSet(viewsets.ModelViewSet):
+class FarmViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     """Farm CRUD operations"""
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
     pagination_class = StandardResultsSetPagination
@@ -156,15 +202,25 @@ class FarmViewSet(viewsets.ModelViewSet):
     def weather(self, request, pk=None):
         """Get latest weather for farm"""
         farm = self.get_object()
-        weather = WeatherData.objects.filter(farm=farm).latest('recorded_at')
-        serializer = WeatherDataSerializer(weather)
-        return Response(serializer.data)
+        return self._cached_weather_response(farm)
+    
+    @action(detail=True, methods=['get'])
+    def forecast(self, request, pk=None):
+        """Get the precomputed forecast and per-day disease risk for farm"""
+        farm = self.get_object()
+        now = timezone.now()
+        days = ForecastDailyRisk.objects.filter(farm=farm, date__gte=timezone.localdate(now))
+        points = WeatherForecast.objects.filter(farm=farm, forecast_for__gte=now)
+        return Response({
+            'days': ForecastDailyRiskSerializer(days, many=True).data,
+            'points': WeatherForecastSerializer(points, many=True).data,
+        })
     
     @action(detail=True, methods=['get'])
     def recent_detections(self, request, pk=None):
         """Get recent disease detections for farm"""
         farm = self.get_object()
-        detections = DiseaseDetection.objects.filter(farm=farm)[:10]
+        detections = DiseaseDetection.objects.filter(farm=farm, status='completed')[:10]
         serializer = DiseaseDetectionListSerializer(detections, many=True)
         return Response(serializer.data)
     
@@ -172,61 +228,32 @@ class FarmViewSet(viewsets.ModelViewSet):
     def fetch_weather(self, request, pk=None):
         """Fetch and update weather data from API"""
         farm = self.get_object()
-        api_key = 'YOUR_OPENWEATHERMAP_API_KEY'  # Use environment variable
-        
-        try:
-            url = f"https://api.openweathermap.org/data/2.5/weather?lat={farm.latitude}&lon={farm.longitude}&appid={api_key}&units=metric"
-            response = requests.get(url, timeout=10)
-            data = response.json()
-            
-            # Create weather record
-            weather = WeatherData.objects.create(
-                farm=farm,
-                temperature=data['main']['temp'],
-                humidity=data['main']['humidity'],
-                rainfall=0,
-                wind_speed=data['wind']['speed'],
-                condition=data['weather'][0]['main'].lower(),
-                description=data['weather'][0]['description'],
-                source='openweather',
-                recorded_at=timezone.now()
-            )
-            
-            # Assess disease risk based on weather
-            weather.alert_level = self._assess_disease_risk(weather)
-            weather.save()
-            
-            # Create alert if risk detected
-            if weather.alert_level in ['orange', 'red']:
-                Alert.objects.create(
-                    user=self.request.user,
-                    farm=farm,
-                    alert_type='weather',
-                    title='Weather Alert',
-                    message=f"High disease risk detected due to {weather.condition}",
-                    severity='warning'
-                )
-            
-            serializer = WeatherDataSerializer(weather)
-            return Response(serializer.data)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return self._cached_weather_response(farm)
     
-    def _assess_disease_risk(self, weather):
-        """Assess disease risk based on weather conditions"""
-        if weather.humidity > 80 and weather.temperature > 20:
-            return 'red'  # High risk
-        elif weather.humidity > 70 and weather.temperature > 15:
-            return 'orange'  # Medium risk
-        elif weather.rainfall > 10:
-            return 'orange'  # Medium risk
-        return 'green'  # Low risk
+    def _cached_weather_response(self, farm):
+        # Fresh readings come from the cache (or the latest row); stale ones
+        # are served while a background refresh runs. A new row (and any
+        # weather alert) is only written when the reading has changed. If
+        # the provider fails, the last stored row is served instead.
+        try:
+            weather, cache_state = weather_engine.latest_weather(farm)
+        except weather_engine.CircuitOpenError as e:
+            response = Response({'error': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = str(math.ceil(e.retry_after))
+            return response
+        except weather_engine.UpstreamError as e:
+            return Response({'error': str(e)}, status=status.HTTP_502_BAD_GATEWAY)
+        
+        serializer = WeatherDataSerializer(weather)
+        response = Response(serializer.data)
+        response['X-Weather-Cache'] = cache_state
+        return response
 
 
 # ============================================
 # DISEASE DETECTION VIEWSET
 # ============================================
-class DiseaseDetectionViewSet(viewsets.ModelViewSet):
+class DiseaseDetectionViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     """Disease detection CRUD operations"""
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
@@ -239,7 +266,11 @@ class DiseaseDetectionViewSet(viewsets.ModelViewSet):
         return DiseaseDetectionListSerializer
     
     def get_queryset(self):
-        return DiseaseDetection.objects.filter(farm__user=self.request.user)
+        detections = DiseaseDetection.objects.filter(farm__user=self.request.user)
+        if self.action == 'list':
+            # Queued jobs are listed once they have a result
+            detections = detections.filter(status='completed')
+        return detections
     
     def perform_create(self, serializer):
         detection = serializer.save()
@@ -257,11 +288,12 @@ class DiseaseDetectionViewSet(viewsets.ModelViewSet):
         analytics.average_severity = self._calculate_severity(detection.severity)
         analytics.save()
         
-        # Create alert
-        Alert.objects.create(
+        # Create alert (repeats of the same disease coalesce into one)
+        coalesce.raise_alert(
             user=self.request.user,
             farm=farm,
             alert_type='disease',
+            subject=detection.detected_disease,
             title=f'Disease Detected: {detection.detected_disease}',
             message=f"Disease detected with {detection.confidence}% confidence",
             severity='critical' if detection.severity == 'critical' else 'warning',
@@ -309,18 +341,139 @@ class WeatherDataViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = WeatherDataSerializer
     pagination_class = StandardResultsSetPagination
+    RANGE_PARAMS = ('from', 'to', 'resolution', 'layout')
     
     def get_queryset(self):
         farm_id = self.request.query_params.get('farm_id')
         if farm_id:
             return WeatherData.objects.filter(farm_id=farm_id, farm__user=self.request.user).order_by('-recorded_at')
         return WeatherData.objects.filter(farm__user=self.request.user).order_by('-recorded_at')
+    
+    def list(self, request, *args, **kwargs):
+        """Paged readings, or a whole range when from/to/resolution/layout is given
+        
+        Range mode returns one farm's readings over ``[from, to)`` in a single
+        response, aggregated server-side at a resolution picked from the range
+        (or ``resolution=raw|hour|day|week``) and optionally as parallel arrays
+        (``layout=columnar``).
+        """
+        if not any(param in request.query_params for param in self.RANGE_PARAMS):
+            return super().list(request, *args, **kwargs)
+        return self._range_response(request, default_days=7)
+    
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Weather for a farm over the last ``days``, at a resolution suited to the range"""
+        return self._range_response(request, default_days=7)
+    
+    @action(detail=False, methods=['post'])
+    def ingest(self, request):
+        """Store a batch of readings from an on-farm sensor (``source=device``)"""
+        try:
+            farm = Farm.objects.get(pk=request.data.get('farm_id'), user=request.user)
+        except (Farm.DoesNotExist, ValueError, ValidationError):
+            return Response({'error': 'A valid farm_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        readings = request.data.get('readings')
+        if not isinstance(readings, list) or not readings:
+            return Response({'error': 'readings must be a non-empty list'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if len(readings) > settings.WEATHER_DEVICE_MAX_READINGS:
+            return Response({'error': f'At most {settings.WEATHER_DEVICE_MAX_READINGS} readings per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        serializer = DeviceReadingSerializer(data=readings, many=True)
+        serializer.is_valid(raise_exception=True)
+        stored = weather_engine.record_device_readings(farm, serializer.validated_data)
+        return Response({
+            'received': len(readings),
+            'stored': len(stored),
+            'readings': WeatherDataSerializer(stored, many=True).data,
+        }, status=status.HTTP_201_CREATED)
+    
+    def _range_response(self, request, default_days):
+        params = request.query_params
+        resolution = params.get('resolution', 'auto')
+        layout = params.get('layout', 'rows')
+        if resolution not in rollups.RESOLUTIONS + ('auto',) or layout not in ('rows', 'columnar'):
+            return Response(
+                {'error': f"resolution must be one of {', '.join(rollups.RESOLUTIONS)} or auto; "
+                          "layout must be rows or columnar"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            farm = get_object_or_404(Farm, pk=params.get('farm_id'), user=request.user)
+            end = _parse_moment(params.get('to')) or timezone.now()
+            if 'from' in params:
+                start = _parse_moment(params['from'])
+            else:
+                days = max(1, min(int(params.get('days', default_days)), 3650))
+                start = end - timedelta(days=days)
+        except (ValidationError, ValueError):
+            return Response(
+                {'error': 'A valid farm_id, ISO from/to (or integer days) are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if start is None or start >= end:
+            return Response({'error': 'from must be before to'}, status=status.HTTP_400_BAD_REQUEST)
+        raw_cutoff, hourly_cutoff = rollups.retention_cutoffs()
+        # Older raw readings and hourly rollups have been (or are about to be) compacted away
+        if resolution == 'raw' and start < raw_cutoff:
+            return Response(
+                {'error': f'Raw readings are kept for {settings.WEATHER_RAW_RETENTION_DAYS} days; '
+                          'use resolution=auto, hour or day for older ranges'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if resolution == 'hour' and start < hourly_cutoff:
+            return Response(
+                {'error': f'Hourly rollups are kept for {settings.WEATHER_HOURLY_RETENTION_DAYS} days; '
+                          'use resolution=auto, day or week for older ranges'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        resolution, points = rollups.history(
+            farm.id, start, end, None if resolution == 'auto' else resolution
+        )
+        if len(points) > settings.WEATHER_RANGE_MAX_POINTS:
+            return Response(
+                {'error': f'{len(points)} points requested; use a coarser resolution or a shorter range'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        body = {
+            'farm_id': str(farm.id),
+            'from': start,
+            'to': end,
+            'resolution': resolution,
+            'count': len(points),
+        }
+        if layout == 'columnar':
+            body['columns'] = rollups.columnar(points)
+        else:
+            body['points'] = points
+        return Response(body)
+
+
+def _parse_moment(value):
+    """Parse an ISO date or datetime query parameter (dates mean midnight UTC)"""
+    if not value:
+        return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Invalid date: {value}')
+        moment = datetime.combine(day, datetime.min.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
 
 
 # ============================================
 # ALERT VIEWSET
 # ============================================
-class AlertViewSet(viewsets.ModelViewSet):
+class AlertViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     """Alert management"""
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
@@ -335,27 +488,48 @@ class AlertViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def unread(self, request):
-        """Get unread alerts"""
-        alerts = Alert.objects.filter(user=request.user, is_read=False)
-        serializer = AlertListSerializer(alerts, many=True)
-        return Response(serializer.data)
+        """Get unread alerts, a keyset page at a time or as a delta since a sync cursor"""
+        size = self.paginator.get_page_size(request)
+        since = request.query_params.get('since')
+        try:
+            if since:
+                alerts, read_ids, has_more, sync = feed.unread_delta(request.user, size, since)
+            else:
+                alerts, next_cursor, sync = feed.unread_page(
+                    request.user, size, request.query_params.get('cursor'))
+        except feed.InvalidCursor as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = {
+            'count': counters.get(request.user.pk).unread_alerts,
+            'results': AlertListSerializer(alerts, many=True).data,
+            'sync': sync,
+        }
+        if since:
+            data.update(read_ids=read_ids or [], reset=read_ids is None, has_more=has_more)
+        else:
+            data['next'] = next_cursor
+        return Response(data)
     
     @action(detail=False, methods=['post'])
     def mark_all_read(self, request):
         """Mark all alerts as read"""
-        Alert.objects.filter(user=request.user, is_read=False).update(
-            is_read=True,
-            read_at=timezone.now()
-        )
+        counters.mark_read(Alert.objects.filter(user=request.user))
         return Response({'message': 'All alerts marked as read'})
     
+    @action(detail=False, methods=['post'])
+    def stream_ticket(self, request):
+        """Short-lived ticket for opening the alert stream (EventSource cannot send headers)"""
+        return Response({
+            'ticket': streaming.issue_ticket(request.user),
+            'expires_in': settings.ALERT_STREAM_TICKET_TTL,
+        })
+    
     @action(detail=True, methods=['post'])
     def mark_read(self, request, pk=None):
         """Mark specific alert as read"""
         alert = self.get_object()
-        alert.is_read = True
-        alert.read_at = timezone.now()
-        alert.save()
+        counters.mark_read(Alert.objects.filter(pk=alert.pk))
         return Response({'message': 'Alert marked as read'})
 
 
@@ -416,7 +590,7 @@ class FarmingRecommendationViewSet(viewsets.ModelViewSet):
 # ============================================
 # PEST RECORD VIEWSET
 # ============================================
-class PestRecordViewSet(viewsets.ModelViewSet):
+class PestRecordViewSet(AtomicWritesMixin, viewsets.ModelViewSet):
     """Pest management"""
     permission_classes = [permissions.IsAuthenticated]
     pagination_class = StandardResultsSetPagination
@@ -432,11 +606,12 @@ class PestRecordViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         pest = serializer.save()
         
-        # Create alert
-        Alert.objects.create(
+        # Create alert (repeats of the same pest coalesce into one)
+        coalesce.raise_alert(
             user=self.request.user,
             farm=pest.farm,
             alert_type='pest',
+            subject=pest.pest_name,
             title=f'Pest Alert: {pest.pest_name}',
             message=f"Pest detected: {pest.pest_name} at {pest.severity} level",
             severity='warning'
@@ -464,7 +639,14 @@ class IrrigationScheduleViewSet(viewsets.ModelViewSet):
             scheduled_date__gte=today,
             status__in=['planned', 'scheduled']
         ).order_by('scheduled_date')
-        serializer = IrrigationScheduleSerializer(schedules, many=True)
+        # Forecast risk is precomputed at ingestion; this is one lookup query
+        forecast_risks = {
+            (day.farm_id, day.date): day
+            for day in ForecastDailyRisk.objects.filter(farm__user=request.user, date__gte=today)
+        }
+        serializer = IrrigationScheduleSerializer(
+            schedules, many=True, context={'request': request, 'forecast_risks': forecast_risks}
+        )
         return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
@@ -520,157 +702,235 @@ def photo_upload(request):
 # ============================================
 # DISEASE DETECTION ENDPOINT
 # ============================================
+# Allowance for multipart boundaries and form fields around the image
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
 def disease_detection(request):
     """Detect diseases in uploaded images - returns comprehensive farmer-friendly results"""
+    # Refuse oversize bodies before the multipart upload is parsed
+    if int(request.META.get('CONTENT_LENGTH') or 0) > settings.MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES:
+        return Response({'error': 'Image too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
     if 'image' not in request.FILES:
         return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
     
     image_file = request.FILES['image']
     
-    # Mock disease detection results with comprehensive farmer-friendly data
-    diseases_db = [
-        {
-            'name': 'Powdery Mildew',
-            'confidence': 0.92,
-            'treatment': 'Apply sulfur-based fungicide or neem oil spray once weekly for 2-3 weeks. Ensure good air circulation around plants.',
-            'explanation': 'Powdery mildew is a fungal infection that appears as white powder on leaves. It thrives in warm, dry conditions and spreads quickly if not treated.',
-            'prevention': [
-                'Remove infected leaves and dispose of them properly',
-                'Improve air circulation by spacing plants adequately',
-                'Avoid overhead watering; water at soil level only',
-                'Apply preventive sulfur spray every 10-14 days during high-risk season'
-            ],
-            'affected_area_percent': 15.5,
-            'severity': 'Medium',
-            'healthy': False
-        },
-        {
-            'name': 'Early Blight',
-            'confidence': 0.85,
-            'treatment': 'Remove lower leaves (first 8-12 inches). Apply mancozeb or chlorothalonil fungicide every 7-10 days. Prune dense foliage.',
-            'explanation': 'Early blight causes brown spots with concentric rings on leaves. It starts on lower leaves and moves upward if left untreated. Common in tomatoes and potatoes.',
-            'prevention': [
-                'Remove infected leaves as soon as symptoms appear',
-                'Space plants for maximum air flow',
-                'Mulch soil to prevent soil splash',
-                'Rotate crops annually to different locations'
-            ],
-            'affected_area_percent': 22.8,
-            'severity': 'Medium',
-            'healthy': False
-        },
-        {
-            'name': 'Leaf Rust',
-            'confidence': 0.78,
-            'treatment': 'Apply rust-specific fungicides (sulfur or copper-based). Spray weekly until infection subsides. Remove severely affected leaves.',
-            'explanation': 'Leaf rust appears as reddish-brown or orange pustules on leaf undersides. It weakens plants by reducing photosynthesis capacity.',
-            'prevention': [
-                'Choose rust-resistant crop varieties when available',
-                'Maintain dry foliage by watering early morning at soil level',
-                'Thin crowded growth to improve air circulation',
-                'Remove and destroy heavily infected plant parts'
-            ],
-            'affected_area_percent': 8.3,
-            'severity': 'Low',
-            'healthy': False
-        },
-        {
-            'name': 'Healthy Crop',
-            'confidence': 0.95,
-            'treatment': 'Continue regular monitoring. Maintain good cultural practices: proper spacing, adequate water, and removal of dead leaves.',
-            'explanation': 'No visible disease detected. Plant appears healthy with normal leaf color and structure.',
-            'prevention': [
-                'Continue weekly crop monitoring',
-                'Maintain regular watering and fertilization schedule',
-                'Remove any yellowed or diseased leaves as they appear',
-                'Keep weeds controlled around the crop'
-            ],
-            'affected_area_percent': 0.0,
-            'severity': 'Low',
-            'healthy': True
-        }
-    ]
-    
-    import random
-    import base64
-    import cv2
-    import numpy as np
-    from io import BytesIO
-    from PIL import Image
+    # Job mode: persist a pending detection and let a worker run inference
+    if request.query_params.get('mode', request.data.get('mode')) == 'async':
+        return _enqueue_detection(request, image_file)
     
-    detection = random.choice(diseases_db)
-    
-    # Generate a simple marked image (simulates highlighting affected areas)
     try:
-        # Read the uploaded image
-        image_bytes = image_file.read()
-        image_array = np.frombuffer(image_bytes, np.uint8)
-        image = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-        
-        if image is not None:
-            # Create a marked version with visual highlights (if diseased)
-            marked_image = image.copy()
-            if not detection['healthy'] and detection['affected_area_percent'] > 0:
-                # Simple red highlight overlay on random regions (mock disease spots)
-                h, w = marked_image.shape[:2]
-                num_spots = max(2, int(detection['affected_area_percent'] / 5))
-                for _ in range(num_spots):
-                    cx = random.randint(w // 4, 3 * w // 4)
-                    cy = random.randint(h // 4, 3 * h // 4)
-                    radius = random.randint(20, 60)
-                    cv2.circle(marked_image, (cx, cy), radius, (0, 0, 255), 2)  # Red circles
-                    cv2.circle(marked_image, (cx, cy), radius, (0, 100, 255), -1)  # Red fill with alpha
-                    # Blend the circle with original image
-                    mask = np.zeros(marked_image.shape[:2], dtype=np.uint8)
-                    cv2.circle(mask, (cx, cy), radius, 255, -1)
-                    marked_image = np.where(mask[:, :, None] == 255, 
-                                            cv2.addWeighted(image, 0.5, marked_image, 0.5, 0),
-                                            marked_image)
-            
-            # Encode marked image to base64 data URI
-            _, encoded = cv2.imencode('.jpg', marked_image)
-            marked_image_base64 = base64.b64encode(encoded).decode('utf-8')
-            marked_image_uri = f"data:image/jpeg;base64,{marked_image_base64}"
-        else:
-            marked_image_uri = None
-    except Exception as e:
-        print(f"Error creating marked image: {e}")
-        marked_image_uri = None
+        detection, overlay_name, _ = analyze_image(image_file)
+    except ImageRejected as e:
+        return Response({'error': str(e)}, status=e.status_code)
+    
+    # Overlay is stored once in media storage and fetched lazily by URL
+    marked_image_url = artifact_url(request, overlay_name) if overlay_name else None
     
     # Save detection record to database
+    disease_record = None
     try:
-        disease_record = DiseaseDetection.objects.create(
-            user=request.user,
-            farm=request.user.userprofile.farm_set.first(),  # Get first farm if exists
-            image_path=f'uploads/{image_file.name}',
-            disease_name=detection['name'],
-            confidence_score=detection['confidence'],
-            severity_level=detection['severity'],
-            recommended_action=detection['treatment']
-        )
-        
-        # Log activity
-        ActivityLog.objects.create(
-            user=request.user,
-            action=f'Detected {detection["name"]} in image',
-            details=f'Confidence: {detection["confidence"]*100:.1f}%'
-        )
+        farm = _resolve_farm(request)
+        if farm is not None:
+            disease_record = DiseaseDetection.objects.create(
+                farm=farm,
+                original_image=image_file,
+                **detection_fields(detection, overlay_name)
+            )
+            
+            # Log activity
+            ActivityLog.objects.create(
+                user=request.user,
+                farm=farm,
+                activity_type='analysis_run',
+                description=f'Detected {detection["name"]} in image',
+                details={'confidence': detection['confidence']}
+            )
     except Exception as e:
         print(f'Error saving disease detection: {e}')
     
     # Return comprehensive farmer-friendly response
     return Response({
+        'detection_id': disease_record.id if disease_record else None,
         'disease_name': detection['name'],
         'confidence': detection['confidence'],
         'treatment': detection['treatment'],
         'explanation': detection['explanation'],
         'prevention': detection['prevention'],
-        'marked_image': marked_image_uri,
+        'marked_image_url': marked_image_url,
         'affected_area_percent': detection['affected_area_percent'],
         'severity': detection['severity'],
         'healthy': detection['healthy'],
         'filename': image_file.name,
         'message': 'Disease detection completed'
-    }, status=status.HTTP_200_OK)
\ No newline at end of file
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def disease_detection_bulk(request):
+    """Detect diseases in a multipart batch of images for one farm
+    
+    Inference runs as one batch, detections are written with a single
+    ``bulk_create`` and one aggregated Alert and ActivityLog are recorded.
+    Results are returned in upload order.
+    """
+    if int(request.META.get('CONTENT_LENGTH') or 0) > \
+            settings.BULK_DETECTION_MAX_IMAGES * (settings.MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES):
+        return Response({'error': 'Batch too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    
+    image_files = request.FILES.getlist('images')
+    if not image_files:
+        return Response({'error': 'No images provided'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(image_files) > settings.BULK_DETECTION_MAX_IMAGES:
+        return Response({'error': f'At most {settings.BULK_DETECTION_MAX_IMAGES} images per batch'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        farm = Farm.objects.get(pk=request.data.get('farm_id'), user=request.user)
+    except (Farm.DoesNotExist, ValueError, ValidationError):
+        return Response({'error': 'A valid farm_id is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    analyses = analyze_images(image_files)
+    
+    records = []
+    for image_file, analysis in zip(image_files, analyses):
+        if isinstance(analysis, ImageRejected):
+            continue
+        detection, overlay_name, _ = analysis
+        record = DiseaseDetection(farm=farm, **detection_fields(detection, overlay_name))
+        record.original_image.save(image_file.name, image_file, save=False)
+        records.append(record)
+    
+    with transaction.atomic():
+        DiseaseDetection.objects.bulk_create(records)
+        counters.adjust(farm.user_id, total_detections=len(records))
+        now = timezone.now()
+        Farm.objects.filter(pk=farm.pk).update(
+            total_analysis=F('total_analysis') + len(records),
+            last_analysis=now
+        )
+        
+        diseased = [record for record in records
+                    if not DISEASES_BY_NAME[record.detected_disease]['healthy']]
+        FarmAnalytics.objects.filter(farm=farm).update(
+            total_detections=F('total_detections') + len(records),
+            total_diseases_detected=F('total_diseases_detected') + len(diseased)
+        )
+        alert = None
+        if diseased:
+            counts = Counter(record.detected_disease for record in diseased)
+            alert = Alert.objects.create(
+                user=request.user,
+                farm=farm,
+                alert_type='disease',
+                title=f'Disease detected in {len(diseased)} of {len(records)} images',
+                message=', '.join(f'{name} ({count})' for name, count in counts.most_common()),
+                severity='critical' if any(r.severity == 'critical' for r in diseased) else 'warning',
+                related_detection=diseased[0]
+            )
+        
+        ActivityLog.objects.create(
+            user=request.user,
+            farm=farm,
+            activity_type='analysis_run',
+            description=f'Bulk disease analysis of {len(records)} images',
+            details={
+                'images': len(image_files),
+                'analyzed': len(records),
+                'diseased': len(diseased),
+            }
+        )
+    
+    records_iter = iter(records)
+    results = []
+    for image_file, analysis in zip(image_files, analyses):
+        if isinstance(analysis, ImageRejected):
+            results.append({'filename': image_file.name, 'error': str(analysis)})
+            continue
+        detection, overlay_name, _ = analysis
+        results.append({
+            'filename': image_file.name,
+            'detection_id': next(records_iter).id,
+            'disease_name': detection['name'],
+            'confidence': detection['confidence'],
+            'severity': detection['severity'],
+            'healthy': detection['healthy'],
+            'affected_area_percent': detection['affected_area_percent'],
+            'marked_image_url': artifact_url(request, overlay_name) if overlay_name else None,
+        })
+    
+    return Response({
+        'farm_id': farm.id,
+        'count': len(records),
+        'alert_id': alert.id if alert else None,
+        'results': results,
+    }, status=status.HTTP_201_CREATED)
+
+
+def _enqueue_detection(request, image_file):
+    """Accept an image for background analysis and return 202 with a job id"""
+    try:
+        farm = _resolve_farm(request)
+    except (ValueError, ValidationError):
+        farm = None
+    if farm is None:
+        return Response({'error': 'A farm is required for asynchronous detection'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    job = jobs.enqueue_detection(request.user, farm, image_file)
+    return Response({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': request.build_absolute_uri(
+            reverse('disease_detection_job', args=[job.id])
+        ),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def disease_detection_job(request, job_id):
+    """Job status; ``?wait=<seconds>`` long-polls until the job finishes"""
+    try:
+        wait = min(max(float(request.query_params.get('wait', 0)), 0), settings.DETECTION_MAX_WAIT)
+    except ValueError:
+        return Response({'error': 'wait must be a number of seconds'},
+                        status=status.HTTP_400_BAD_REQUEST)
+    
+    job = jobs.wait_for(job_id, request.user, wait)
+    if job is None:
+        return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+    
+    data = {'job_id': job.id, 'status': job.status}
+    if job.status == 'completed':
+        data['result'] = DiseaseDetectionDetailSerializer(job, context={'request': request}).data
+        data['marked_image_url'] = artifact_url(request, job.marked_image.name) if job.marked_image else None
+    elif job.status == 'failed':
+        data['error'] = job.error_message
+    return Response(data)
+
+
+def _resolve_farm(request):
+    """Farm named by ``farm_id`` in the request, else the user's first farm"""
+    farms = Farm.objects.filter(user=request.user)
+    farm_id = request.data.get('farm_id')
+    if farm_id:
+        return farms.filter(pk=farm_id).first()
+    return farms.first()
+
+
+# ============================================
+# METRICS ENDPOINT
+# ============================================
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def metrics_snapshot(request):
+    """In-process service metrics (cache counters, latencies, throughput)"""
+    return Response({
+        'detection_cache': get_result_cache().stats(),
+        'metrics': metrics.snapshot(),
+    })
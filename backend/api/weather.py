@@ -0,0 +1,760 @@
+# Weather Ingestion for CropGuard AI
+# File: api/weather.py
+#
+# One pooled HTTP session is shared by every weather lookup. Refreshing all
+# farms runs the lookups on a bounded thread pool behind a token-bucket rate
+# limiter, retries transient upstream failures with exponential backoff and
+# writes the readings with a single ``bulk_create``. Every call has a latency
+# budget that bounds its attempts and retries together, and a circuit breaker
+# fails calls fast while the provider is down, so an outage cannot tie up
+# request workers; read paths then fall back to the last stored reading.
+# Locations are snapped to a geo grid first, so one upstream call serves
+# every farm in a grid cell.
+# Per-cell readings are cached with a TTL and a stale-while-revalidate window,
+# and a new ``WeatherData`` row is only written when the reading changes.
+# Forecasts are ingested the same way and scored for disease risk in batch,
+# with a per-day summary that read paths use as is. Risky readings become
+# cell-wide events that ``alerts`` fans out to every affected farm owner.
+
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone as dt_timezone
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+from requests.adapters import HTTPAdapter
+
+import metrics
+
+from . import alerts, background, risk
+from .models import Farm, ForecastDailyRisk, WeatherData, WeatherForecast
+
+upstream_latency = metrics.histogram('weather_upstream_seconds')
+upstream_errors = metrics.counter('weather_upstream_errors')
+upstream_retries = metrics.counter('weather_upstream_retries')
+farms_refreshed = metrics.counter('weather_farms_refreshed')
+cells_refreshed = metrics.counter('weather_cells_refreshed')
+refresh_rate = metrics.gauge('weather_refresh_farms_per_second')
+cache_hits = metrics.counter('weather_cache_fresh_hits')
+cache_stale_hits = metrics.counter('weather_cache_stale_hits')
+cache_misses = metrics.counter('weather_cache_misses')
+rows_skipped = metrics.counter('weather_rows_unchanged')
+fallback_hits = metrics.counter('weather_fallback_hits')
+budget_exhausted = metrics.counter('weather_upstream_budget_exhausted')
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Fields that decide whether a new reading differs from the stored one
+READING_FIELDS = ('temperature', 'humidity', 'rainfall', 'wind_speed', 'condition', 'description')
+
+# OpenWeatherMap "main" groups -> WeatherData.WEATHER_CONDITIONS
+CONDITIONS = {
+    'clear': 'sunny',
+    'clouds': 'cloudy',
+    'rain': 'rainy',
+    'drizzle': 'rainy',
+    'thunderstorm': 'stormy',
+    'snow': 'stormy',
+    'squall': 'stormy',
+    'tornado': 'stormy',
+    'mist': 'foggy',
+    'fog': 'foggy',
+    'haze': 'foggy',
+    'smoke': 'foggy',
+    'dust': 'foggy',
+    'sand': 'foggy',
+    'ash': 'foggy',
+}
+
+
+class UpstreamError(Exception):
+    """Raised when the weather provider cannot return a usable reading
+
+    ``outage`` is False when the provider answered but refused the request
+    (bad key, unknown location); only outages count against the breaker.
+    """
+
+    def __init__(self, message, outage=True):
+        super().__init__(message)
+        self.outage = outage
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling the provider while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__('Weather provider unavailable: circuit open')
+        self.retry_after = retry_after
+
+
+# ============================================
+# RATE LIMITING
+# ============================================
+class RateLimiter:
+    """Token bucket shared by every thread using one client"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# ============================================
+# CIRCUIT BREAKER
+# ============================================
+class CircuitBreaker:
+    """Closed / open / half-open breaker shared by every thread using one client
+
+    ``threshold`` consecutive failed calls open the circuit; calls are then
+    rejected for ``reset_timeout`` seconds, after which a single probe call
+    is let through (half-open). Its outcome closes or re-opens the circuit.
+    State and counters are reported per provider ``source``.
+    """
+
+    def __init__(self, threshold=None, reset_timeout=None, source='openweather'):
+        self.threshold = settings.WEATHER_BREAKER_THRESHOLD if threshold is None else threshold
+        self.reset_timeout = (settings.WEATHER_BREAKER_RESET
+                              if reset_timeout is None else reset_timeout)
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.source = source
+        self.state_gauge = metrics.gauge(f'weather_{source}_circuit_state')
+        self.opened = metrics.counter(f'weather_{source}_circuit_opened')
+        self.rejected = metrics.counter(f'weather_{source}_circuit_rejected')
+        self.state_gauge.set(self.state)
+
+    def allow(self):
+        """True if a call may go upstream now; may move an open circuit to half-open"""
+        if not self.threshold:
+            return True
+        with self._lock:
+            if self.state == 'open' and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state('half_open')
+            if self.state == 'closed':
+                return True
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return True
+        self.rejected.inc()
+        return False
+
+    def retry_after(self):
+        """Seconds until an open circuit lets a probe through"""
+        with self._lock:
+            if self.state != 'open':
+                return 0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != 'closed':
+                self._set_state('closed')
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == 'half_open' or (self.threshold and self._failures >= self.threshold):
+                if self.state != 'open':
+                    self.opened.inc()
+                self._opened_at = time.monotonic()
+                self._set_state('open')
+
+    def release_probe(self):
+        """Let another probe through if the current one ended without an outcome"""
+        with self._lock:
+            self._probing = False
+
+    def _set_state(self, state):
+        self.state = state
+        self.state_gauge.set(state)
+
+
+# ============================================
+# UPSTREAM CLIENT
+# ============================================
+class WeatherClient:
+    """Pooled, rate-limited OpenWeatherMap client with retry, backoff and a breaker
+
+    Other providers (see ``providers``) subclass it and override the class
+    attributes plus ``current`` and ``forecast``.
+    """
+    source = 'openweather'
+    url_setting = 'OPENWEATHERMAP_URL'
+    key_setting = 'OPENWEATHERMAP_API_KEY'
+    key_param = 'appid'
+
+    def __init__(self, base_url=None, api_key=None, concurrency=None, rate_limit=None,
+                 max_retries=None, backoff=None, timeout=None, budget=None, breaker=None):
+        self.base_url = (base_url or getattr(settings, self.url_setting)).rstrip('/')
+        self.api_key = api_key or getattr(settings, self.key_setting)
+        # Whole-call latency of this provider; hedging waits for its p95
+        self.latency = metrics.histogram(f'weather_{self.source}_call_seconds')
+        self.concurrency = concurrency or settings.WEATHER_CONCURRENCY
+        self.max_retries = settings.WEATHER_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = settings.WEATHER_BACKOFF if backoff is None else backoff
+        self.timeout = timeout or settings.WEATHER_TIMEOUT
+        self.budget = budget or settings.WEATHER_CALL_BUDGET
+        self.breaker = breaker or CircuitBreaker(source=self.source)
+        self.limiter = RateLimiter(
+            settings.WEATHER_RATE_LIMIT if rate_limit is None else rate_limit
+        )
+
+        # One keep-alive connection per worker thread
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def current(self, latitude, longitude):
+        """Current conditions at a location, as ``WeatherData`` field values"""
+        reading = parse_current(self.get('weather', lat=latitude, lon=longitude, units='metric'))
+        reading['source'] = self.source
+        return reading
+
+    def forecast(self, latitude, longitude):
+        """Upcoming readings at a location, as ``(time, fields)`` pairs"""
+        points = parse_forecast(self.get('forecast', lat=latitude, lon=longitude, units='metric'))
+        for _, fields in points:
+            fields['source'] = self.source
+        return points
+
+    def get(self, path, **params):
+        """GET ``path``; attempts and retries together stay within ``self.budget`` seconds"""
+        if not self.breaker.allow():
+            raise CircuitOpenError(self.breaker.retry_after())
+        started = time.monotonic()
+        try:
+            data = self._get(path, params)
+        except UpstreamError as e:
+            if e.outage:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        finally:
+            # An unexpected error must not leave a half-open probe in flight
+            self.breaker.release_probe()
+        self.breaker.record_success()
+        self.latency.observe(time.monotonic() - started)
+        return data
+
+    def _get(self, path, params):
+        params[self.key_param] = self.api_key
+        url = f'{self.base_url}/{path}'
+        deadline = time.monotonic() + self.budget
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            started = time.monotonic()
+            remaining = deadline - started
+            if remaining <= 0:
+                budget_exhausted.inc()
+                upstream_errors.inc()
+                raise UpstreamError('Weather provider unavailable: latency budget exhausted')
+            try:
+                response = self.session.get(url, params=params,
+                                            timeout=min(self.timeout, remaining))
+                error = None
+            except requests.RequestException as e:
+                # Connection resets, timeouts, broken chunked bodies, ...
+                response, error = None, e
+            upstream_latency.observe(time.monotonic() - started)
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                if response.status_code != 200:
+                    upstream_errors.inc()
+                    raise UpstreamError(f'Weather provider returned {response.status_code}',
+                                        outage=False)
+                try:
+                    return response.json()
+                except ValueError as e:
+                    upstream_errors.inc()
+                    raise UpstreamError('Weather provider returned invalid JSON') from e
+
+            reason = error or f'status {response.status_code}'
+            delay = self._retry_delay(attempt, response)
+            if attempt == self.max_retries or time.monotonic() + delay >= deadline:
+                if attempt < self.max_retries:
+                    budget_exhausted.inc()
+                upstream_errors.inc()
+                raise UpstreamError(f'Weather provider unavailable: {reason}')
+            upstream_retries.inc()
+            time.sleep(delay)
+
+    def _retry_delay(self, attempt, response):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        # Full jitter keeps retrying workers from hitting the provider in step
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client, so every lookup shares one connection pool
+
+    Built from ``WEATHER_PROVIDER``, hedged with ``WEATHER_SECONDARY_PROVIDER``
+    when one is configured.
+    """
+    from .providers import build_client
+
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = build_client()
+        return _client
+
+
+def parse_current(data):
+    """Map an OpenWeatherMap current-weather payload to ``WeatherData`` fields"""
+    try:
+        weather = (data.get('weather') or [{}])[0]
+        return {
+            'temperature': round(float(data['main']['temp']), 2),
+            'humidity': round(float(data['main']['humidity']), 2),
+            'rainfall': round(float((data.get('rain') or {}).get('1h', 0)), 2),
+            # Provider reports m/s; WeatherData stores km/h
+            'wind_speed': round(float((data.get('wind') or {}).get('speed', 0)) * 3.6, 2),
+            'condition': CONDITIONS.get(str(weather.get('main', '')).lower(), 'partly_cloudy'),
+            'description': weather.get('description', ''),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise UpstreamError(f'Unexpected weather payload: {e}') from e
+
+
+def parse_forecast(data):
+    """Map an OpenWeatherMap 3-hourly forecast payload to ``(time, fields)`` pairs"""
+    try:
+        points = []
+        for item in data['list']:
+            fields = parse_current(item)
+            fields['rainfall'] = round(float((item.get('rain') or {}).get('3h', 0)), 2)
+            points.append((datetime.fromtimestamp(int(item['dt']), tz=dt_timezone.utc), fields))
+        return points
+    except (KeyError, TypeError, ValueError) as e:
+        raise UpstreamError(f'Unexpected forecast payload: {e}') from e
+
+
+# ============================================
+# GEO GRID
+# ============================================
+def grid_cell(latitude, longitude, size=None):
+    """Grid cell ``(row, col)`` holding a location; cells are ``size`` degrees square"""
+    size = settings.WEATHER_GRID_SIZE if size is None else size
+    if not size:
+        return float(latitude), float(longitude)
+    return math.floor(float(latitude) / size), math.floor(float(longitude) / size)
+
+
+def cell_center(cell, size=None):
+    """Coordinates every lookup for ``cell`` is made at"""
+    size = settings.WEATHER_GRID_SIZE if size is None else size
+    if not size:
+        return cell
+    return round((cell[0] + 0.5) * size, 6), round((cell[1] + 0.5) * size, 6)
+
+
+def group_by_cell(farms, size=None):
+    """Map each grid cell to the farms inside it"""
+    cells = {}
+    for farm in farms:
+        cells.setdefault(grid_cell(farm.latitude, farm.longitude, size), []).append(farm)
+    return cells
+
+
+def current_for_farm(farm, client=None):
+    """Current reading for ``farm``, looked up at its grid cell's centre"""
+    client = client or get_client()
+    return client.current(*cell_center(grid_cell(farm.latitude, farm.longitude)))
+
+
+# ============================================
+# READING CACHE
+# ============================================
+class CachedReading:
+    __slots__ = ('reading', 'fetched_at')
+
+    def __init__(self, reading, fetched_at):
+        self.reading = reading
+        self.fetched_at = fetched_at
+
+    def age(self, now=None):
+        return ((now or timezone.now()) - self.fetched_at).total_seconds()
+
+
+class ReadingCache:
+    """Latest reading per grid cell, judged fresh, stale or expired by age
+
+    Fresh entries (younger than ``ttl``) are served as is. Stale entries
+    (younger than ``ttl + stale``) are served while a background refresh
+    runs. Older entries are refetched before answering.
+    """
+
+    def __init__(self, ttl=None, stale=None, max_entries=10000):
+        self.ttl = settings.WEATHER_CACHE_TTL if ttl is None else ttl
+        self.stale = settings.WEATHER_CACHE_STALE if stale is None else stale
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def put(self, key, reading, fetched_at=None, replace=True):
+        """Store a reading; with ``replace=False`` only fills an empty or older slot"""
+        entry = CachedReading(reading, fetched_at or timezone.now())
+        with self._lock:
+            current = self._entries.get(key)
+            if current is not None and not replace and current.fetched_at >= entry.fetched_at:
+                return current
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def state(self, entry):
+        if entry is None:
+            return 'expired'
+        age = entry.age()
+        if age < self.ttl:
+            return 'fresh'
+        if age < self.ttl + self.stale:
+            return 'stale'
+        return 'expired'
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = None
+
+
+def get_cache():
+    global _cache
+    with _client_lock:
+        if _cache is None:
+            _cache = ReadingCache()
+        return _cache
+
+
+def reading_of(weather):
+    """The comparable reading fields of a stored ``WeatherData`` row"""
+    return {field: getattr(weather, field) for field in READING_FIELDS}
+
+
+def same_reading(weather, reading):
+    for field in READING_FIELDS:
+        stored, new = getattr(weather, field), reading.get(field)
+        if field in ('condition', 'description'):
+            if (stored or '') != (new or ''):
+                return False
+        elif round(float(stored), 2) != round(float(new or 0), 2):
+            return False
+    return True
+
+
+def latest_weather(farm, client=None):
+    """Latest ``WeatherData`` for ``farm`` through the cache; returns ``(row, state)``
+
+    ``state`` is ``fresh``, ``stale`` (a background refresh was scheduled),
+    ``miss`` (the provider was called before answering) or ``fallback`` (the
+    provider failed and the last stored row is served). Raises
+    ``UpstreamError`` only when there is nothing usable to serve.
+    """
+    cache = get_cache()
+    cell = grid_cell(farm.latitude, farm.longitude)
+    latest = WeatherData.objects.filter(farm=farm).order_by('-recorded_at').first()
+    if latest is not None and latest.source != 'device':
+        # A cold cache is seeded from the table, so a restart does not refetch.
+        # Device readings are local to one farm and never stand for the cell.
+        cache.put(cell, reading_of(latest), latest.recorded_at, replace=False)
+    entry = cache.get(cell)
+    state = cache.state(entry)
+
+    if state == 'fresh':
+        cache_hits.inc()
+    elif state == 'stale':
+        cache_stale_hits.inc()
+        background.submit(revalidate, farm.pk, key=('weather', cell))
+    else:
+        cache_misses.inc()
+        try:
+            entry = cache.put(cell, current_for_farm(farm, client))
+        except UpstreamError:
+            if latest is None:
+                raise
+            fallback_hits.inc()
+            return latest, 'fallback'
+        state = 'miss'
+    return record_reading(farm, entry, latest), state
+
+
+def revalidate(farm_id, client=None):
+    """Background refresh of a farm's cell, recording the reading if it changed"""
+    farm = Farm.objects.select_related('user').get(pk=farm_id)
+    cell = grid_cell(farm.latitude, farm.longitude)
+    try:
+        entry = get_cache().put(cell, current_for_farm(farm, client))
+    except CircuitOpenError:
+        return None  # the stale reading keeps being served until the provider recovers
+    return record_reading(farm, entry)
+
+
+def record_reading(farm, entry, latest=None):
+    """Write ``entry`` for ``farm`` unless it matches the latest stored row"""
+    latest = latest or WeatherData.objects.filter(farm=farm).order_by('-recorded_at').first()
+    if latest is not None and (latest.recorded_at >= entry.fetched_at
+                               or same_reading(latest, entry.reading)):
+        rows_skipped.inc()
+        return latest
+    weather = build_weather(farm, entry.reading, recorded_at=entry.fetched_at)
+    risk.assess([weather])
+    weather.save()
+    alerts.dispatch([alerts.RiskEvent.for_reading(weather)])
+    return weather
+
+
+# ============================================
+# RECORDS
+# ============================================
+def build_weather(farm, reading, source='openweather', recorded_at=None):
+    """Unsaved ``WeatherData`` for ``farm``; score it with ``risk.assess``
+
+    A ``source`` carried in ``reading`` (set by the provider that answered)
+    wins over the argument.
+    """
+    fields = dict(reading)
+    return WeatherData(
+        farm=farm,
+        source=fields.pop('source', source),
+        recorded_at=recorded_at or timezone.now(),
+        **fields
+    )
+
+
+def record_device_readings(farm, readings):
+    """Store sensor readings for ``farm``; resent readings (same time) are skipped
+
+    Device readings describe one farm, so any alert they raise goes to that
+    farm only rather than to its grid cell.
+    """
+    seen = set(WeatherData.objects.filter(
+        farm=farm, source='device',
+        recorded_at__in=[reading['recorded_at'] for reading in readings],
+    ).values_list('recorded_at', flat=True))
+    rows = []
+    for reading in sorted(readings, key=lambda r: r['recorded_at']):
+        fields = dict(reading)
+        recorded_at = fields.pop('recorded_at')
+        if recorded_at not in seen:
+            seen.add(recorded_at)
+            rows.append(build_weather(farm, fields, source='device', recorded_at=recorded_at))
+    risk.assess(rows)
+    WeatherData.objects.bulk_create(rows)
+    if rows:
+        latest = rows[-1]
+        alerts.dispatch([alerts.RiskEvent(latest.alert_level, latest.condition, farm_id=farm.pk)])
+    return rows
+
+
+# ============================================
+# INGESTION ENGINE
+# ============================================
+def refresh_farms(farms=None, client=None):
+    """Fetch current weather for ``farms`` (default: every active farm)
+
+    One lookup is made per grid cell and its reading is fanned out to every
+    farm in the cell. Lookups run concurrently; every reading and every
+    resulting alert is written with one ``bulk_create`` each, skipping farms
+    whose reading has not changed. Returns a stats dict.
+    """
+    client = client or get_client()
+    if farms is None:
+        farms = Farm.objects.filter(is_active=True).select_related('user')
+    cells = group_by_cell(farms)
+    started = time.monotonic()
+    recorded_at = timezone.now()
+
+    def lookup(cell):
+        try:
+            return cell, client.current(*cell_center(cell))
+        except UpstreamError as e:
+            return cell, e
+
+    with ThreadPoolExecutor(max_workers=client.concurrency,
+                            thread_name_prefix='weather-ingest') as pool:
+        outcomes = list(pool.map(lookup, cells))
+
+    cache = get_cache()
+    fetched = {
+        cell: reading for cell, reading in outcomes if not isinstance(reading, Exception)
+    }
+    for cell, reading in fetched.items():
+        cache.put(cell, reading, recorded_at)
+
+    farms = [farm for cell in fetched for farm in cells[cell]]
+    latest = latest_rows(farms)
+    readings = [
+        build_weather(farm, fetched[cell], recorded_at=recorded_at)
+        for cell in fetched for farm in cells[cell]
+        if farm.pk not in latest or not same_reading(latest[farm.pk], fetched[cell])
+    ]
+    rows_skipped.inc(len(farms) - len(readings))
+    risk.assess(readings)
+    WeatherData.objects.bulk_create(readings, batch_size=500)
+    # One event per cell, at the most severe level scored in it
+    events = {}
+    for weather in readings:
+        event = alerts.RiskEvent.for_reading(weather)
+        if event.cell not in events or alerts.risk_rank(event) > alerts.risk_rank(events[event.cell]):
+            events[event.cell] = event
+    fanned_out = alerts.fan_out(list(events.values()))
+
+    elapsed = time.monotonic() - started
+    farm_count = sum(len(members) for members in cells.values())
+    farms_refreshed.inc(len(farms))
+    cells_refreshed.inc(len(cells))
+    rate = round(len(farms) / elapsed, 2) if elapsed else None
+    refresh_rate.set(rate)
+    return {
+        'farms': farm_count,
+        'cells': len(cells),
+        'refreshed': len(farms),
+        'inserted': len(readings),
+        'alerts': fanned_out['created'],
+        'failed': farm_count - len(farms),
+        'seconds': round(elapsed, 3),
+        'farms_per_second': rate,
+        'upstream_latency_p50': upstream_latency.percentile(50),
+        'upstream_latency_p95': upstream_latency.percentile(95),
+        'upstream_latency_p99': upstream_latency.percentile(99),
+    }
+
+
+def latest_rows(farms):
+    """Latest ``WeatherData`` per farm, fetched in one query"""
+    newest = WeatherData.objects.filter(farm=OuterRef('farm')).order_by('-recorded_at')
+    farm_ids = [farm.pk for farm in farms]
+    rows = {}
+    for start in range(0, len(farm_ids), 500):  # stay under SQLite's variable limit
+        for row in WeatherData.objects.filter(
+            farm__in=farm_ids[start:start + 500],
+            pk=Subquery(newest.values('pk')[:1]),
+        ):
+            rows[row.farm_id] = row
+    return rows
+
+
+# ============================================
+# FORECASTS
+# ============================================
+def refresh_forecasts(farms=None, client=None):
+    """Fetch the forecast for ``farms`` (default: every active farm) and score it
+
+    One lookup per grid cell, run concurrently. Each farm's forecast points
+    are scored with its observed history, then stored (replacing the previous
+    forecast) together with a per-day risk summary. Returns a stats dict.
+    """
+    client = client or get_client()
+    if farms is None:
+        farms = Farm.objects.filter(is_active=True)
+    cells = group_by_cell(farms)
+    started = time.monotonic()
+    issued_at = timezone.now()
+
+    def lookup(cell):
+        try:
+            return cell, client.forecast(*cell_center(cell))
+        except UpstreamError as e:
+            return cell, e
+
+    with ThreadPoolExecutor(max_workers=client.concurrency,
+                            thread_name_prefix='weather-forecast') as pool:
+        outcomes = [(cell, points) for cell, points in pool.map(lookup, cells)
+                    if not isinstance(points, Exception)]
+
+    forecasts = [
+        WeatherForecast(farm=farm, forecast_for=moment, issued_at=issued_at, **fields)
+        for cell, points in outcomes for farm in cells[cell] for moment, fields in points
+    ]
+    risk.assess(forecasts, time_field='forecast_for')
+    summaries = daily_risk(forecasts, issued_at)
+
+    farm_ids = [farm.pk for cell, _ in outcomes for farm in cells[cell]]
+    with transaction.atomic():
+        for start in range(0, len(farm_ids), 500):
+            chunk = farm_ids[start:start + 500]
+            WeatherForecast.objects.filter(farm_id__in=chunk).delete()
+            ForecastDailyRisk.objects.filter(farm_id__in=chunk).delete()
+        WeatherForecast.objects.bulk_create(forecasts, batch_size=500)
+        ForecastDailyRisk.objects.bulk_create(summaries, batch_size=500)
+
+    farm_count = sum(len(members) for members in cells.values())
+    return {
+        'farms': farm_count,
+        'cells': len(cells),
+        'refreshed': len(farm_ids),
+        'failed': farm_count - len(farm_ids),
+        'forecast_points': len(forecasts),
+        'risk_days': len(summaries),
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+def daily_risk(forecasts, issued_at):
+    """Collapse scored forecast points into one ``ForecastDailyRisk`` per farm and day"""
+    days = {}
+    for point in forecasts:
+        key = (point.farm_id, timezone.localdate(point.forecast_for))
+        day = days.get(key)
+        if day is None:
+            day = days[key] = ForecastDailyRisk(
+                farm_id=point.farm_id, date=key[1], issued_at=issued_at,
+                alert_level='green', disease_risk='', rainfall_total=0,
+                temperature_max=point.temperature, humidity_max=point.humidity,
+            )
+        if risk.LEVELS.index(point.alert_level) > risk.LEVELS.index(day.alert_level):
+            day.alert_level = point.alert_level
+        labels = [label for label in day.disease_risk.split('; ') if label]
+        for label in point.disease_risk.split('; '):
+            if label and label not in labels:
+                labels.append(label)
+        day.disease_risk = '; '.join(labels)
+        day.rainfall_total = round(day.rainfall_total + point.rainfall, 2)
+        day.temperature_max = max(day.temperature_max, point.temperature)
+        day.humidity_max = max(day.humidity_max, point.humidity)
+    return list(days.values())
@@ -1,17 +1,105 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, redirect, send_from_directory
 from tensorflow.keras.models import load_model
 from tensorflow.keras.preprocessing import image
 import numpy as np
 import cv2
-import tensorflow as tf
-import base64
-from PIL import Image
-import io
+import os
+
+import metrics
+from inference.artifacts import ArtifactStore
+from inference.batching import MicroBatcher
+from inference.cache import ResultCache
+from inference.gradcam import GradCAM
+from inference.ingest import ImageRejected, ingest_image
+from inference.lifecycle import ModelManager
+from inference.overlay import encode_jpeg, render_heatmap
+from inference.results import ResultStore
+from inference.runtime import KerasRuntime, load_runtime
 
 app = Flask(__name__)
 
-# Load model
-model = load_model("cropguard_model.h5")
+# Oversize bodies are refused by Werkzeug before they are read
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", 50 * 1000 * 1000))
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_BYTES + 64 * 1024
+
+# Batch concurrent /predict calls into one model call
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 16))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 10))
+
+# Model lifecycle: MODEL_LOAD=eager loads and warms up at startup,
+# MODEL_LOAD=lazy on the first request (or first /ready probe)
+MODEL_PATH = os.environ.get("MODEL_PATH", "cropguard_model.h5")
+MODEL_LOAD = os.environ.get("MODEL_LOAD", "eager")
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.environ.get("WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE}").split(",")
+]
+
+# Classification runtime: MODEL_RUNTIME=keras runs the .h5 model,
+# MODEL_RUNTIME=tflite the CPU export from `python -m inference.export convert`.
+# Labels always come from this runtime; the Keras model only draws heatmaps
+MODEL_RUNTIME = os.environ.get("MODEL_RUNTIME", "keras")
+TFLITE_MODEL_PATH = os.environ.get("TFLITE_MODEL_PATH", "cropguard_model.tflite")
+
+def load_classifier():
+    if MODEL_RUNTIME == "keras":
+        return KerasRuntime(load_model(MODEL_PATH))
+    return load_runtime(MODEL_RUNTIME, TFLITE_MODEL_PATH)
+
+def load_grad_cam():
+    # Grad-CAM needs gradients, so it always runs on the Keras model; the
+    # keras runtime shares its model, other runtimes load it on first use
+    if MODEL_RUNTIME == "keras":
+        return GradCAM(model_manager.get().model)
+    return GradCAM(load_model(MODEL_PATH))
+
+def classify(runtime, batch):
+    return runtime.predict(batch)
+
+def classify_with_heatmaps(grad_cam, batch):
+    return grad_cam(batch)
+
+model_manager = ModelManager(
+    load_classifier,
+    warmup_fns=[classify],
+    batch_sizes=WARMUP_BATCH_SIZES,
+    load_mode=MODEL_LOAD,
+).start()
+
+gradcam_manager = ModelManager(
+    load_grad_cam,
+    warmup_fns=[classify_with_heatmaps],
+    batch_sizes=WARMUP_BATCH_SIZES,
+    load_mode=MODEL_LOAD if MODEL_RUNTIME == "keras" else "lazy",
+    name="gradcam_model",
+).start()
+
+classify_batcher = MicroBatcher(
+    lambda batch: classify(model_manager.get(), batch),
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    name="classify",
+).start()
+
+gradcam_batcher = MicroBatcher(
+    lambda batch: classify_with_heatmaps(gradcam_manager.get(), batch),
+    max_batch_size=BATCH_MAX_SIZE,
+    max_wait_ms=BATCH_MAX_WAIT_MS,
+    name="gradcam",
+).start()
+
+# Recent results, so overlays can be fetched (or computed) later by id
+results = ResultStore(max_entries=int(os.environ.get("RESULT_STORE_SIZE", 256)))
+
+# Overlays are stored once as files and served with range/cache support
+artifacts = ArtifactStore(os.environ.get("ARTIFACT_DIR", "artifacts"))
+ARTIFACT_MAX_AGE = int(os.environ.get("ARTIFACT_MAX_AGE", 365 * 24 * 3600))
+
+# Results keyed by a hash of the uploaded bytes, for repeated uploads
+cache = ResultCache(
+    max_bytes=int(os.environ.get("RESULT_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+    disk_dir=os.environ.get("RESULT_CACHE_DIR") or None,
+)
 
 CLASS_NAMES = ["Healthy", "Leaf_Blight", "Rust"]
 
@@ -30,68 +118,157 @@ RECOMMENDATIONS = {
     }
 }
 
-def make_gradcam_heatmap(img_array, model, last_conv_layer_name="Conv_1"):
-    grad_model = tf.keras.models.Model(
-        [model.inputs],
-        [model.get_layer(last_conv_layer_name).output, model.output]
-    )
+def render_overlay(img_resized, heatmap, key):
+    img_cv = cv2.cvtColor(np.array(img_resized), cv2.COLOR_RGB2BGR)
+    overlay = render_heatmap(img_cv, heatmap, alpha=0.4)
+    heatmap = cv2.resize(heatmap, (224, 224))
 
-    with tf.GradientTape() as tape:
-        conv_outputs, predictions = grad_model(img_array)
-        class_channel = predictions[:, tf.argmax(predictions[0])]
+    severity_percent = round(float(np.mean(heatmap) * 100), 2)
+    if severity_percent < 30:
+        severity_level = "Low"
+    elif severity_percent < 60:
+        severity_level = "Medium"
+    else:
+        severity_level = "High"
 
-    grads = tape.gradient(class_channel, conv_outputs)
-    pooled_grads = tf.reduce_mean(grads, axis=(0, 1, 2))
+    return {
+        "severity_level": severity_level,
+        "severity_percent": severity_percent,
+        "overlay_name": artifacts.save(f"{key}.jpg", encode_jpeg(overlay))
+    }
 
-    conv_outputs = conv_outputs[0]
-    heatmap = conv_outputs @ pooled_grads[..., tf.newaxis]
-    heatmap = tf.squeeze(heatmap)
+def has_overlay(entry):
+    return bool(entry.get("overlay_name")) and artifacts.exists(entry["overlay_name"])
 
-    heatmap = tf.maximum(heatmap, 0) / tf.math.reduce_max(heatmap)
-    return heatmap.numpy()
+def build_response(result_id, entry):
+    disease = entry["disease"]
+    response = {
+        "result_id": result_id,
+        "disease": disease,
+        "confidence": entry["confidence"],
+        "treatment": RECOMMENDATIONS[disease]["treatment"],
+        "prevention": RECOMMENDATIONS[disease]["prevention"],
+        "marked_image_url": f"/results/{result_id}/marked_image"
+    }
+    if has_overlay(entry):
+        response.update({
+            "severity_level": entry["severity_level"],
+            "severity_percent": entry["severity_percent"],
+            "marked_image_url": f"/artifacts/{entry['overlay_name']}"
+        })
+    return response
+
+def cache_key(key):
+    # Runtimes can disagree slightly, so their labels are cached apart
+    return f"{key}-{MODEL_RUNTIME}"
+
+def to_model_input(img_resized):
+    img_array = image.img_to_array(img_resized)
+    return np.expand_dims(img_array, axis=0) / 255.0
 
 @app.route("/predict", methods=["POST"])
 def predict():
+    # mode=label skips Grad-CAM; the overlay can be fetched later by result_id
+    mode = request.args.get("mode", request.form.get("mode", "full"))
+    if mode not in ("full", "label"):
+        return jsonify({"error": "mode must be 'full' or 'label'"}), 400
+
     file = request.files["image"]
-    img = Image.open(file).convert("RGB")
-    img_resized = img.resize((224, 224))
+    try:
+        # Hashes the upload in chunks; pixels are decoded only when needed
+        ingested = ingest_image(file, max_side=224, max_bytes=MAX_UPLOAD_BYTES,
+                                max_pixels=MAX_IMAGE_PIXELS)
+        key = ingested.key
 
-    img_array = image.img_to_array(img_resized)
-    img_array = np.expand_dims(img_array, axis=0) / 255.0
+        cached = cache.get(cache_key(key))
+        if cached is not None and (mode == "label" or has_overlay(cached)):
+            # Keep the resized image so the overlay can still be rendered later
+            img = None if has_overlay(cached) else ingested.resized((224, 224))
+            result_id = results.add({"key": key, "image": img, **cached})
+            return jsonify(build_response(result_id, cached))
+
+        img_resized = ingested.resized((224, 224))
+    except ImageRejected as e:
+        return jsonify({"error": str(e)}), e.status_code
+
+    img_array = to_model_input(img_resized)
+
+    if mode == "label":
+        preds = classify_batcher.predict(img_array)
+        heatmap = None
+    elif MODEL_RUNTIME == "keras":
+        # Same model: the Grad-CAM forward pass is the classification
+        preds, heatmaps = gradcam_batcher.predict(img_array)
+        heatmap = heatmaps[0]
+    else:
+        # The label comes from the configured runtime; Keras only draws the heatmap
+        label = classify_batcher.submit(img_array)
+        _, heatmaps = gradcam_batcher.predict(img_array)
+        preds = label.result()
+        heatmap = heatmaps[0]
 
-    preds = model.predict(img_array)
     confidence = float(np.max(preds))
     class_index = np.argmax(preds)
-    disease = CLASS_NAMES[class_index]
 
-    heatmap = make_gradcam_heatmap(img_array, model)
+    entry = {
+        "disease": CLASS_NAMES[class_index],
+        "confidence": round(confidence, 2),
+    }
+    if heatmap is not None:
+        entry.update(render_overlay(img_resized, heatmap, key))
+    cache.put(cache_key(key), entry)
 
-    img_cv = cv2.cvtColor(np.array(img_resized), cv2.COLOR_RGB2BGR)
-    heatmap = cv2.resize(heatmap, (224, 224))
-    heatmap_color = cv2.applyColorMap(np.uint8(255 * heatmap), cv2.COLORMAP_JET)
+    result_id = results.add({"key": key, "image": img_resized, **entry})
+    return jsonify(build_response(result_id, entry))
 
-    overlay = cv2.addWeighted(img_cv, 0.6, heatmap_color, 0.4, 0)
+@app.route("/results/<result_id>/marked_image", methods=["GET"])
+def marked_image(result_id):
+    entry = results.get(result_id)
+    if entry is None:
+        return jsonify({"error": "Unknown or expired result_id"}), 404
 
-    severity_percent = round(float(np.mean(heatmap) * 100), 2)
-    if severity_percent < 30:
-        severity_level = "Low"
-    elif severity_percent < 60:
-        severity_level = "Medium"
-    else:
-        severity_level = "High"
+    if not has_overlay(entry):
+        if entry["image"] is None:
+            # Stored without pixels because the overlay existed; it has since been removed
+            return jsonify({"error": "Overlay no longer available; upload the image again"}), 404
+        _, heatmaps = gradcam_batcher.predict(to_model_input(entry["image"]))
+        overlay = render_overlay(entry["image"], heatmaps[0], entry["key"])
+        entry = results.update(result_id, **overlay)
+        cache.put(cache_key(entry["key"]), {k: v for k, v in entry.items() if k not in ("key", "image")})
 
-    _, buffer = cv2.imencode(".jpg", overlay)
-    encoded_image = base64.b64encode(buffer).decode("utf-8")
+    return redirect(f"/artifacts/{entry['overlay_name']}")
+
+@app.route("/artifacts/<path:name>", methods=["GET"])
+def artifact(name):
+    # conditional=True gives ETag/If-None-Match and Range (206) support
+    response = send_from_directory(
+        artifacts.directory, name, conditional=True, max_age=ARTIFACT_MAX_AGE
+    )
+    response.headers["Cache-Control"] = f"public, max-age={ARTIFACT_MAX_AGE}, immutable"
+    return response
 
+@app.route("/ready", methods=["GET"])
+def ready():
+    # Probes kick off a lazy load so the service can become ready without traffic
+    managers = [model_manager]
+    if MODEL_RUNTIME == "keras":
+        managers.append(gradcam_manager)
+    for manager in managers:
+        manager.ensure_loading()
+    status = dict(model_manager.status(), runtime=MODEL_RUNTIME,
+                  ready=all(manager.ready for manager in managers))
+    return jsonify(status), (200 if status["ready"] else 503)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_snapshot():
     return jsonify({
-        "disease": disease,
-        "confidence": round(confidence, 2),
-        "severity_level": severity_level,
-        "severity_percent": severity_percent,
-        "treatment": RECOMMENDATIONS[disease]["treatment"],
-        "prevention": RECOMMENDATIONS[disease]["prevention"],
-        "marked_image": encoded_image
+        "classify_batcher": classify_batcher.stats(),
+        "gradcam_batcher": gradcam_batcher.stats(),
+        "result_cache": cache.stats(),
+        "model": dict(model_manager.status(), runtime=MODEL_RUNTIME),
+        "gradcam_model": gradcam_manager.status(),
+        "metrics": metrics.snapshot(),
     })
 
 if __name__ == "__main__":
-    app.run(debug=True)
+    app.run(debug=True, threaded=True)
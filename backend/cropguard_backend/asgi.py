@@ -1,5 +1,10 @@
 """
 ASGI config for cropguard_backend project.
+
+Requests for the alert stream (server-sent events) are answered by
+``api.streaming.alert_stream``; everything else goes to Django. The stream
+authenticates with a short-lived ``?ticket=`` and strips it from
+``scope['query_string']`` before responding, so it stays out of access logs.
 """
 
 import os
@@ -7,4 +12,14 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'cropguard_backend.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after the app registry is ready
+from api.streaming import STREAM_PATH, alert_stream  # noqa: E402
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] == STREAM_PATH:
+        await alert_stream(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -163,6 +163,148 @@ CORS_ALLOW_HEADERS = [
 OPENWEATHERMAP_API_KEY = os.environ.get('OPENWEATHERMAP_API_KEY', 'your-api-key')
 WEATHERAPI_API_KEY = os.environ.get('WEATHERAPI_API_KEY', 'your-api-key')
 
+# ============================================
+# WEATHER INGESTION CONFIGURATION
+# ============================================
+OPENWEATHERMAP_URL = os.environ.get('OPENWEATHERMAP_URL', 'https://api.openweathermap.org/data/2.5')
+WEATHERAPI_URL = os.environ.get('WEATHERAPI_URL', 'https://api.weatherapi.com/v1')
+
+# Provider used for lookups ('openweather' or 'weatherapi'). With a secondary
+# provider set, a lookup the primary has not answered within its p95 latency
+# (WEATHER_HEDGE_DELAY seconds until that is known) is also sent to the
+# secondary, and the first answer wins.
+WEATHER_PROVIDER = os.environ.get('WEATHER_PROVIDER', 'openweather')
+WEATHER_SECONDARY_PROVIDER = os.environ.get('WEATHER_SECONDARY_PROVIDER', '')
+WEATHER_HEDGE_DELAY = float(os.environ.get('WEATHER_HEDGE_DELAY', 1.0))
+
+# Upstream lookups: concurrent connections, requests/second (0 = unlimited),
+# retries with exponential backoff, and per-request timeout (seconds)
+WEATHER_CONCURRENCY = int(os.environ.get('WEATHER_CONCURRENCY', 8))
+WEATHER_RATE_LIMIT = float(os.environ.get('WEATHER_RATE_LIMIT', 10))
+WEATHER_MAX_RETRIES = int(os.environ.get('WEATHER_MAX_RETRIES', 3))
+WEATHER_BACKOFF = float(os.environ.get('WEATHER_BACKOFF', 0.5))
+WEATHER_TIMEOUT = float(os.environ.get('WEATHER_TIMEOUT', 10))
+
+# Every upstream call, retries included, must finish within this many
+# seconds. WEATHER_BREAKER_THRESHOLD consecutive failed calls open the
+# circuit for WEATHER_BREAKER_RESET seconds (0 disables the breaker).
+WEATHER_CALL_BUDGET = float(os.environ.get('WEATHER_CALL_BUDGET', 4))
+WEATHER_BREAKER_THRESHOLD = int(os.environ.get('WEATHER_BREAKER_THRESHOLD', 5))
+WEATHER_BREAKER_RESET = float(os.environ.get('WEATHER_BREAKER_RESET', 30))
+
+# Lookups are snapped to a grid of this many degrees (0.05 deg ~ 5.5 km); one
+# upstream call serves every farm in a cell. 0 looks up each farm exactly.
+WEATHER_GRID_SIZE = float(os.environ.get('WEATHER_GRID_SIZE', 0.05))
+
+# Weather readings younger than WEATHER_CACHE_TTL seconds are served as is;
+# for WEATHER_CACHE_STALE seconds after that they are served while a
+# background refresh runs
+WEATHER_CACHE_TTL = int(os.environ.get('WEATHER_CACHE_TTL', 600))
+WEATHER_CACHE_STALE = int(os.environ.get('WEATHER_CACHE_STALE', 3000))
+
+# Retention: raw readings are rolled up into hourly and daily aggregates after
+# WEATHER_RAW_RETENTION_DAYS (`manage.py compact_weather`); hourly rollups are
+# dropped after WEATHER_HOURLY_RETENTION_DAYS, daily rollups are kept
+WEATHER_RAW_RETENTION_DAYS = int(os.environ.get('WEATHER_RAW_RETENTION_DAYS', 30))
+WEATHER_HOURLY_RETENTION_DAYS = int(os.environ.get('WEATHER_HOURLY_RETENTION_DAYS', 365))
+
+# History queries use raw readings for ranges up to this many days, hourly
+# buckets up to the next limit and daily buckets beyond it
+WEATHER_RAW_MAX_SPAN_DAYS = int(os.environ.get('WEATHER_RAW_MAX_SPAN_DAYS', 3))
+WEATHER_HOURLY_MAX_SPAN_DAYS = int(os.environ.get('WEATHER_HOURLY_MAX_SPAN_DAYS', 31))
+
+# Upper bound on points returned by one weather range query
+WEATHER_RANGE_MAX_POINTS = int(os.environ.get('WEATHER_RANGE_MAX_POINTS', 20000))
+
+# Weather alerts are fanned out to every farm in the affected cell or region;
+# a farm alerted at the same or higher severity within the window (seconds)
+# is skipped. Alerts are written in chunks of WEATHER_ALERT_CHUNK rows.
+WEATHER_ALERT_DEDUP_WINDOW = int(os.environ.get('WEATHER_ALERT_DEDUP_WINDOW', 6 * 3600))
+WEATHER_ALERT_CHUNK = int(os.environ.get('WEATHER_ALERT_CHUNK', 500))
+
+# Maximum readings accepted by one device-sensor ingest request
+WEATHER_DEVICE_MAX_READINGS = int(os.environ.get('WEATHER_DEVICE_MAX_READINGS', 500))
+
+# `manage.py refresh_weather --loop` refreshes every active farm this often
+WEATHER_REFRESH_INTERVAL = int(os.environ.get('WEATHER_REFRESH_INTERVAL', 3600))
+
+# ============================================
+# INFERENCE CONFIGURATION
+# ============================================
+# Content-hash result cache for disease detection (empty dir = memory only)
+INFERENCE_CACHE_MAX_BYTES = int(os.environ.get('INFERENCE_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+INFERENCE_CACHE_DIR = os.environ.get('INFERENCE_CACHE_DIR', '')
+
+# Uploads are rejected above these limits before any pixels are decoded
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+MAX_IMAGE_PIXELS = int(os.environ.get('MAX_IMAGE_PIXELS', 50 * 1000 * 1000))
+
+# Maximum images accepted by the bulk detection endpoint
+BULK_DETECTION_MAX_IMAGES = int(os.environ.get('BULK_DETECTION_MAX_IMAGES', 50))
+
+# Asynchronous detection jobs ('local' runs them in an in-process thread pool;
+# 'external' leaves them to `manage.py run_detection_worker` processes)
+DETECTION_WORKER_MODE = os.environ.get('DETECTION_WORKER_MODE', 'local')
+DETECTION_WORKERS = int(os.environ.get('DETECTION_WORKERS', 2))
+DETECTION_POLL_INTERVAL = float(os.environ.get('DETECTION_POLL_INTERVAL', 0.5))
+DETECTION_JOB_TIMEOUT = int(os.environ.get('DETECTION_JOB_TIMEOUT', 300))
+DETECTION_MAX_WAIT = int(os.environ.get('DETECTION_MAX_WAIT', 30))
+# 'local' mode: how often pending and stale jobs (e.g. left by a restart)
+# are handed to the pool again (0 = never)
+DETECTION_RECOVERY_INTERVAL = float(os.environ.get('DETECTION_RECOVERY_INTERVAL', 30))
+
+# Overlays are rendered on a working copy no larger than this (pixels)
+OVERLAY_MAX_SIDE = int(os.environ.get('OVERLAY_MAX_SIDE', 1024))
+
+# Content-named overlay artifacts never change, so clients may cache them
+ARTIFACT_MAX_AGE = int(os.environ.get('ARTIFACT_MAX_AGE', 365 * 24 * 3600))
+
+# ============================================
+# BACKGROUND TASKS
+# ============================================
+# Shared thread pool for work that should not hold up a request;
+# BACKGROUND_TASKS_SYNC runs tasks inline (tests, debugging)
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 4))
+BACKGROUND_TASKS_SYNC = os.environ.get('BACKGROUND_TASKS_SYNC', 'False') == 'True'
+
+# ============================================
+# ALERT COALESCING
+# ============================================
+# A disease or pest alert repeating an unread one for the same farm and
+# subject within ALERT_COALESCE_WINDOW seconds bumps that alert's occurrence
+# count instead of creating another (0 = always create). Weather alerts use
+# WEATHER_ALERT_DEDUP_WINDOW.
+ALERT_COALESCE_WINDOW = int(os.environ.get('ALERT_COALESCE_WINDOW', 3600))
+
+# ============================================
+# ALERT STREAM (server-sent events, served by asgi.py)
+# ============================================
+# Keep-alive comment interval and client reconnect delay; alerts written by
+# other processes are picked up every ALERT_STREAM_POLL_INTERVAL seconds
+# (0 = only alerts created in the serving process)
+ALERT_STREAM_HEARTBEAT = float(os.environ.get('ALERT_STREAM_HEARTBEAT', 15))
+ALERT_STREAM_RETRY_MS = int(os.environ.get('ALERT_STREAM_RETRY_MS', 3000))
+ALERT_STREAM_POLL_INTERVAL = float(os.environ.get('ALERT_STREAM_POLL_INTERVAL', 2))
+# Undelivered events buffered per connection (a slow client is disconnected
+# and resumes from its last id) and alerts replayed on resume
+ALERT_STREAM_QUEUE_SIZE = int(os.environ.get('ALERT_STREAM_QUEUE_SIZE', 100))
+ALERT_STREAM_BACKLOG = int(os.environ.get('ALERT_STREAM_BACKLOG', 500))
+# Lifetime of the stream tickets EventSource passes instead of the JWT
+ALERT_STREAM_TICKET_TTL = int(os.environ.get('ALERT_STREAM_TICKET_TTL', 60))
+
+# ============================================
+# ALERT RETENTION (`manage.py sweep_alerts`)
+# ============================================
+# Alerts past their expires_at, and read alerts older than
+# ALERT_READ_RETENTION_DAYS, are moved out of the live table in batches of
+# ALERT_SWEEP_BATCH rows. ALERT_ARCHIVE_MODE: 'table' (ArchivedAlert rows),
+# 'jsonl' (gzipped JSON lines under ALERT_ARCHIVE_DIR) or 'delete'
+ALERT_READ_RETENTION_DAYS = int(os.environ.get('ALERT_READ_RETENTION_DAYS', 90))
+ALERT_ARCHIVE_MODE = os.environ.get('ALERT_ARCHIVE_MODE', 'table')
+ALERT_ARCHIVE_DIR = os.environ.get('ALERT_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'alerts'))
+ALERT_SWEEP_BATCH = int(os.environ.get('ALERT_SWEEP_BATCH', 500))
+ALERT_SWEEP_INTERVAL = int(os.environ.get('ALERT_SWEEP_INTERVAL', 3600))
+
 # ============================================
 # EMAIL CONFIGURATION (For notifications)
 # ============================================
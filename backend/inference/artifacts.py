@@ -0,0 +1,37 @@
+# Stored Image Artifacts for CropGuard AI
+# File: inference/artifacts.py
+#
+# Overlays are written once to disk under a content-derived name and served
+# as plain files, instead of being base64-encoded into every JSON response.
+
+import os
+import tempfile
+
+
+class ArtifactStore:
+    """Write-once directory of immutable, content-named files"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, name):
+        return os.path.join(self.directory, os.path.basename(name))
+
+    def exists(self, name):
+        return os.path.exists(self.path(name))
+
+    def save(self, name, data):
+        """Store ``data`` as ``name`` unless it already exists; returns ``name``"""
+        path = self.path(name)
+        if os.path.exists(path):
+            return name
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+        return name
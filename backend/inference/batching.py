@@ -0,0 +1,184 @@
+# Dynamic Micro-batching for Model Inference
+# File: inference/batching.py
+#
+# Concurrent requests are gathered into a single tensor so the model runs at
+# a useful batch size instead of batch size 1. A batch is flushed as soon as
+# it reaches ``max_batch_size`` rows or the oldest request has waited
+# ``max_wait_ms`` milliseconds. Requests still queued when the batcher is
+# stopped fail with ``BatcherStopped`` instead of waiting forever.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+import metrics
+
+
+class BatcherStopped(RuntimeError):
+    pass
+
+
+class _Request:
+    __slots__ = ('inputs', 'future', 'enqueued_at')
+
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.future = Future()
+        self.enqueued_at = time.monotonic()
+
+    @property
+    def rows(self):
+        return self.inputs.shape[0]
+
+
+class MicroBatcher:
+    """Gathers concurrent predict calls into one batched model call"""
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=10, name='predict'):
+        if max_batch_size < 1:
+            raise ValueError('max_batch_size must be at least 1')
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._pending = None  # request that did not fit in the previous batch
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = False
+
+        self.queue_depth = metrics.histogram(f'{name}_queue_depth', metrics.SIZE_BUCKETS)
+        self.batch_size = metrics.histogram(f'{name}_batch_size', metrics.SIZE_BUCKETS)
+        self.wait_time = metrics.histogram(f'{name}_queue_wait_seconds')
+        self.batch_latency = metrics.histogram(f'{name}_batch_latency_seconds')
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped = False
+                self._thread = threading.Thread(
+                    target=self._run, name=f'{self.name}-batcher', daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._lock:
+            self._stopped = True
+            self._queue.put(None)
+        if self._thread is None:
+            self._fail_outstanding()
+        else:
+            self._thread.join(timeout)
+
+    def submit(self, inputs):
+        """Queue ``inputs`` (shape ``(n, ...)``) and return a Future of its outputs"""
+        inputs = np.asarray(inputs)
+        if inputs.ndim == 0 or inputs.shape[0] == 0:
+            raise ValueError('inputs must have a non-empty leading batch dimension')
+        if self._thread is None:
+            self.start()
+        request = _Request(inputs)
+        with self._lock:
+            if self._stopped:
+                raise BatcherStopped(f'{self.name} batcher is stopped')
+            self._queue.put(request)
+        return request.future
+
+    def predict(self, inputs, timeout=None):
+        """Blocking helper: submit ``inputs`` and wait for its slice of the batch"""
+        return self.submit(inputs).result(timeout)
+
+    def stats(self):
+        return {
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0,
+            'queued': self._queue.qsize(),
+            'queue_depth': self.queue_depth.snapshot(),
+            'batch_size': self.batch_size.snapshot(),
+        }
+
+    # ----------------------------------------
+    # Worker loop
+    # ----------------------------------------
+    def _run(self):
+        while not self._stopped:
+            batch = self._collect()
+            if batch:
+                self._execute(batch)
+        self._fail_outstanding()
+
+    def _fail_outstanding(self):
+        """Fail the carried-over request and everything still queued"""
+        with self._lock:
+            outstanding = [self._pending] if self._pending else []
+            self._pending = None
+            while True:
+                try:
+                    outstanding.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+        for request in outstanding:
+            if request is not None:
+                request.future.set_exception(BatcherStopped(f'{self.name} batcher stopped'))
+
+    def _collect(self):
+        first = self._pending or self._queue.get()
+        self._pending = None
+        if first is None:
+            return []
+
+        self.queue_depth.observe(self._queue.qsize() + 1)
+        batch = [first]
+        rows = first.rows
+        deadline = first.enqueued_at + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                request = self._queue.get(timeout=max(remaining, 0)) if remaining > 0 \
+                    else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._stopped = True
+                break
+            if rows + request.rows > self.max_batch_size:
+                self._pending = request
+                break
+            batch.append(request)
+            rows += request.rows
+        return batch
+
+    def _execute(self, batch):
+        started = time.monotonic()
+        for request in batch:
+            self.wait_time.observe(started - request.enqueued_at)
+        self.batch_size.observe(sum(request.rows for request in batch))
+
+        try:
+            stacked = np.concatenate([request.inputs for request in batch], axis=0)
+            outputs = self.predict_fn(stacked)
+        except Exception as exc:
+            for request in batch:
+                request.future.set_exception(exc)
+            return
+        finally:
+            self.batch_latency.observe(time.monotonic() - started)
+
+        offset = 0
+        for request in batch:
+            end = offset + request.rows
+            if isinstance(outputs, tuple):
+                result = tuple(np.asarray(output)[offset:end] for output in outputs)
+            else:
+                result = np.asarray(outputs)[offset:end]
+            request.future.set_result(result)
+            offset = end
@@ -0,0 +1,156 @@
+# Content-hash Result Cache for Disease Inference
+# File: inference/cache.py
+#
+# Results are keyed by the SHA-256 of the uploaded bytes, so a re-upload of
+# the same photo skips decode, resize, inference and JPEG encoding. The
+# memory tier is an LRU bounded by total byte size; the optional disk tier
+# keeps entries across restarts.
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+def content_key(data):
+    """SHA-256 hex digest of ``data`` (bytes or an iterable of byte chunks)"""
+    digest = hashlib.sha256()
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        digest.update(data)
+    else:
+        for chunk in data:
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """Two-tier (memory LRU + optional disk) cache of inference results
+
+    An entry is a dict of JSON-serialisable result fields (class,
+    confidence, severity...) plus an optional ``overlay`` holding the
+    encoded overlay image bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, disk_dir=None, name='inference_cache'):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = metrics.counter(f'{name}_hits')
+        self.misses = metrics.counter(f'{name}_misses')
+        self.disk_hits = metrics.counter(f'{name}_disk_hits')
+        self.evictions = metrics.counter(f'{name}_evictions')
+        self.size_bytes = metrics.gauge(f'{name}_bytes')
+
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    # ----------------------------------------
+    # Public API
+    # ----------------------------------------
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.disk_dir:
+            entry = self._read_disk(key)
+            if entry is not None:
+                self.disk_hits.inc()
+                self._store(key, entry)
+        if entry is None:
+            self.misses.inc()
+            return None
+        self.hits.inc()
+        return dict(entry)
+
+    def put(self, key, entry):
+        entry = dict(entry)
+        self._store(key, entry)
+        if self.disk_dir:
+            self._write_disk(key, entry)
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'bytes': self._total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits.value,
+            'misses': self.misses.value,
+            'disk_hits': self.disk_hits.value,
+            'evictions': self.evictions.value,
+        }
+
+    # ----------------------------------------
+    # Memory tier
+    # ----------------------------------------
+    @staticmethod
+    def _entry_size(entry):
+        fields = {k: v for k, v in entry.items() if k != 'overlay'}
+        return len(entry.get('overlay') or b'') + len(json.dumps(fields, default=str))
+
+    def _store(self, key, entry):
+        size = self._entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._sizes[key]
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self._total_bytes -= self._sizes.pop(old_key)
+                self.evictions.inc()
+            self.size_bytes.set(self._total_bytes)
+
+    # ----------------------------------------
+    # Disk tier
+    # ----------------------------------------
+    def _paths(self, key):
+        directory = os.path.join(self.disk_dir, key[:2])
+        return directory, os.path.join(directory, f'{key}.json'), os.path.join(directory, f'{key}.jpg')
+
+    def _read_disk(self, key):
+        _, meta_path, overlay_path = self._paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as fh:
+                entry = json.load(fh)
+            if entry.pop('has_overlay', False):
+                with open(overlay_path, 'rb') as fh:
+                    entry['overlay'] = fh.read()
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def _write_disk(self, key, entry):
+        directory, meta_path, overlay_path = self._paths(key)
+        fields = {k: v for k, v in entry.items() if k != 'overlay'}
+        fields['has_overlay'] = bool(entry.get('overlay'))
+        try:
+            os.makedirs(directory, exist_ok=True)
+            if fields['has_overlay']:
+                self._atomic_write(directory, overlay_path, entry['overlay'])
+            self._atomic_write(directory, meta_path, json.dumps(fields, default=str).encode('utf-8'))
+        except OSError:
+            pass  # The disk tier is best effort; the memory tier still holds the entry
+
+    @staticmethod
+    def _atomic_write(directory, path, payload):
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,234 @@
+# CPU Model Export, Parity Check and Benchmark for CropGuard AI
+# File: inference/export.py
+#
+# Usage (from backend/):
+#   python -m inference.export convert  --model cropguard_model.h5 \
+#       --output cropguard_model.tflite --quantize float16|int8|none [--images DIR]
+#   python -m inference.export parity   --model cropguard_model.h5 \
+#       --candidate cropguard_model.tflite --images DIR [--min-agreement 0.99]
+#   python -m inference.export benchmark --model cropguard_model.h5 \
+#       --candidate cropguard_model.tflite [--batch-sizes 1,16] [--iterations 50]
+#
+# int8 quantization calibrates on the images in ``--images``; the same fixed
+# image set is what ``parity`` compares the two runtimes on. ``benchmark``
+# runs every runtime in its own process so RSS figures are not polluted by
+# the other runtime's memory.
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from .runtime import load_runtime
+
+IMAGE_SIZE = (224, 224)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+QUANTIZATIONS = ('none', 'float16', 'int8')
+
+
+# ============================================
+# FIXED IMAGE SET
+# ============================================
+def load_image_set(directory, size=IMAGE_SIZE):
+    """Load every image in ``directory`` (sorted by name) as one model batch"""
+    names = sorted(
+        name for name in os.listdir(directory) if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    if not names:
+        raise ValueError(f'No images found in {directory}')
+    arrays = [
+        np.asarray(Image.open(os.path.join(directory, name)).convert('RGB').resize(size),
+                   dtype=np.float32) / 255.0
+        for name in names
+    ]
+    return names, np.stack(arrays)
+
+
+def predict_in_batches(predict_fn, images, batch_size=16):
+    return np.concatenate([
+        np.asarray(predict_fn(images[start:start + batch_size]))
+        for start in range(0, len(images), batch_size)
+    ])
+
+
+# ============================================
+# CONVERT
+# ============================================
+def convert(model_path, output_path, quantize='float16', images=None):
+    """Convert a Keras model to a TFLite flatbuffer; returns the output size"""
+    import tensorflow as tf
+
+    if quantize not in QUANTIZATIONS:
+        raise ValueError(f'quantize must be one of {QUANTIZATIONS}')
+    converter = tf.lite.TFLiteConverter.from_keras_model(tf.keras.models.load_model(model_path))
+
+    if quantize == 'float16':
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == 'int8':
+        if images is None:
+            raise ValueError('int8 quantization needs calibration images')
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = lambda: ([image[np.newaxis]] for image in images)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+        converter.inference_output_type = tf.uint8
+
+    flatbuffer = converter.convert()
+    with open(output_path, 'wb') as fh:
+        fh.write(flatbuffer)
+    return len(flatbuffer)
+
+
+# ============================================
+# PARITY
+# ============================================
+def compare_predictions(reference, candidate):
+    """Top-1 agreement and probability drift between two runtimes' outputs"""
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    if reference.shape != candidate.shape:
+        raise ValueError(f'Output shapes differ: {reference.shape} vs {candidate.shape}')
+    drift = np.abs(reference - candidate)
+    agree = reference.argmax(axis=1) == candidate.argmax(axis=1)
+    return {
+        'samples': int(len(reference)),
+        'top1_agreement': round(float(agree.mean()), 4),
+        'disagreements': np.flatnonzero(~agree).tolist(),
+        'max_abs_diff': round(float(drift.max()), 6),
+        'mean_abs_diff': round(float(drift.mean()), 6),
+    }
+
+
+def parity(reference_runtime, candidate_runtime, images, names=None):
+    report = compare_predictions(
+        predict_in_batches(reference_runtime.predict, images),
+        predict_in_batches(candidate_runtime.predict, images),
+    )
+    if names is not None:
+        report['disagreements'] = [names[index] for index in report['disagreements']]
+    return report
+
+
+# ============================================
+# BENCHMARK
+# ============================================
+def current_rss_bytes():
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def benchmark(predict_fn, batch, iterations=50, warmup=3):
+    """Time ``predict_fn(batch)``; latency percentiles in ms, throughput in rows/s"""
+    for _ in range(warmup):
+        predict_fn(batch)
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        predict_fn(batch)
+        timings.append(time.perf_counter() - started)
+    timings = np.asarray(timings)
+    return {
+        'batch_size': int(batch.shape[0]),
+        'iterations': iterations,
+        'latency_ms_p50': round(float(np.percentile(timings, 50)) * 1000, 3),
+        'latency_ms_p95': round(float(np.percentile(timings, 95)) * 1000, 3),
+        'throughput_per_s': round(batch.shape[0] * iterations / float(timings.sum()), 2),
+    }
+
+
+def _benchmark_runtime(kind, path, batch_sizes, iterations):
+    rss_before = current_rss_bytes()
+    started = time.perf_counter()
+    runtime = load_runtime(kind, path)
+    load_seconds = time.perf_counter() - started
+    results = [
+        benchmark(runtime.predict, np.random.rand(size, *IMAGE_SIZE, 3).astype(np.float32),
+                  iterations)
+        for size in batch_sizes
+    ]
+    return {
+        'runtime': kind,
+        'path': path,
+        'load_seconds': round(load_seconds, 3),
+        'rss_mb': round(current_rss_bytes() / 2 ** 20, 1),
+        'model_rss_mb': round((current_rss_bytes() - rss_before) / 2 ** 20, 1),
+        'results': results,
+    }
+
+
+def benchmark_runtimes(targets, batch_sizes=(1, 16), iterations=50):
+    """Benchmark each ``(kind, path)`` in a fresh process, one after another"""
+    context = multiprocessing.get_context('spawn')
+    reports = []
+    for kind, path in targets:
+        with context.Pool(1) as pool:
+            reports.append(pool.apply(_benchmark_runtime, (kind, path, batch_sizes, iterations)))
+    return reports
+
+
+# ============================================
+# COMMAND LINE
+# ============================================
+def _runtime_for(path):
+    return 'tflite' if path.endswith('.tflite') else 'keras'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m inference.export')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    convert_cmd = commands.add_parser('convert', help='Export a CPU-optimised TFLite model')
+    convert_cmd.add_argument('--model', default='cropguard_model.h5')
+    convert_cmd.add_argument('--output', default='cropguard_model.tflite')
+    convert_cmd.add_argument('--quantize', choices=QUANTIZATIONS, default='float16')
+    convert_cmd.add_argument('--images', help='Calibration images (required for int8)')
+
+    parity_cmd = commands.add_parser('parity', help='Compare runtimes on a fixed image set')
+    parity_cmd.add_argument('--model', default='cropguard_model.h5')
+    parity_cmd.add_argument('--candidate', default='cropguard_model.tflite')
+    parity_cmd.add_argument('--images', required=True)
+    parity_cmd.add_argument('--min-agreement', type=float, default=0.99)
+
+    bench_cmd = commands.add_parser('benchmark', help='Latency, throughput and RSS per runtime')
+    bench_cmd.add_argument('--model', default='cropguard_model.h5')
+    bench_cmd.add_argument('--candidate', default='cropguard_model.tflite')
+    bench_cmd.add_argument('--batch-sizes', default='1,16')
+    bench_cmd.add_argument('--iterations', type=int, default=50)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        images = load_image_set(args.images)[1] if args.images else None
+        size = convert(args.model, args.output, args.quantize, images)
+        print(json.dumps({'output': args.output, 'quantize': args.quantize, 'bytes': size}))
+        return 0
+
+    if args.command == 'parity':
+        names, images = load_image_set(args.images)
+        report = parity(load_runtime(_runtime_for(args.model), args.model),
+                        load_runtime(_runtime_for(args.candidate), args.candidate),
+                        images, names)
+        report['passed'] = report['top1_agreement'] >= args.min_agreement
+        print(json.dumps(report, indent=2))
+        return 0 if report['passed'] else 1
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(',')]
+    targets = [(_runtime_for(path), path) for path in (args.model, args.candidate)]
+    print(json.dumps(benchmark_runtimes(targets, batch_sizes, args.iterations), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
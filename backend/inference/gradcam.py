@@ -0,0 +1,40 @@
+# Batched Grad-CAM for CropGuard AI
+# File: inference/gradcam.py
+#
+# The gradient model is built once around the loaded Keras model. A single
+# forward pass yields both the class predictions and the activations that
+# the heatmaps are computed from, so no separate ``model.predict`` is needed
+# when a heatmap is requested.
+
+import tensorflow as tf
+
+
+class GradCAM:
+    """Computes predictions and Grad-CAM heatmaps for a whole batch"""
+
+    def __init__(self, model, last_conv_layer_name="Conv_1"):
+        self.grad_model = tf.keras.models.Model(
+            [model.inputs],
+            [model.get_layer(last_conv_layer_name).output, model.output]
+        )
+        self._step = tf.function(self._compute, reduce_retracing=True)
+
+    def _compute(self, batch):
+        with tf.GradientTape() as tape:
+            conv_outputs, predictions = self.grad_model(batch, training=False)
+            top_class = tf.argmax(predictions, axis=1)
+            class_channel = tf.gather(predictions, top_class, axis=1, batch_dims=1)
+
+        # Samples are independent, so the gradient of the summed top-class
+        # scores gives every sample its own gradient in one backward pass.
+        grads = tape.gradient(class_channel, conv_outputs)
+        pooled_grads = tf.reduce_mean(grads, axis=(1, 2))
+
+        heatmaps = tf.einsum("bhwc,bc->bhw", conv_outputs, pooled_grads)
+        heatmaps = tf.maximum(heatmaps, 0)
+        peak = tf.reduce_max(heatmaps, axis=(1, 2), keepdims=True)
+        return predictions, tf.math.divide_no_nan(heatmaps, peak)
+
+    def __call__(self, batch):
+        predictions, heatmaps = self._step(tf.convert_to_tensor(batch, dtype=tf.float32))
+        return predictions.numpy(), heatmaps.numpy()
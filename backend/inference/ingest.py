@@ -0,0 +1,125 @@
+# Bounded-memory Image Ingest for CropGuard AI
+# File: inference/ingest.py
+#
+# Uploads are hashed while streaming their chunks (Django ``UploadedFile``
+# or Werkzeug ``FileStorage``), checked against size and pixel limits before
+# any pixel data is decoded, and decoded with JPEG draft mode (DCT scaling)
+# straight to near-target resolution. Peak memory therefore tracks the
+# target size rather than the camera resolution.
+
+import hashlib
+
+import numpy as np
+from PIL import Image
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+DEFAULT_MAX_PIXELS = 50 * 1000 * 1000
+
+
+class ImageRejected(ValueError):
+    """Raised when an upload is refused before (or instead of) full decoding"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def iter_chunks(upload, chunk_size=CHUNK_SIZE):
+    """Yield the upload's bytes in chunks without reading it all into memory"""
+    if hasattr(upload, 'chunks'):
+        yield from upload.chunks(chunk_size)
+        return
+    stream = getattr(upload, 'stream', upload)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _rewind(upload):
+    stream = getattr(upload, 'file', None) or getattr(upload, 'stream', None) or upload
+    stream.seek(0)
+    return stream
+
+
+class IngestedImage:
+    """A hashed upload whose pixels are decoded lazily at reduced size"""
+
+    def __init__(self, upload, key, size_bytes, max_side, max_pixels):
+        self.upload = upload
+        self.key = key
+        self.size_bytes = size_bytes
+        self.max_side = max_side
+        self.max_pixels = max_pixels
+        self.source_size = None
+        self._image = None
+
+    @property
+    def image(self):
+        """RGB ``PIL.Image`` whose longest side is at most ``max_side``"""
+        if self._image is None:
+            self._image = self._decode()
+        return self._image
+
+    def bgr(self):
+        """The decoded image as a BGR ``numpy`` array (for OpenCV)"""
+        return np.ascontiguousarray(np.asarray(self.image)[:, :, ::-1])
+
+    @property
+    def scale(self):
+        """Decoded width divided by source width"""
+        return self.image.size[0] / float(self.source_size[0])
+
+    def resized(self, size):
+        """Decode straight to exactly ``size`` (width, height), as model input"""
+        img = self._open()
+        try:
+            img.draft('RGB', size)  # JPEG DCT scaling to no smaller than ``size``
+            return img.convert('RGB').resize(size)
+        except Exception as e:
+            raise ImageRejected(f'Could not decode image: {e}') from e
+
+    def _decode(self):
+        img = self._open()
+        try:
+            img.draft('RGB', (self.max_side, self.max_side))  # JPEG DCT scaling
+            img = img.convert('RGB')
+            img.thumbnail((self.max_side, self.max_side))
+            return img
+        except Exception as e:
+            raise ImageRejected(f'Could not decode image: {e}') from e
+
+    def _open(self):
+        try:
+            img = Image.open(_rewind(self.upload))  # reads the header only
+        except Exception as e:
+            raise ImageRejected(f'Could not decode image: {e}') from e
+        width, height = img.size
+        if width * height > self.max_pixels:
+            raise ImageRejected(
+                f'Image is {width}x{height}; the limit is {self.max_pixels} pixels', 413
+            )
+        self.source_size = (width, height)
+        return img
+
+
+def ingest_image(upload, max_side=1024, max_bytes=DEFAULT_MAX_BYTES,
+                 max_pixels=DEFAULT_MAX_PIXELS):
+    """Stream ``upload`` once to hash it, enforcing ``max_bytes`` as it goes"""
+    declared = getattr(upload, 'size', None) or getattr(upload, 'content_length', None)
+    if declared and declared > max_bytes:
+        raise ImageRejected(f'Upload is {declared} bytes; the limit is {max_bytes}', 413)
+
+    digest = hashlib.sha256()
+    total = 0
+    for chunk in iter_chunks(upload):
+        total += len(chunk)
+        if total > max_bytes:
+            raise ImageRejected(f'Upload exceeds the {max_bytes} byte limit', 413)
+        digest.update(chunk)
+    if not total:
+        raise ImageRejected('Empty upload')
+
+    return IngestedImage(upload, digest.hexdigest(), total, max_side, max_pixels)
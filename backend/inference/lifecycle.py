@@ -0,0 +1,119 @@
+# Model Lifecycle Management for CropGuard AI
+# File: inference/lifecycle.py
+#
+# Explicit control over when the model is loaded and warmed up. Warm-up runs
+# dummy batches at every configured batch size so TF graph tracing and kernel
+# selection happen before real traffic instead of on the first requests.
+# ``ready`` only turns true once warm-up has finished.
+
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+LOAD_MODES = ('eager', 'lazy')
+
+_process_started = time.monotonic()
+
+
+class ModelManager:
+    """Loads a model on demand or eagerly, warms it up and tracks readiness
+
+    ``loader()`` returns the loaded model (or any bundle of loaded objects);
+    ``warmup_fns`` are called with ``(model, batch)`` for each dummy batch.
+    """
+
+    def __init__(self, loader, warmup_fns=(), batch_sizes=(1,), input_shape=(224, 224, 3),
+                 load_mode='eager', name='model'):
+        if load_mode not in LOAD_MODES:
+            raise ValueError(f'load_mode must be one of {LOAD_MODES}')
+        self.loader = loader
+        self.warmup_fns = tuple(warmup_fns)
+        self.batch_sizes = tuple(sorted(set(batch_sizes)))
+        self.input_shape = tuple(input_shape)
+        self.load_mode = load_mode
+
+        self._model = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.error = None
+
+        self.cold_start = metrics.gauge(f'{name}_cold_start_seconds')
+        self.warmup_duration = metrics.gauge(f'{name}_warmup_seconds')
+        self.time_to_ready = metrics.gauge(f'{name}_time_to_ready_seconds')
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def start(self):
+        """Begin loading and warm-up in the background when configured as eager"""
+        if self.load_mode == 'eager':
+            self.ensure_loading()
+        return self
+
+    def ensure_loading(self):
+        """Start background load + warm-up if nothing has started it yet"""
+        with self._lock:
+            if self._thread is None and not self.ready:
+                self._thread = threading.Thread(
+                    target=self._load_and_warm, name='model-loader', daemon=True
+                )
+                self._thread.start()
+
+    def get(self):
+        """Return the loaded model, loading (and warming) it on first use"""
+        if self._model is None or not self.ready:
+            self._load_and_warm()
+        return self._model
+
+    def wait_ready(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        return {
+            'load_mode': self.load_mode,
+            'loaded': self.loaded,
+            'ready': self.ready,
+            'batch_sizes': list(self.batch_sizes),
+            'cold_start_seconds': self.cold_start.value,
+            'warmup_seconds': self.warmup_duration.value,
+            'error': str(self.error) if self.error else None,
+        }
+
+    # ----------------------------------------
+    # Internals
+    # ----------------------------------------
+    def _load_and_warm(self):
+        with self._lock:
+            if self.ready:
+                return
+            try:
+                if self._model is None:
+                    started = time.monotonic()
+                    self._model = self.loader()
+                    self.cold_start.set(round(time.monotonic() - started, 4))
+                self._warm_up()
+                self.error = None
+            except Exception as e:
+                self.error = e
+                raise
+            finally:
+                self._thread = None
+
+    def _warm_up(self):
+        started = time.monotonic()
+        for batch_size in self.batch_sizes:
+            batch = np.zeros((batch_size,) + self.input_shape, dtype=np.float32)
+            for warmup_fn in self.warmup_fns:
+                warmup_fn(self._model, batch)
+        self.warmup_duration.set(round(time.monotonic() - started, 4))
+        self.time_to_ready.set(round(time.monotonic() - _process_started, 4))
+        self._ready.set()
@@ -0,0 +1,72 @@
+# Overlay Rendering for CropGuard AI
+# File: inference/overlay.py
+#
+# Renders disease highlights onto a downscaled working copy of the photo.
+# All spot masks are rasterised into a single mask and blended in one pass,
+# so cost no longer grows with (spots x full-frame pixels). The same module
+# renders real Grad-CAM heatmaps for app.py.
+
+import cv2
+import numpy as np
+
+# Overlays are previews; larger photos are downscaled before rendering
+DEFAULT_MAX_SIDE = 1024
+
+SPOT_FILL_COLOR = (0, 100, 255)    # BGR orange-red fill
+SPOT_OUTLINE_COLOR = (0, 0, 255)   # BGR red outline
+
+
+def working_copy(image, max_side=DEFAULT_MAX_SIDE):
+    """Return ``(image, scale)`` with the longest side at most ``max_side``"""
+    h, w = image.shape[:2]
+    scale = min(1.0, max_side / float(max(h, w))) if max_side else 1.0
+    if scale < 1.0:
+        size = (max(1, round(w * scale)), max(1, round(h * scale)))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA), scale
+    return image.copy(), 1.0
+
+
+def render_spots(image, spots, alpha=0.5, max_side=DEFAULT_MAX_SIDE,
+                 fill_color=SPOT_FILL_COLOR, outline_color=SPOT_OUTLINE_COLOR):
+    """Highlight circular ``spots`` (``(cx, cy, radius)`` in source pixels)
+
+    Returns the rendered BGR working copy.
+    """
+    work, scale = working_copy(image, max_side)
+    circles = [
+        (int(round(cx * scale)), int(round(cy * scale)), max(1, int(round(radius * scale))))
+        for cx, cy, radius in spots
+    ]
+    if not circles:
+        return work
+
+    mask = np.zeros(work.shape[:2], dtype=np.uint8)
+    for cx, cy, radius in circles:
+        cv2.circle(mask, (cx, cy), radius, 255, -1)
+
+    # Blend only the masked pixels, once, whatever the number of spots
+    region = mask.astype(bool)
+    fill = np.asarray(fill_color, dtype=np.float32)
+    work[region] = (work[region] * (1.0 - alpha) + fill * alpha).astype(np.uint8)
+
+    for cx, cy, radius in circles:
+        cv2.circle(work, (cx, cy), radius, outline_color, 2)
+    return work
+
+
+def render_heatmap(image, heatmap, alpha=0.4, max_side=DEFAULT_MAX_SIDE,
+                   colormap=cv2.COLORMAP_JET):
+    """Blend a ``[0, 1]`` heatmap (any resolution) over ``image`` in one pass"""
+    work, _ = working_copy(image, max_side)
+    h, w = work.shape[:2]
+    heat = cv2.resize(np.asarray(heatmap, dtype=np.float32), (w, h))
+    colored = cv2.applyColorMap(np.uint8(255 * np.clip(heat, 0, 1)), colormap)
+    return cv2.addWeighted(work, 1.0 - alpha, colored, alpha, 0)
+
+
+def encode_jpeg(image, quality=95):
+    """JPEG-encode a BGR image to bytes"""
+    ok, buffer = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError('Could not encode overlay image')
+    return buffer.tobytes()
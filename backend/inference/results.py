@@ -0,0 +1,40 @@
+# In-memory Result Store for CropGuard AI
+# File: inference/results.py
+
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class ResultStore:
+    """Bounded LRU store of recent prediction results, keyed by result id"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, entry):
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[result_id] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_id
+
+    def get(self, result_id):
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                self._entries.move_to_end(result_id)
+            return entry
+
+    def update(self, result_id, **fields):
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                entry.update(fields)
+            return entry
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,115 @@
+# Inference Runtimes for CropGuard AI
+# File: inference/runtime.py
+#
+# A runtime wraps one way of executing the classifier behind a common
+# ``predict(batch) -> probabilities`` call. ``keras`` runs the original
+# ``.h5`` model; ``tflite`` runs a reduced-precision export produced by
+# ``python -m inference.export convert``, which avoids the Keras call
+# overhead on CPU-only nodes. TensorFlow is imported only when a runtime
+# is actually loaded.
+
+import threading
+
+import numpy as np
+
+RUNTIMES = ('keras', 'tflite')
+
+
+class KerasRuntime:
+    """Runs the original Keras model"""
+
+    name = 'keras'
+
+    def __init__(self, model):
+        self.model = model
+
+    @classmethod
+    def load(cls, path):
+        from tensorflow.keras.models import load_model
+        return cls(load_model(path))
+
+    def predict(self, batch):
+        return self.model.predict(batch, verbose=0)
+
+
+class TFLiteRuntime:
+    """Runs a TFLite export (float32, float16 or int8-quantized)
+
+    The interpreter is resized to each batch size it sees; one interpreter is
+    kept per batch size so the micro-batcher's common sizes never reallocate.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, model_path, num_threads=None):
+        self.model_path = model_path
+        self.num_threads = num_threads
+        self._interpreters = {}
+        self._lock = threading.Lock()
+        self._interpreter(1)  # fail fast on a missing or corrupt model file
+
+    @classmethod
+    def load(cls, path, num_threads=None):
+        return cls(path, num_threads=num_threads)
+
+    def _interpreter(self, batch_size):
+        interpreter = self._interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = _interpreter_class()(
+                model_path=self.model_path, num_threads=self.num_threads
+            )
+            input_index = interpreter.get_input_details()[0]['index']
+            interpreter.resize_tensor_input(input_index, (batch_size, *self._input_shape(interpreter)))
+            interpreter.allocate_tensors()
+            self._interpreters[batch_size] = interpreter
+        return interpreter
+
+    @staticmethod
+    def _input_shape(interpreter):
+        return tuple(interpreter.get_input_details()[0]['shape'][1:])
+
+    def predict(self, batch):
+        batch = np.asarray(batch, dtype=np.float32)
+        with self._lock:
+            interpreter = self._interpreter(batch.shape[0])
+            input_details = interpreter.get_input_details()[0]
+            output_details = interpreter.get_output_details()[0]
+            interpreter.set_tensor(input_details['index'], quantize(batch, input_details))
+            interpreter.invoke()
+            return dequantize(interpreter.get_tensor(output_details['index']), output_details)
+
+
+def _interpreter_class():
+    # The standalone tflite-runtime wheel is far smaller than TensorFlow
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        from tensorflow.lite import Interpreter
+    return Interpreter
+
+
+def quantize(batch, details):
+    """Map float input onto an integer-quantized input tensor, if it is one"""
+    dtype = details['dtype']
+    if np.issubdtype(dtype, np.floating):
+        return batch.astype(dtype)
+    scale, zero_point = details['quantization']
+    info = np.iinfo(dtype)
+    return np.clip(np.round(batch / scale + zero_point), info.min, info.max).astype(dtype)
+
+
+def dequantize(output, details):
+    """Map an integer-quantized output tensor back to float probabilities"""
+    if np.issubdtype(output.dtype, np.floating):
+        return output.astype(np.float32)
+    scale, zero_point = details['quantization']
+    return (output.astype(np.float32) - zero_point) * scale
+
+
+def load_runtime(kind, path, **options):
+    """Load the runtime named ``kind`` (one of ``RUNTIMES``) from ``path``"""
+    if kind == 'keras':
+        return KerasRuntime.load(path)
+    if kind == 'tflite':
+        return TFLiteRuntime.load(path, **options)
+    raise ValueError(f'runtime must be one of {RUNTIMES}')
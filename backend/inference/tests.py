@@ -0,0 +1,338 @@
+# Unit Tests for CropGuard AI Inference Helpers
+# File: inference/tests.py
+
+import io
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from .batching import BatcherStopped, MicroBatcher
+from .cache import ResultCache, content_key
+from .export import benchmark, compare_predictions, load_image_set
+from .ingest import ImageRejected, ingest_image
+from .lifecycle import ModelManager
+from .overlay import render_heatmap, render_spots
+from .results import ResultStore
+from .runtime import dequantize, load_runtime, quantize
+
+
+class MicroBatcherTestCase(unittest.TestCase):
+    """Test cases for dynamic micro-batching."""
+
+    def setUp(self):
+        """Set up a batcher around a fake model that records batch sizes."""
+        self.calls = []
+
+        def fake_predict(batch):
+            self.calls.append(batch.shape[0])
+            return batch.sum(axis=1)
+
+        self.batcher = MicroBatcher(fake_predict, max_batch_size=8, max_wait_ms=50,
+                                    name='test_predict').start()
+
+    def tearDown(self):
+        self.batcher.stop(timeout=1)
+
+    def test_single_request_round_trip(self):
+        """Test a lone request gets its own output rows back."""
+        inputs = np.ones((1, 2, 3))
+        result = self.batcher.predict(inputs, timeout=2)
+        np.testing.assert_array_equal(result, [[2, 2, 2]])
+
+    def test_concurrent_requests_are_batched(self):
+        """Test concurrent requests share one model call and get their own slice."""
+        results = {}
+        barrier = threading.Barrier(4)
+
+        def worker(value):
+            barrier.wait()
+            results[value] = self.batcher.predict(np.full((1, 1, 1), value), timeout=2)
+
+        threads = [threading.Thread(target=worker, args=(v,)) for v in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for value, output in results.items():
+            self.assertEqual(float(output[0][0]), value)
+        self.assertLess(len(self.calls), 4)
+        self.assertEqual(sum(self.calls), 4)
+
+    def test_max_batch_size_respected(self):
+        """Test a batch never exceeds the configured size."""
+        futures = [self.batcher.submit(np.zeros((3, 1, 1))) for _ in range(5)]
+        for future in futures:
+            self.assertEqual(future.result(timeout=2).shape, (3, 1))
+        self.assertTrue(all(size <= 8 for size in self.calls))
+
+    def test_errors_propagate_to_callers(self):
+        """Test model errors are raised in every waiting caller."""
+        def broken(batch):
+            raise RuntimeError('model failed')
+
+        batcher = MicroBatcher(broken, name='test_broken').start()
+        try:
+            with self.assertRaises(RuntimeError):
+                batcher.predict(np.zeros((1, 1)), timeout=2)
+        finally:
+            batcher.stop(timeout=1)
+
+    def test_stop_fails_queued_requests(self):
+        """Test requests still queued at shutdown fail instead of hanging."""
+        running, release = threading.Event(), threading.Event()
+
+        def slow(batch):
+            running.set()
+            release.wait(2)
+            return batch
+
+        batcher = MicroBatcher(slow, max_batch_size=1, name='test_slow').start()
+        first = batcher.submit(np.zeros((1, 1)))
+        running.wait(2)
+        queued = [batcher.submit(np.zeros((1, 1))) for _ in range(3)]
+        batcher.stop(timeout=0.1)
+        release.set()
+
+        self.assertEqual(first.result(timeout=2).shape, (1, 1))
+        for future in queued:
+            with self.assertRaises(BatcherStopped):
+                future.result(timeout=2)
+        with self.assertRaises(BatcherStopped):
+            batcher.submit(np.zeros((1, 1)))
+
+    def test_stats_report_histograms(self):
+        """Test queue depth and batch size histograms are exposed."""
+        self.batcher.predict(np.zeros((2, 1, 1)), timeout=2)
+        stats = self.batcher.stats()
+        self.assertGreaterEqual(stats['batch_size']['count'], 1)
+        self.assertGreaterEqual(stats['queue_depth']['count'], 1)
+
+
+class ResultStoreTestCase(unittest.TestCase):
+    """Test cases for the recent-result store."""
+
+    def test_lookup_and_update(self):
+        """Test results can be fetched and filled in later by id."""
+        store = ResultStore(max_entries=4)
+        result_id = store.add({'disease': 'Rust'})
+        store.update(result_id, marked_image='abc')
+        self.assertEqual(store.get(result_id), {'disease': 'Rust', 'marked_image': 'abc'})
+        self.assertIsNone(store.get('missing'))
+
+    def test_least_recently_used_evicted(self):
+        """Test the oldest untouched result is dropped when full."""
+        store = ResultStore(max_entries=2)
+        first = store.add({'n': 1})
+        second = store.add({'n': 2})
+        store.get(first)
+        store.add({'n': 3})
+        self.assertIsNotNone(store.get(first))
+        self.assertIsNone(store.get(second))
+
+
+class ResultCacheTestCase(unittest.TestCase):
+    """Test cases for the content-hash result cache."""
+
+    def test_hit_and_miss_counters(self):
+        """Test repeated keys are served from memory and counted."""
+        cache = ResultCache(max_bytes=1024, name='test_cache_counters')
+        key = content_key(b'leaf photo')
+        self.assertIsNone(cache.get(key))
+        cache.put(key, {'name': 'Rust', 'confidence': 0.9, 'overlay': b'jpeg'})
+        self.assertEqual(cache.get(key)['overlay'], b'jpeg')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_key_from_chunks_matches_bytes(self):
+        """Test streaming chunks hash the same as the whole upload."""
+        self.assertEqual(content_key([b'leaf ', b'photo']), content_key(b'leaf photo'))
+
+    def test_evicts_by_byte_size(self):
+        """Test least recently used entries are evicted once over budget."""
+        cache = ResultCache(max_bytes=300, name='test_cache_evict')
+        cache.put('a', {'overlay': b'x' * 120})
+        cache.put('b', {'overlay': b'x' * 120})
+        cache.get('a')
+        cache.put('c', {'overlay': b'x' * 120})
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertLessEqual(cache.stats()['bytes'], 300)
+
+    def test_disk_tier_survives_restart(self):
+        """Test entries written to disk are found by a fresh cache."""
+        with tempfile.TemporaryDirectory() as tmp:
+            ResultCache(disk_dir=tmp, name='test_cache_disk').put(
+                'abcd', {'name': 'Rust', 'overlay': b'jpeg'})
+            restarted = ResultCache(disk_dir=tmp, name='test_cache_disk')
+            self.assertEqual(restarted.get('abcd'), {'name': 'Rust', 'overlay': b'jpeg'})
+            self.assertEqual(restarted.stats()['disk_hits'], 1)
+
+
+class OverlayRendererTestCase(unittest.TestCase):
+    """Test cases for the single-pass overlay renderer."""
+
+    def test_large_photo_rendered_on_working_copy(self):
+        """Test large photos are downscaled before rendering."""
+        image = np.zeros((3000, 4000, 3), dtype=np.uint8)
+        marked = render_spots(image, [(2000, 1500, 200)], max_side=1000)
+        self.assertEqual(marked.shape, (750, 1000, 3))
+
+    def test_spots_blended_inside_mask_only(self):
+        """Test pixels outside every spot are untouched."""
+        image = np.full((100, 100, 3), 200, dtype=np.uint8)
+        marked = render_spots(image, [(25, 25, 8), (75, 75, 8)], alpha=0.5)
+        np.testing.assert_array_equal(marked[50, 50], [200, 200, 200])
+        np.testing.assert_array_equal(marked[25, 25], [100, 150, 227])
+        np.testing.assert_array_equal(image[25, 25], [200, 200, 200])
+
+    def test_overlapping_spots_blended_once(self):
+        """Test overlapping spots do not darken twice."""
+        image = np.full((100, 100, 3), 200, dtype=np.uint8)
+        single = render_spots(image, [(50, 50, 10)])
+        double = render_spots(image, [(50, 50, 10), (52, 50, 10)])
+        np.testing.assert_array_equal(single[50, 50], double[50, 50])
+
+    def test_heatmap_resized_to_image(self):
+        """Test a low-resolution Grad-CAM heatmap covers the whole image."""
+        image = np.zeros((224, 224, 3), dtype=np.uint8)
+        heatmap = np.zeros((7, 7), dtype=np.float32)
+        heatmap[3, 3] = 1.0
+        marked = render_heatmap(image, heatmap)
+        self.assertEqual(marked.shape, image.shape)
+        self.assertGreater(int(marked[112, 112].sum()), int(marked[0, 0].sum()))
+
+
+def _jpeg_upload(size, color=(120, 180, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, format='JPEG')
+    buffer.seek(0)
+    return buffer
+
+
+class IngestTestCase(unittest.TestCase):
+    """Test cases for bounded-memory image ingest."""
+
+    def test_large_jpeg_decoded_near_target_size(self):
+        """Test draft decoding returns a reduced image and keeps the source size."""
+        ingested = ingest_image(_jpeg_upload((4000, 3000)), max_side=500)
+        self.assertEqual(ingested.image.size, (500, 375))
+        self.assertEqual(ingested.source_size, (4000, 3000))
+        self.assertEqual(ingested.resized((224, 224)).size, (224, 224))
+
+    def test_key_matches_content_hash(self):
+        """Test the streamed hash matches hashing the whole upload."""
+        upload = _jpeg_upload((64, 64))
+        expected = content_key(upload.getvalue())
+        self.assertEqual(ingest_image(upload).key, expected)
+
+    def test_oversize_upload_rejected(self):
+        """Test uploads over the byte limit are refused with 413."""
+        with self.assertRaises(ImageRejected) as ctx:
+            ingest_image(_jpeg_upload((256, 256)), max_bytes=100)
+        self.assertEqual(ctx.exception.status_code, 413)
+
+    def test_pixel_limit_checked_before_decode(self):
+        """Test huge dimensions are refused from the header alone."""
+        ingested = ingest_image(_jpeg_upload((2000, 2000)), max_pixels=1000 * 1000)
+        with self.assertRaises(ImageRejected):
+            ingested.image
+
+    def test_garbage_rejected(self):
+        """Test non-image uploads are refused."""
+        with self.assertRaises(ImageRejected):
+            ingest_image(io.BytesIO(b'not an image')).image
+
+
+class ModelManagerTestCase(unittest.TestCase):
+    """Test cases for model lazy/eager loading and warm-up."""
+
+    def setUp(self):
+        """Set up a fake loader and warm-up function that record calls."""
+        self.loads = 0
+        self.warmed = []
+
+        def loader():
+            self.loads += 1
+            return 'model'
+
+        def warmup(model, batch):
+            self.warmed.append(batch.shape[0])
+
+        self.make = lambda mode: ModelManager(loader, warmup_fns=[warmup], batch_sizes=(1, 8),
+                                              input_shape=(4, 4, 3), load_mode=mode,
+                                              name='test_model')
+
+    def test_lazy_load_waits_for_first_use(self):
+        """Test lazy mode loads and warms up on first use only."""
+        manager = self.make('lazy').start()
+        self.assertFalse(manager.loaded)
+        self.assertFalse(manager.ready)
+        self.assertEqual(manager.get(), 'model')
+        manager.get()
+        self.assertEqual(self.loads, 1)
+        self.assertTrue(manager.ready)
+
+    def test_eager_load_warms_every_batch_size(self):
+        """Test eager mode warms up at every configured batch size before ready."""
+        manager = self.make('eager').start()
+        self.assertTrue(manager.wait_ready(timeout=2))
+        self.assertEqual(self.warmed, [1, 8])
+        status = manager.status()
+        self.assertIsNotNone(status['cold_start_seconds'])
+        self.assertIsNotNone(status['warmup_seconds'])
+
+    def test_probe_starts_lazy_load(self):
+        """Test a readiness probe triggers loading in lazy mode."""
+        manager = self.make('lazy')
+        manager.ensure_loading()
+        self.assertTrue(manager.wait_ready(timeout=2))
+        self.assertEqual(self.loads, 1)
+
+
+class RuntimeExportTestCase(unittest.TestCase):
+    """Test cases for runtime selection, parity and benchmarking helpers."""
+
+    def test_unknown_runtime_is_rejected(self):
+        """Test load_runtime refuses runtimes it does not know."""
+        with self.assertRaises(ValueError):
+            load_runtime('onnx', 'model.onnx')
+
+    def test_quantization_round_trip(self):
+        """Test uint8 tensors map back to the float range they encode."""
+        details = {'dtype': np.uint8, 'quantization': (1 / 255.0, 0)}
+        batch = np.array([[0.0, 0.5, 1.0]], dtype=np.float32)
+        quantized = quantize(batch, details)
+        self.assertEqual(quantized.dtype, np.uint8)
+        np.testing.assert_allclose(dequantize(quantized, details), batch, atol=1 / 255.0)
+
+    def test_parity_report(self):
+        """Test parity counts top-1 disagreements and probability drift."""
+        reference = np.array([[0.9, 0.1], [0.4, 0.6], [0.2, 0.8]])
+        candidate = np.array([[0.8, 0.2], [0.6, 0.4], [0.2, 0.8]])
+        report = compare_predictions(reference, candidate)
+        self.assertAlmostEqual(report['top1_agreement'], 0.6667)
+        self.assertEqual(report['disagreements'], [1])
+        self.assertAlmostEqual(report['max_abs_diff'], 0.2, places=5)
+
+    def test_image_set_is_sorted_and_scaled(self):
+        """Test the fixed image set loads in name order as a [0, 1] batch."""
+        with tempfile.TemporaryDirectory() as directory:
+            for name, color in (('b.png', 'white'), ('a.png', 'black')):
+                Image.new('RGB', (32, 16), color).save(f'{directory}/{name}')
+            names, images = load_image_set(directory, size=(8, 8))
+        self.assertEqual(names, ['a.png', 'b.png'])
+        self.assertEqual(images.shape, (2, 8, 8, 3))
+        self.assertEqual((images[0].max(), images[1].min()), (0.0, 1.0))
+
+    def test_benchmark_reports_latency_and_throughput(self):
+        """Test the benchmark times every iteration of the predict function."""
+        calls = []
+        report = benchmark(lambda batch: calls.append(len(batch)), np.zeros((4, 2)),
+                           iterations=5, warmup=1)
+        self.assertEqual(calls, [4] * 6)
+        self.assertEqual(report['batch_size'], 4)
+        self.assertGreater(report['throughput_per_s'], 0)
@@ -0,0 +1,155 @@
+# In-process Metrics for CropGuard AI
+# File: metrics.py
+#
+# Lightweight counters, gauges and histograms shared by the Flask inference
+# service (app.py) and the Django API. Everything lives in process memory and
+# is exposed as a JSON snapshot by each service's metrics endpoint.
+
+import bisect
+import threading
+
+# Default bucket layouts
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Counter:
+    """Monotonically increasing counter"""
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Gauge:
+    """Value that can go up and down"""
+
+    def __init__(self, name):
+        self.name = name
+        self._value = 0
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    @property
+    def value(self):
+        return self._value
+
+    def snapshot(self):
+        return self._value
+
+
+class Histogram:
+    """Cumulative bucketed histogram with approximate percentiles"""
+
+    def __init__(self, name, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._count = 0
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._count += 1
+            self._sum += value
+
+    @property
+    def count(self):
+        return self._count
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th percentile (0-100)"""
+        with self._lock:
+            total = self._count
+            counts = list(self._counts)
+        if not total:
+            return None
+        rank = q / 100.0 * total
+        seen = 0
+        for index, bucket_count in enumerate(counts):
+            seen += bucket_count
+            if seen >= rank and bucket_count:
+                if index < len(self.buckets):
+                    return self.buckets[index]
+                return float('inf')
+        return float('inf')
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._count
+            value_sum = self._sum
+        labels = [str(b) for b in self.buckets] + ['+Inf']
+        return {
+            'count': total,
+            'sum': round(value_sum, 6),
+            'mean': round(value_sum / total, 6) if total else None,
+            'buckets': dict(zip(labels, counts)),
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+# ============================================
+# REGISTRY
+# ============================================
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+def _get_or_create(name, factory):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = factory()
+            _registry[name] = metric
+        return metric
+
+
+def counter(name):
+    return _get_or_create(name, lambda: Counter(name))
+
+
+def gauge(name):
+    return _get_or_create(name, lambda: Gauge(name))
+
+
+def histogram(name, buckets=LATENCY_BUCKETS):
+    return _get_or_create(name, lambda: Histogram(name, buckets))
+
+
+def snapshot(prefix=None):
+    """Return every registered metric (optionally filtered by name prefix)"""
+    with _registry_lock:
+        items = sorted(_registry.items())
+    return {
+        name: metric.snapshot()
+        for name, metric in items
+        if prefix is None or name.startswith(prefix)
+    }
@@ -1,9 +1,12 @@
+// Flask inference server; overlays are served from the same host
+const INFERENCE_BASE_URL = window.INFERENCE_BASE_URL || "http://127.0.0.1:5000";
+
 async function analyze() {
     const input = document.getElementById("imageInput");
     const formData = new FormData();
     formData.append("image", input.files[0]);
 
-    const response = await fetch("http://127.0.0.1:5000/predict", {
+    const response = await fetch(`${INFERENCE_BASE_URL}/predict`, {
         method: "POST",
         body: formData
     });
@@ -11,7 +14,7 @@ async function analyze() {
     const data = await response.json();
 
     document.getElementById("resultImage").src =
-        "data:image/jpeg;base64," + data.marked_image;
+        INFERENCE_BASE_URL + data.marked_image_url;
 
     document.getElementById("report").innerHTML = `
         Disease: <b>${data.disease}</b><br>
@@ -69,6 +69,8 @@ const state = {
         currentStep: 'welcome', // welcome, farm-details, image, analysis, results
         loading: false,
         alertCount: 0,
+        alertSync: null, // sync cursor from the unread feed
+        alerts: [], // unread alerts shown, newest first
         theme: localStorage.getItem('theme') || 'light'
     }
 };
@@ -323,19 +325,43 @@ async function submitDetection() {
  */
 async function loadAlerts() {
     try {
-        const response = await cropGuardAPI.getUnreadAlerts();
+        // After the first load only changes since the last sync are fetched
+        let response = state.ui.alertSync
+            ? await cropGuardAPI.getUnreadAlerts({ since: state.ui.alertSync })
+            : null;
+        if (!response || response.reset) {
+            response = await cropGuardAPI.getUnreadAlerts({ pageSize: 5 });
+            state.ui.alerts = response.results;
+        } else {
+            // Drop alerts read elsewhere, then merge in the new ones
+            while (true) {
+                const readIds = new Set(response.read_ids);
+                state.ui.alerts = state.ui.alerts.filter(alert => !readIds.has(alert.id));
+                mergeAlerts(response.results);
+                if (!response.has_more) break;
+                response = await cropGuardAPI.getUnreadAlerts({ since: response.sync });
+            }
+        }
+        state.ui.alertSync = response.sync;
         state.ui.alertCount = response.count || 0;
         updateAlertBadge();
-
-        if (state.ui.alertCount > 0) {
-            const alerts = await cropGuardAPI.getAlerts(1, 5);
-            displayAlerts(alerts.results);
-        }
+        displayAlerts(state.ui.alerts);
     } catch (error) {
         console.error('Failed to load alerts:', error);
     }
 }
 
+/**
+ * Add or replace alerts by id, keeping the newest few
+ */
+function mergeAlerts(alerts) {
+    const byId = new Map(state.ui.alerts.map(alert => [alert.id, alert]));
+    alerts.forEach(alert => byId.set(alert.id, alert));
+    state.ui.alerts = [...byId.values()]
+        .sort((a, b) => new Date(b.created_at) - new Date(a.created_at))
+        .slice(0, 5);
+}
+
 /**
  * Fetch weather data for farm
  */
@@ -584,7 +610,7 @@ function displayAlerts(alerts) {
         const alertEl = document.createElement('div');
         alertEl.className = 'alert-item';
         alertEl.innerHTML = `
-            <h4>${alert.title}</h4>
+            <h4>${alert.title}${alert.occurrences > 1 ? ` (×${alert.occurrences})` : ''}</h4>
             <p>${alert.message}</p>
             <small>${new Date(alert.created_at).toLocaleDateString()}</small>
         `;
@@ -626,8 +652,17 @@ document.addEventListener('DOMContentLoaded', async () => {
         loadWeatherData();
         loadMarketPrices();
 
-        // Set up periodic refresh
-        setInterval(loadAlerts, 5 * 60 * 1000); // Every 5 minutes
+        // New alerts are pushed by the server; poll only without EventSource
+        const alertStream = await cropGuardAPI.openAlertStream((alert) => {
+            state.ui.alertCount += 1;
+            updateAlertBadge();
+            mergeAlerts([alert]);
+            displayAlerts(state.ui.alerts);
+            showAlert(alert.title, alert.severity === 'critical' ? 'error' : 'warning');
+        });
+        if (!alertStream) {
+            setInterval(loadAlerts, 5 * 60 * 1000); // Every 5 minutes
+        }
     }
 
     // Button event listeners